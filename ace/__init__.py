@@ -3,9 +3,16 @@ Package for SAP Data Processing and Transformation
 """
 
 import argparse
+import json
+import sys
 
 from ace.main_scripts import process_local_material, process_order
-from ace.utils import union_many
+from ace.schemas import (
+    DEFAULT_NUM_BUCKETS,
+    RUN_HISTORY_BASELINE_WINDOW,
+    RUN_HISTORY_REGRESSION_THRESHOLD,
+)
+from ace.utils import LookupIndex, perf_report, union_many
 
 from . import main_scripts, schemas, utils
 
@@ -19,8 +26,10 @@ __all__ = [
 ]
 
 
-def process_local_material_run(args=None):
-    parser = argparse.ArgumentParser()
+def _add_pipeline_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the arguments shared by the pipeline runners, named after the pipeline parameters.
+    """
     parser.add_argument(
         "-d",
         "--data_dir",
@@ -46,49 +55,166 @@ def process_local_material_run(args=None):
         required=False,
         default="local_material",
     )
-    args, _ = parser.parse_known_args()
-    process_local_material(
-        data_dir=args.data_dir,
-        system_name=args.system_name,
-        output_dir=args.output_dir,
-        file_name=args.file_name,
+    parser.add_argument(
+        "--surrogate_keys",
+        help="emit 64-bit surrogate keys next to the readable primary keys.",
+        action="store_true",
     )
-
-
-def process_order_run(args=None):
-    parser = argparse.ArgumentParser()
     parser.add_argument(
-        "-d",
-        "--data_dir",
-        help="data set folder path where csv files located.",
-        required=True,
+        "--surrogate_key_report",
+        help="write the surrogate key collisions of the output to the output directory "
+        "(one extra pass over the output, needs --surrogate_keys).",
+        action="store_true",
     )
     parser.add_argument(
-        "-s",
-        "--system_name",
-        help="specify the system name where source data came.",
-        required=True,
+        "--encode_identifiers",
+        help="process hex-hash identifiers as binary values to reduce memory and shuffle size "
+        "(reads and profiles all inputs up front).",
+        action="store_true",
     )
     parser.add_argument(
-        "-o",
-        "--output_dir",
-        help="path to save output dataset.",
-        required=True,
+        "--partition_by",
+        help="columns to write a partitioned output by, e.g. source_system_erp plant start_date_month.",
+        nargs="+",
+        required=False,
+        default=None,
     )
     parser.add_argument(
-        "-f",
-        "--file_name",
-        help="path to save output dataset.",
+        "--bucket_by",
+        help="save the output as a table bucketed and sorted by these columns, e.g. material_number plant.",
+        nargs="+",
         required=False,
-        default="local_material",
+        default=None,
+    )
+    parser.add_argument(
+        "--num_buckets",
+        help="number of buckets of a bucketed output.",
+        type=int,
+        required=False,
+        default=DEFAULT_NUM_BUCKETS,
+    )
+    parser.add_argument(
+        "--quality_checks",
+        help="evaluate the data quality rules before the output is written and write a quality report next to it; the observed inputs are no longer filtered in the scan.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats_path",
+        help="json statistics store used to profile the inputs and tune joins and partitions.",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--max_join_fanout",
+        help="abort when a join is expected to multiply the row count by more than this factor.",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--semi_join_reduction",
+        help="drop materials that cannot reach the output before preparing MARA/MBEW.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--prep_parallelism",
+        help="persist and materialise the prepared input tables on this many threads.",
+        required=False,
+        type=int,
+        default=None,
+    )
+    parser.add_argument(
+        "--staging_dir",
+        help="stage the extracts as Parquet sorted by the deletion flags and read them from here.",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--scan_report",
+        help="write the pushed-down scan filters and the bytes they skip to the output directory.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--validated_dir",
+        help="validate the CSV extracts in parallel into this directory and quarantine bad rows.",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--bad_records_path",
+        help="directory the rows Spark cannot parse are written to instead of being read.",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--stage_metrics",
+        help="write the shuffle, spill, GC and skew metrics of every step to the output directory.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--history_path",
+        help="SQLite run history the parameters, input sizes and timings of the run are appended to.",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--attrition_report",
+        help="write the rows each prep filter and deduplication drops to the output directory.",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--sample",
+        help="development run on this fraction (e.g. 0.01) of the keys, sampled by their hash.",
+        required=False,
+        type=float,
+        default=None,
+    )
+    parser.add_argument(
+        "--lookup_index",
+        help="index the output by its key columns for point lookups with ace-lookup.",
+        action="store_true",
     )
+    parser.add_argument(
+        "--output_format",
+        help="format of the output: csv (default), parquet sorted for data skipping, or arrow IPC files.",
+        choices=["csv", "parquet", "arrow"],
+        required=False,
+        default="csv",
+    )
+    parser.add_argument(
+        "--sort_by",
+        help="columns to sort a Parquet output by within the files, e.g. plant material_number.",
+        nargs="+",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--bloom_filter_columns",
+        help="columns to write Parquet Bloom filters for in a Parquet or bucketed output.",
+        nargs="+",
+        required=False,
+        default=None,
+    )
+
+
+def process_local_material_run(args=None):
+    parser = argparse.ArgumentParser()
+    _add_pipeline_arguments(parser)
     args, _ = parser.parse_known_args()
-    process_order(
-        data_dir=args.data_dir,
-        system_name=args.system_name,
-        output_dir=args.output_dir,
-        file_name=args.file_name,
+    process_local_material(**vars(args))
+
+
+def process_order_run(args=None):
+    parser = argparse.ArgumentParser()
+    _add_pipeline_arguments(parser)
+    parser.add_argument(
+        "--kpi_cube_dir",
+        help="directory of the pre-aggregated on-time delivery KPI cube.",
+        required=False,
+        default=None,
     )
+    args, _ = parser.parse_known_args()
+    process_order(**vars(args))
 
 
 def union_many_data(arg=None):
@@ -113,9 +239,106 @@ def union_many_data(arg=None):
         required=False,
         default="local_material",
     )
+    parser.add_argument(
+        "--partition_by",
+        help="columns to write a partitioned output by, e.g. source_system_erp plant start_date_month.",
+        nargs="+",
+        required=False,
+        default=None,
+    )
     args, _ = parser.parse_known_args()
     union_many(
         data_path=args.data_path,
         output_dir=args.output_dir,
         file_name=args.file_name,
+        partition_by=args.partition_by,
+    )
+
+
+def perf_report_run(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "history_path",
+        help="SQLite run history written by the pipelines (--history_path).",
+    )
+    parser.add_argument(
+        "-p",
+        "--pipeline",
+        help="only report the runs of this pipeline (local_material or process_order).",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "-r",
+        "--run_name",
+        help="only report the runs of this output (file name without extension).",
+        required=False,
+        default=None,
+    )
+    parser.add_argument(
+        "--window",
+        help="number of previous runs in the rolling throughput baseline.",
+        required=False,
+        type=int,
+        default=RUN_HISTORY_BASELINE_WINDOW,
+    )
+    parser.add_argument(
+        "--threshold",
+        help="fraction below the baseline throughput from which a run is a regression.",
+        required=False,
+        type=float,
+        default=RUN_HISTORY_REGRESSION_THRESHOLD,
+    )
+    parser.add_argument(
+        "--limit",
+        help="number of runs listed per pipeline and output.",
+        required=False,
+        type=int,
+        default=20,
+    )
+    parser.add_argument(
+        "--fail_on_regression",
+        help="exit with status 1 if the latest run of a pipeline and output is a regression.",
+        action="store_true",
+    )
+    args, _ = parser.parse_known_args(args)
+    regressions = perf_report(
+        history_path=args.history_path,
+        pipeline=args.pipeline,
+        run_name=args.run_name,
+        window=args.window,
+        threshold=args.threshold,
+        limit=args.limit,
+        latest_only=args.fail_on_regression,
+    )
+    if args.fail_on_regression and regressions:
+        sys.exit(1)
+
+
+def lookup_run(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "index_path",
+        help="lookup index written next to the output (--lookup_index).",
+    )
+    parser.add_argument(
+        "keys",
+        help="keys to look up.",
+        nargs="*",
+    )
+    parser.add_argument(
+        "-f",
+        "--keys_file",
+        help="file with one key per line to look up, '-' for standard input.",
+        required=False,
+        default=None,
     )
+    args, _ = parser.parse_known_args(args)
+    keys = list(args.keys)
+    if args.keys_file:
+        keys_file = sys.stdin if args.keys_file == "-" else open(args.keys_file)
+        with keys_file:
+            keys += [line.strip() for line in keys_file if line.strip()]
+    with LookupIndex(args.index_path) as index:
+        for key, rows in index.lookup_many(keys).items():
+            print(json.dumps({"key": key, "rows": rows}))
@@ -47,19 +47,42 @@ Date:
 
 """
 
+# Local imports
+import os
+import time
+
 # Pyspark import
 import pyspark.sql.functions as F
+from pyspark.sql import Observation
 
 from ace.schemas import (
+    BLOOM_FILTER_COLUMNS,
+    DEFAULT_NUM_BUCKETS,
+    LOCAL_MATERIAL_QUALITY_RULES,
     LOCAL_MATERIAL_SCHEMA_WITH_RELAVENT_NAMES,
+    LOCAL_MATERIAL_TABLES,
+    LOOKUP_INDEX_COLUMNS,
+    OUTPUT_SORT_COLUMNS,
+    SAMPLE_KEY_COLUMNS,
+    SAMPLE_RELATED_TABLES,
     UNIFIED_SCHEMA,
+    UNIFIED_SCHEMA_WITH_SURROGATE_KEYS,
 )
 
 # Import Custom utils
 from ace.utils import (
+    AttritionTracker,
+    QualityObserver,
+    StageMetricsCollector,
+    TableRegistry,
     add_missing_columns,
+    build_lookup_index,
+    decode_identifier_columns,
     enforce_schema,
+    input_table_bytes,
     integrate_data,
+    materialize_concurrently,
+    parquet_statistics_report,
     post_prep_local_material,
     prep_company_codes,
     prep_general_material_data,
@@ -67,14 +90,53 @@ from ace.utils import (
     prep_plant_and_branches,
     prep_plant_data_for_material,
     prep_valuation_area,
-    read_multiple_data,
+    profile_tables,
+    read_arrow_batches,
+    record_run,
+    reduce_by_driving_keys,
     rename_and_select,
-    save_df_as_csv,
+    report_surrogate_key_collisions,
+    sample_registry,
+    scan_filter_report,
+    stage_table_files,
+    to_arrow_batches,
+    validate_extracts,
+    write_output,
 )
 
 
 def process_local_material(
-    data_dir: str, system_name: str, output_dir: str, file_name: str
+    data_dir: str,
+    system_name: str,
+    output_dir: str,
+    file_name: str,
+    *,
+    surrogate_keys: bool = False,
+    encode_identifiers: bool = False,
+    partition_by: list = None,
+    bucket_by: list = None,
+    num_buckets: int = DEFAULT_NUM_BUCKETS,
+    quality_checks: bool = False,
+    quality_rules: dict = None,
+    stats_path: str = None,
+    max_join_fanout: float = None,
+    semi_join_reduction: bool = False,
+    registry: TableRegistry = None,
+    prep_parallelism: int = None,
+    staging_dir: str = None,
+    scan_report: bool = False,
+    validated_dir: str = None,
+    bad_records_path: str = None,
+    stage_metrics: bool = False,
+    history_path: str = None,
+    attrition_report: bool = False,
+    sample: float = None,
+    lookup_index: bool = False,
+    output_format: str = "csv",
+    sort_by: list = None,
+    bloom_filter_columns: list = None,
+    return_arrow: bool = False,
+    surrogate_key_report: bool = False,
 ):
     """
     Processes local material data by reading input files, applying transformations, and integrating data.
@@ -85,6 +147,84 @@ def process_local_material(
     - output_dir (str): Directory where the processed file will be saved as `local_material.csv`.
     - file_name (str): The name of the output file.
     - system_name (str): specify the system name where source data came.
+    - surrogate_keys (bool): If True, emits 64-bit surrogate keys next to the readable primary keys.
+    - encode_identifiers (bool): If True, hex-hash identifiers are processed as 32-byte binary values
+      and constant columns as literals; they are decoded back to hex strings before the output.
+      Whether a column is hex is decided across all tables, so every input is read and profiled
+      up front instead of on first use.
+    - partition_by (list): Output columns to write a Hive-style partitioned layout by
+      (e.g. `source_system_erp`, `plant`, `start_date_month`).
+    - bucket_by (list): If given, the output is saved as a table bucketed and sorted by these columns
+      (e.g. `material_number`, `plant`) instead of a CSV file.
+    - num_buckets (int): Number of buckets of a bucketed output; use the same value for both pipelines
+      to allow shuffle-free joins between their outputs.
+    - quality_checks (bool): If True, evaluates the data quality rules on the inputs and the output
+      (the input rules are observed while the pipeline scans the inputs, the output rules are
+      evaluated on the output kept in memory), writes `<file_name>_quality_report.json` to
+      `output_dir` and fails the run before the write if a rule exceeds its `fail` threshold.
+      The observed inputs are filtered after their scan instead of in it (see `QualityObserver`).
+    - quality_rules (dict): Quality rules per frame. Defaults to `LOCAL_MATERIAL_QUALITY_RULES`.
+    - stats_path (str): If given, the input tables are profiled into this JSON statistics store
+      (reused while the inputs are unchanged) and the statistics drive broadcast joins and
+      the number of partitions of the shuffled joins.
+    - max_join_fanout (float): If given, the fan-out of every join is estimated from key frequencies
+      before it runs; joins that add rows are reported with their offending keys and a fan-out above
+      this factor aborts the run.
+    - semi_join_reduction (bool): If True, MARA and MBEW are reduced to the materials of the prepared MARC
+      (broadcast key set, left semi join) before they are prepared.
+    - registry (TableRegistry): The input tables of this run. If not given, they are read
+      from `data_dir`. Every run keeps its tables in its own registry, so several runs can
+      share one Python process (see `run_pipelines_concurrently`).
+    - prep_parallelism (int): If given, the prepared input tables are persisted and materialised
+      concurrently on this many threads, smallest table first (see `materialize_concurrently`).
+    - staging_dir (str): If given, the input extracts are staged as Parquet under
+      `<staging_dir>/<system_name>`, sorted by the deletion and validity flags of `SCAN_FILTERS`, and
+      read from there; the prep filters are then pushed into the scan and skip whole row groups.
+      Unchanged extracts are staged only once.
+    - scan_report (bool): If True, writes `<file_name>_scan_filter_report.json` to `output_dir` with
+      the filters pushed into each scan and the bytes the row group statistics let them skip.
+    - validated_dir (str): If given, the CSV extracts are validated in parallel before Spark reads
+      them (header and byte order mark normalised, ragged rows quarantined with their line numbers)
+      into `<validated_dir>/<system_name>`, and read from there. The results are written to
+      `<file_name>_validation_report.json` in `output_dir`.
+    - bad_records_path (str): If given, rows Spark cannot parse are written to
+      `<bad_records_path>/<system_name>/<extract>` and dropped instead of being read with shifted
+      or missing values.
+    - stage_metrics (bool): If True, tags the Spark jobs of every pipeline step and writes
+      `<file_name>_stage_metrics.json` to `output_dir` with the shuffle, spill, GC and skew metrics
+      per step and the worst Spark stages (see `StageMetricsCollector`). The jobs are only tagged;
+      the plan stays the same, so the work of lazy steps is attributed to the action that runs it.
+    - history_path (str): If given, the parameters, input sizes, step timings and output row count
+      of the run are appended to this SQLite run history (see `record_run` and `perf_report`).
+    - attrition_report (bool): If True, the rows each prep filter and deduplication drops are
+      counted with observations while the pipeline runs and written to
+      `<file_name>_attrition_report.json` in `output_dir` after the output (see `AttritionTracker`).
+    - sample (float): If given, a development run on this fraction of the driving keys
+      (`SAMPLE_KEY_COLUMNS`), selected deterministically by their hash; the related tables keep
+      the matching rows only, so the sampled output stays referentially consistent
+      (see `sample_registry`).
+    - lookup_index (bool): If True, the CSV output is indexed by each of its key columns
+      (`LOOKUP_INDEX_COLUMNS`) after the write, into `<file_name>.<column>.idx` next to the output,
+      for point lookups without Spark (see `LookupIndex` and `ace-lookup`). Only supported for
+      CSV outputs.
+    - output_format (str): 'csv' (default), 'parquet' or 'arrow'. A Parquet output is written to
+      `<output_dir>/<file_name>`, range partitioned and sorted within the files by `sort_by`
+      (see `save_df_as_parquet`). An Arrow output is written to `<output_dir>/<file_name>` as
+      uncompressed Arrow IPC (Feather v2) files for memory-mapped reads (see `save_df_as_arrow`).
+    - sort_by (list): Columns to sort a Parquet output by. Defaults to `OUTPUT_SORT_COLUMNS`.
+    - bloom_filter_columns (list): Columns to write Parquet Bloom filters for in a Parquet or
+      bucketed output. Defaults to `BLOOM_FILTER_COLUMNS`. The file and row group statistics of
+      these outputs are written to `<file_name>_parquet_statistics.json` in `output_dir`
+      (see `parquet_statistics_report`).
+    - return_arrow (bool): If True, the output is returned as an iterator of Arrow record
+      batches instead of a DataFrame, for in-process consumers: read memory-mapped from the files
+      of an Arrow output. Other outputs are kept in memory during the write and spilled to Arrow
+      IPC files in `<output_dir>/<file_name>_arrow` (see `to_arrow_batches`), so the output is
+      not computed twice nor held in the driver memory at once.
+    - surrogate_key_report (bool): If True, the surrogate keys of the written output are checked
+      for collisions in one extra pass over the kept output, and the number of collisions and the
+      first colliding keys per key pair are written to `<file_name>_surrogate_key_collisions.json`
+      in `output_dir` (see `report_surrogate_key_collisions`). Needs `surrogate_keys`.
 
     Workflow:
     ---------
@@ -115,7 +255,8 @@ def process_local_material(
 
     Returns:
     --------
-        pyspark.sql.DataFrame: The final `local_material` DataFrame.
+        pyspark.sql.DataFrame: The final `local_material` DataFrame
+        (an iterator of `pyarrow.RecordBatch` with `return_arrow`).
 
     Example:
     --------
@@ -123,50 +264,326 @@ def process_local_material(
         successfully saved local_material.csv in /path/to/output
     """
 
-    for base_name, df in read_multiple_data(data_dir).items():
-        # Dynamically assign the DataFrame to a variable with the same name as the file (without extension)
-        globals()[base_name.split("_")[-1]] = df
+    # Keep the parameters and the start of the run for the run history
+    run_parameters = {
+        name: value for name, value in locals().items() if name != "registry"
+    }
+    run_started = time.time()
 
-    # Process the general material data from the PRE_MARA dataset and assign the result to a DataFrame
-    processed_mara_df = prep_general_material_data(MARA, "ZZMDGM")
+    # The lookup index reads the CSV layouts; Parquet and bucketed outputs cannot be indexed
+    if lookup_index and (bucket_by or output_format != "csv"):
+        raise ValueError("The lookup index is only supported for CSV outputs.")
 
-    # Process the material valuation data from the PRE_MBEW dataset
-    processed_mbew_df = prep_material_valuation(MBEW)
+    # The collision report checks the surrogate keys of the output
+    if surrogate_key_report and not surrogate_keys:
+        raise ValueError("The surrogate key report needs surrogate_keys.")
+
+    # Lay out Parquet outputs for data skipping on the key columns
+    if sort_by is None:
+        sort_by = OUTPUT_SORT_COLUMNS["local_material"]
+    if bloom_filter_columns is None:
+        bloom_filter_columns = BLOOM_FILTER_COLUMNS["local_material"]
+
+    # Attribute the Spark stages of the run to the pipeline steps, if requested
+    metrics = StageMetricsCollector(file_name.split(".")[0], enabled=stage_metrics)
+
+    # Count the rows the prep steps drop without extra Spark actions, if requested
+    attrition = AttritionTracker(enabled=attrition_report)
+
+    # Measure the quality rules of the inputs while the pipeline scans them, if requested
+    quality = QualityObserver(
+        quality_rules or LOCAL_MATERIAL_QUALITY_RULES, enabled=quality_checks
+    )
+
+    # Keep this run's inputs in its own registry, so concurrent runs share no state. Only the
+    # tables of this pipeline are registered, and each is read when it is first used
+    if registry is None:
+        if bad_records_path:
+            bad_records_path = os.path.join(bad_records_path, system_name)
+
+        # Catch malformed extracts before Spark spends time parsing them
+        if validated_dir:
+            data_dir = validate_extracts(
+                data_dir,
+                os.path.join(validated_dir, system_name),
+                tables=LOCAL_MATERIAL_TABLES,
+                report_path=os.path.join(
+                    output_dir, f"{file_name.split('.')[0]}_validation_report.json"
+                ),
+            )
+
+        # Columnar, sorted inputs let the deletion filters skip row groups in the scan
+        if staging_dir:
+            data_dir = stage_table_files(
+                data_dir,
+                os.path.join(staging_dir, system_name),
+                LOCAL_MATERIAL_TABLES,
+                bad_records_path=bad_records_path,
+            )
+        registry = TableRegistry.from_directory(
+            data_dir,
+            encode_identifiers,
+            tables=LOCAL_MATERIAL_TABLES,
+            bad_records_path=bad_records_path,
+        )
+
+    # Iterate on a deterministic, referentially consistent sample of the driving keys
+    input_registry = registry
+    if sample:
+        registry = sample_registry(
+            registry,
+            SAMPLE_KEY_COLUMNS["local_material"],
+            sample,
+            SAMPLE_RELATED_TABLES["local_material"],
+        )
+        print(
+            f"Sampled run: {sample:.2%} of the {SAMPLE_KEY_COLUMNS['local_material']} keys"
+        )
+
+    # Report the pushed-down filters and the bytes they skip
+    if scan_report:
+        scan_filter_report(
+            registry.as_dict(),
+            os.path.join(
+                output_dir, f"{file_name.split('.')[0]}_scan_filter_report.json"
+            ),
+        )
+
+    # Profile the inputs once and let the statistics drive join strategies and partitioning
+    table_stats = None
+    if stats_path:
+        with metrics.stage("profile_inputs"):
+            table_stats = profile_tables(registry.as_dict(), stats_path)
+
+    # Read the inputs up front when measuring, so their schema inference is attributed
+    if metrics.enabled:
+        with metrics.stage("read_inputs"):
+            registry.as_dict()
 
     # Process the plant data for materials from the PRE_MARC dataset
-    processed_marc_df = prep_plant_data_for_material(MARC)
+    processed_marc_df = prep_plant_data_for_material(
+        quality.observe(registry["MARC"], "MARC"), attrition=attrition
+    )
+
+    # Only materials of the prepared MARC survive the left joins: drop the others from
+    # MARA and MBEW before their filters and the MBEW window
+    sap_mara = quality.observe(registry["MARA"], "MARA")
+    sap_mbew = quality.observe(registry["MBEW"], "MBEW")
+    if semi_join_reduction:
+        sap_mara = reduce_by_driving_keys(sap_mara, processed_marc_df, ["MATNR"])
+        sap_mbew = reduce_by_driving_keys(sap_mbew, processed_marc_df, ["MATNR"])
+
+    # Process the general material data from the PRE_MARA dataset and assign the result to a DataFrame
+    processed_mara_df = prep_general_material_data(
+        sap_mara, "ZZMDGM", attrition=attrition
+    )
+
+    # Process the material valuation data from the PRE_MBEW dataset
+    processed_mbew_df = prep_material_valuation(sap_mbew, attrition)
 
     # Process the plant and branch information from the PRE_T001W dataset
-    processed_t001w_df = prep_plant_and_branches(T001W)
+    processed_t001w_df = prep_plant_and_branches(
+        quality.observe(registry["T001W"], "T001W")
+    )
 
     # Process the valuation area data from the PRE_T001K dataset
-    processed_t001k_df = prep_valuation_area(T001K)
+    processed_t001k_df = prep_valuation_area(
+        quality.observe(registry["T001K"], "T001K"), attrition
+    )
 
     # Process the company codes data from the PRE_T001 dataset
-    processed_t001_df = prep_company_codes(T001)
+    processed_t001_df = prep_company_codes(quality.observe(registry["T001"], "T001"))
+
+    # Persist and materialise the independent prepared tables concurrently, smallest first
+    prepared = {}
+    if prep_parallelism:
+        with metrics.stage("prepare_inputs"):
+            prepared = materialize_concurrently(
+                {
+                    "MARC": processed_marc_df,
+                    "MARA": processed_mara_df,
+                    "MBEW": processed_mbew_df,
+                    "T001W": processed_t001w_df,
+                    "T001K": processed_t001k_df,
+                    "T001": processed_t001_df,
+                },
+                prep_parallelism,
+                table_stats,
+            )
+        processed_marc_df = prepared["MARC"]
+        processed_mara_df = prepared["MARA"]
+        processed_mbew_df = prepared["MBEW"]
+        processed_t001w_df = prepared["T001W"]
+        processed_t001k_df = prepared["T001K"]
+        processed_t001_df = prepared["T001"]
 
     # Integrate all the processed datasets into a single DataFrame
-    integrated_data = integrate_data(
-        processed_marc_df,  # Plant data for materials
-        processed_mara_df,  # General material data
-        processed_mbew_df,  # Material valuation data
-        processed_t001w_df,  # Plant and branch information
-        processed_t001k_df,  # Valuation area data
-        processed_t001_df,  # Company codes data
-    )
+    with metrics.stage("integrate_data"):
+        integrated_data = integrate_data(
+            processed_marc_df,  # Plant data for materials
+            processed_mara_df,  # General material data
+            processed_mbew_df,  # Material valuation data
+            processed_t001w_df,  # Plant and branch information
+            processed_t001k_df,  # Valuation area data
+            processed_t001_df,  # Company codes data
+            table_stats=table_stats,
+            max_join_fanout=max_join_fanout,
+        )
 
     # Apply post-processing transformations on the integrated data
-    local_material = post_prep_local_material(integrated_data)
+    local_material = post_prep_local_material(
+        integrated_data, surrogate_keys, attrition
+    )
+
+    # Decode binary identifiers back to hex strings for the output
+    if encode_identifiers:
+        local_material = decode_identifier_columns(local_material)
 
     local_material = rename_and_select(
         local_material, LOCAL_MATERIAL_SCHEMA_WITH_RELAVENT_NAMES, False
     )
-    local_material = enforce_schema(local_material, UNIFIED_SCHEMA)
-    local_material = add_missing_columns(local_material, UNIFIED_SCHEMA)
+    # Keep the surrogate keys next to the readable keys when they were derived
+    output_schema = (
+        UNIFIED_SCHEMA_WITH_SURROGATE_KEYS if surrogate_keys else UNIFIED_SCHEMA
+    )
+    local_material = enforce_schema(local_material, output_schema)
+    local_material = add_missing_columns(local_material, output_schema)
 
     local_material = local_material.withColumn("system_name", F.lit(system_name))
 
-    # save df as csv in desired location
-    save_df_as_csv(local_material, output_dir, file_name)
+    # Count the written rows for the run history without an extra pass over the output
+    output = local_material
+    if history_path:
+        output_rows = Observation(f"{file_name.split('.')[0]}_output_rows")
+        output = local_material.observe(output_rows, F.count(F.lit(1)).alias("rows"))
+
+    # Keep the output in memory during the write for the steps that read it afterwards,
+    # instead of computing the whole pipeline again for each of them
+    keep_output = (
+        surrogate_key_report
+        or quality_checks
+        or (return_arrow and output_format != "arrow")
+    )
+    if keep_output:
+        output = output.persist()
+
+    try:
+        # Check the quality rules before the output is published, so a failing rule leaves the
+        # previous output in place. Counting the kept output also fills the input observations
+        if quality_checks:
+            with metrics.stage("materialize_output"):
+                output.count()
+            quality.executed(output)
+            attrition.executed(output)
+            with metrics.stage("quality_checks"):
+                quality.run(
+                    {"output": output},
+                    os.path.join(
+                        output_dir, f"{file_name.split('.')[0]}_quality_report.json"
+                    ),
+                )
+
+        # Save the output in the requested layout (CSV, Parquet, partitioned or bucketed)
+        with metrics.stage("write_output"):
+            write_output(
+                output,
+                output_dir,
+                file_name,
+                partition_by,
+                bucket_by,
+                num_buckets,
+                output_format,
+                sort_by,
+                bloom_filter_columns,
+            )
+
+        # The write evaluated every attrition checkpoint in the plan of the output
+        attrition.executed(output)
+
+        # Report surrogate key collisions of the written keys, in one pass over the kept output
+        if surrogate_key_report:
+            report_surrogate_key_collisions(
+                output,
+                report_path=os.path.join(
+                    output_dir,
+                    f"{file_name.split('.')[0]}_surrogate_key_collisions.json",
+                ),
+            )
+
+        # Report the statistics downstream scans skip the files and row groups of the output by
+        if bucket_by or output_format == "parquet":
+            parquet_statistics_report(
+                os.path.join(output_dir, file_name.split(".")[0]),
+                list(dict.fromkeys((bucket_by or sort_by) + bloom_filter_columns)),
+                os.path.join(
+                    output_dir, f"{file_name.split('.')[0]}_parquet_statistics.json"
+                ),
+            )
+
+        # Index the output by its key columns for point lookups
+        if lookup_index:
+            with metrics.stage("lookup_index"):
+                for key_column in LOOKUP_INDEX_COLUMNS["local_material"]:
+                    build_lookup_index(
+                        os.path.join(
+                            output_dir,
+                            file_name.split(".")[0] + ("" if partition_by else ".csv"),
+                        ),
+                        key_column,
+                    )
+
+        if history_path:
+            record_run(
+                history_path,
+                "local_material",
+                file_name.split(".")[0],
+                run_started,
+                time.time() - run_started,
+                system_name=system_name,
+                input_bytes=input_table_bytes(
+                    run_parameters["data_dir"], LOCAL_MATERIAL_TABLES
+                ),
+                stage_timings=metrics.timings,
+                output_rows=output_rows.get["rows"],
+                parameters=run_parameters,
+            )
+
+        # Hand the output to in-process consumers as Arrow record batches, without a file round trip
+        if return_arrow:
+            if output_format == "arrow":
+                batches = read_arrow_batches(
+                    os.path.join(output_dir, file_name.split(".")[0])
+                )
+            else:
+                batches = to_arrow_batches(
+                    output,
+                    os.path.join(output_dir, f"{file_name.split('.')[0]}_arrow"),
+                )
+    finally:
+        # Write the diagnostics also for a run a quality rule stopped
+        if stage_metrics:
+            metrics.write_summary(
+                os.path.join(
+                    output_dir, f"{file_name.split('.')[0]}_stage_metrics.json"
+                )
+            )
+
+        if attrition_report:
+            attrition.write_report(
+                os.path.join(
+                    output_dir, f"{file_name.split('.')[0]}_attrition_report.json"
+                )
+            )
+
+        # Release the persisted prepared tables, the inputs cached while reading them and the
+        # output kept for the steps after the write
+        for df in prepared.values():
+            df.unpersist()
+        input_registry.release()
+        if keep_output:
+            output.unpersist()
+
+    if return_arrow:
+        return batches
 
     return local_material
@@ -2,6 +2,46 @@
 Package for SAP Data Processing schemas
 """
 
+from .constants import (
+    BLOOM_FILTER_COLUMNS,
+    BROADCAST_THRESHOLD_BYTES,
+    CHUNK_SUFFIX_PATTERN,
+    COLUMNAR_FILE_EXTENSIONS,
+    CORRUPT_RECORD_COLUMN,
+    CSV_FILE_EXTENSIONS,
+    DEFAULT_BUCKET_COLUMNS,
+    DEFAULT_NUM_BUCKETS,
+    FILE_FORMAT_MAGIC_BYTES,
+    FILE_FORMAT_READ_OPTIONS,
+    HEX_IDENTIFIER_COLUMNS,
+    HEX_IDENTIFIER_PATTERN,
+    KPI_CUBE_DIMENSIONS,
+    KPI_CUBE_ORDER_COLUMNS,
+    KPI_CUBE_PARTITION_COLUMNS,
+    KPI_CUBE_PERCENTILES,
+    LATE_DELIVERY_BUCKETS,
+    LATE_DELIVERY_DEFAULT_BUCKET,
+    LOCAL_MATERIAL_QUALITY_RULES,
+    LOCAL_MATERIAL_TABLES,
+    LOOKUP_INDEX_COLUMNS,
+    METRICS_GC_FRACTION_THRESHOLD,
+    METRICS_SKEW_RATIO_THRESHOLD,
+    OUTPUT_SORT_COLUMNS,
+    PROCESS_ORDER_QUALITY_RULES,
+    PROCESS_ORDER_TABLES,
+    RUN_HISTORY_BASELINE_WINDOW,
+    RUN_HISTORY_PLAN_PARAMETERS,
+    RUN_HISTORY_REGRESSION_THRESHOLD,
+    SAMPLE_KEY_COLUMNS,
+    SAMPLE_RELATED_TABLES,
+    SAMPLE_SEED,
+    SAP_DATE_COLUMNS,
+    SAP_DATE_FORMATS,
+    SAP_NULL_DATES,
+    SCAN_FILTERS,
+    TABLE_KEY_COLUMNS,
+    TARGET_SHUFFLE_PARTITION_BYTES,
+)
 from .schema_hormanization_stats import (
     LOCAL_MATERIAL_SCHEMA_WITH_RELAVENT_NAMES,
     PROCESS_ORDER_SCHEMA_WITH_RELAVENT_NAMES,
@@ -16,7 +56,9 @@ from .schemas import (
     MARC_SCHEMA,
     MBEW_SCHEMA,
     PLANT_DATA_SCHEMA,
+    SURROGATE_KEY_SCHEMA,
     UNIFIED_SCHEMA,
+    UNIFIED_SCHEMA_WITH_SURROGATE_KEYS,
     VALUATION_DATA_SCHEMA,
 )
 
@@ -32,6 +74,46 @@ __all__ = [
     "AUFK_SCHEMA",
     "AFPO_SCHEMA",
     "UNIFIED_SCHEMA",
+    "SURROGATE_KEY_SCHEMA",
+    "UNIFIED_SCHEMA_WITH_SURROGATE_KEYS",
     "PROCESS_ORDER_SCHEMA_WITH_RELAVENT_NAMES",
     "LOCAL_MATERIAL_SCHEMA_WITH_RELAVENT_NAMES",
+    "HEX_IDENTIFIER_COLUMNS",
+    "HEX_IDENTIFIER_PATTERN",
+    "DEFAULT_BUCKET_COLUMNS",
+    "DEFAULT_NUM_BUCKETS",
+    "LOCAL_MATERIAL_QUALITY_RULES",
+    "PROCESS_ORDER_QUALITY_RULES",
+    "TABLE_KEY_COLUMNS",
+    "BROADCAST_THRESHOLD_BYTES",
+    "TARGET_SHUFFLE_PARTITION_BYTES",
+    "SAP_DATE_FORMATS",
+    "SAP_DATE_COLUMNS",
+    "SAP_NULL_DATES",
+    "LATE_DELIVERY_BUCKETS",
+    "LATE_DELIVERY_DEFAULT_BUCKET",
+    "KPI_CUBE_DIMENSIONS",
+    "KPI_CUBE_PARTITION_COLUMNS",
+    "KPI_CUBE_ORDER_COLUMNS",
+    "KPI_CUBE_PERCENTILES",
+    "CSV_FILE_EXTENSIONS",
+    "CHUNK_SUFFIX_PATTERN",
+    "LOCAL_MATERIAL_TABLES",
+    "PROCESS_ORDER_TABLES",
+    "COLUMNAR_FILE_EXTENSIONS",
+    "FILE_FORMAT_MAGIC_BYTES",
+    "FILE_FORMAT_READ_OPTIONS",
+    "SCAN_FILTERS",
+    "CORRUPT_RECORD_COLUMN",
+    "METRICS_SKEW_RATIO_THRESHOLD",
+    "METRICS_GC_FRACTION_THRESHOLD",
+    "RUN_HISTORY_BASELINE_WINDOW",
+    "RUN_HISTORY_PLAN_PARAMETERS",
+    "RUN_HISTORY_REGRESSION_THRESHOLD",
+    "SAMPLE_KEY_COLUMNS",
+    "SAMPLE_RELATED_TABLES",
+    "SAMPLE_SEED",
+    "LOOKUP_INDEX_COLUMNS",
+    "OUTPUT_SORT_COLUMNS",
+    "BLOOM_FILTER_COLUMNS",
 ]
@@ -0,0 +1,319 @@
+"""
+This module defines the configuration constants used by the ETL pipeline. Constants are grouped
+here to avoid hardcoding values in multiple places and to provide a single source of truth for
+tunable parameters.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Identifier columns that are candidates for binary encoding. The SAP extracts deliver these as
+# 64-character SHA-256 hex strings, which can be stored as 32-byte binary values instead.
+HEX_IDENTIFIER_COLUMNS = [
+    "SOURCE_SYSTEM_ERP",  # Source ERP system identifier
+    "MANDT",  # Client
+    "MATNR",  # Material Number
+    "WERKS",  # Plant
+    "BWKEY",  # Valuation Area
+    "BUKRS",  # Company Code
+    "AUFNR",  # Order Number
+    "POSNR",  # Order Item Number
+    "DWERK",  # Plant (order item)
+    "OBJNR",  # Object Number
+]
+
+# Regular expression a value must match to be stored as binary (lower case keeps the round trip lossless)
+HEX_IDENTIFIER_PATTERN = "^[0-9a-f]{64}$"
+
+# Bucketing used for the pipeline outputs; both pipelines share it, so downstream joins between
+# local material and process order outputs can run as shuffle-free sort-merge joins.
+DEFAULT_BUCKET_COLUMNS = ["material_number", "plant"]
+DEFAULT_NUM_BUCKETS = 16
+
+# Declarative data quality rules per pipeline, keyed by the frame they are evaluated on (the SAP
+# table name of an input or "output"). Every check yields the fraction of "bad" rows, which is
+# compared with the optional `warn` and `fail` thresholds (see `ace.utils.run_quality_checks`).
+LOCAL_MATERIAL_QUALITY_RULES = {
+    "MARC": [
+        {
+            "name": "marc_matnr_null_rate",
+            "check": "null_rate",
+            "column": "MATNR",
+            "fail": 0.0,
+        },
+        {
+            "name": "marc_werks_null_rate",
+            "check": "null_rate",
+            "column": "WERKS",
+            "fail": 0.0,
+        },
+    ],
+    "MARA": [
+        {
+            "name": "mara_matnr_null_rate",
+            "check": "null_rate",
+            "column": "MATNR",
+            "fail": 0.0,
+        },
+        {
+            "name": "mara_matnr_duplicate_rate",
+            "check": "duplicate_rate",
+            "columns": ["MANDT", "MATNR"],
+            "approximate": True,
+            "warn": 0.0,
+        },
+    ],
+    "output": [
+        {
+            "name": "primary_key_inter_duplicate_rate",
+            "check": "duplicate_rate",
+            "columns": ["primary_key_inter"],
+            "fail": 0.0,
+        },
+        {
+            "name": "material_number_null_rate",
+            "check": "null_rate",
+            "column": "material_number",
+            "fail": 0.0,
+        },
+        {
+            "name": "plant_null_rate",
+            "check": "null_rate",
+            "column": "plant",
+            "fail": 0.0,
+        },
+        {
+            "name": "standard_price_out_of_range_rate",
+            "check": "out_of_range_rate",
+            "column": "standard_price",
+            "min": 0,
+            "warn": 0.0,
+        },
+        {
+            "name": "row_attrition",
+            "check": "attrition_rate",
+            "reference": "MARC",
+            "warn": 0.25,
+            "fail": 0.99,
+        },
+    ],
+}
+
+PROCESS_ORDER_QUALITY_RULES = {
+    "AFKO": [
+        {
+            "name": "afko_aufnr_null_rate",
+            "check": "null_rate",
+            "column": "AUFNR",
+            "fail": 0.0,
+        },
+        {
+            "name": "afko_aufnr_duplicate_rate",
+            "check": "duplicate_rate",
+            "columns": ["AUFNR"],
+            "approximate": True,
+            "warn": 0.0,
+        },
+    ],
+    "AFPO": [
+        {
+            "name": "afpo_aufnr_null_rate",
+            "check": "null_rate",
+            "column": "AUFNR",
+            "fail": 0.0,
+        },
+        {
+            "name": "afpo_matnr_null_rate",
+            "check": "null_rate",
+            "column": "MATNR",
+            "warn": 0.0,
+        },
+    ],
+    "output": [
+        {
+            "name": "primary_key_inter_duplicate_rate",
+            "check": "duplicate_rate",
+            "columns": ["primary_key_inter"],
+            "fail": 0.0,
+        },
+        {
+            "name": "order_number_null_rate",
+            "check": "null_rate",
+            "column": "order_number",
+            "fail": 0.0,
+        },
+        {
+            "name": "on_time_deviation_out_of_range_rate",
+            "check": "out_of_range_rate",
+            "column": "actual_on_time_deviation",
+            "min": -3650,
+            "max": 3650,
+            "warn": 0.0,
+        },
+        {
+            "name": "row_attrition",
+            "check": "attrition_rate",
+            "reference": "AFKO",
+            "warn": 0.25,
+            "fail": 0.99,
+        },
+    ],
+}
+
+# Key columns whose approximate distinct counts are recorded when the input tables are profiled
+TABLE_KEY_COLUMNS = ["MANDT", "MATNR", "WERKS", "BWKEY", "BUKRS", "AUFNR", "OBJNR"]
+
+# Tables up to this size (on disk) are broadcast to the joins when table statistics are available
+BROADCAST_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+# Target amount of input data per shuffle partition when table statistics are available
+TARGET_SHUFFLE_PARTITION_BYTES = 128 * 1024 * 1024
+
+# Formats the SAP extracts deliver dates in, tried in order when a date field is parsed
+SAP_DATE_FORMATS = ["yyyy-MM-dd", "yyyyMMdd", "dd.MM.yyyy"]
+
+# SAP date fields parsed to DateType once at ingest, with the formats to try per field
+SAP_DATE_COLUMNS = {
+    "GLTRP": SAP_DATE_FORMATS,  # Basic Finish Date
+    "GSTRP": SAP_DATE_FORMATS,  # Basic Start Date
+    "GSTRI": SAP_DATE_FORMATS,  # Actual Start Date
+    "LTRMI": SAP_DATE_FORMATS,  # Actual Delivery/Finish Date
+    "ERDAT": SAP_DATE_FORMATS,  # Creation Date
+    "ZZGLTRP_ORIG": SAP_DATE_FORMATS,  # Original Basic Finish Date
+}
+
+# Values SAP uses for an empty date; they are parsed to null
+SAP_NULL_DATES = ["00000000", "0000-00-00"]
+
+# Late delivery buckets of the process order KPIs: the first bucket whose upper bound (in days of
+# deviation between ZZGLTRP_ORIG and LTRMI, inclusive) is not exceeded applies, otherwise the default
+LATE_DELIVERY_BUCKETS = [
+    (0, "On-Time"),
+    (5, "Slightly Late"),
+    (10, "Moderately Late"),
+]
+LATE_DELIVERY_DEFAULT_BUCKET = "Severely Late"
+
+# On-time delivery KPI cube of the process order output: one row per dimension combination, stored
+# partitioned by system and start month so a refresh only rewrites the months of the new orders
+KPI_CUBE_DIMENSIONS = [
+    "system_name",
+    "start_date_month",
+    "plant",
+    "order_type",
+    "mto_vs_mts_flag",
+]
+KPI_CUBE_PARTITION_COLUMNS = ["system_name", "start_date_month"]
+KPI_CUBE_PERCENTILES = [0.5, 0.9, 0.95]
+
+# Columns of the orders behind the cube, kept per month so a refresh can re-aggregate its months
+# from all their orders (percentiles cannot be merged from partial aggregates)
+KPI_CUBE_ORDER_COLUMNS = [
+    "primary_key_inter",
+    "system_name",
+    "start_date",
+    "plant",
+    "order_type",
+    "mto_vs_mts_flag",
+    "on_time_flag",
+    "actual_on_time_deviation",
+    "late_delivery_bucket",
+]
+
+# Extensions of the CSV extracts read by `read_multiple_data`; compressed extracts are
+# decompressed by Spark based on the extension
+CSV_FILE_EXTENSIONS = [".csv", ".csv.gz", ".csv.bz2", ".csv.zst"]
+
+# Extensions of the columnar extracts read by `read_multiple_data`, with their Spark format; a file or
+# Spark output directory (e.g. PRD_MARC.parquet/) is read natively, with filter and column pushdown
+COLUMNAR_FILE_EXTENSIONS = {".parquet": "parquet", ".orc": "orc", ".avro": "avro"}
+
+# Leading magic bytes of the columnar formats, used for extracts without a known extension
+FILE_FORMAT_MAGIC_BYTES = {b"PAR1": "parquet", b"ORC": "orc", b"Obj\x01": "avro"}
+
+# Reader options per format of the extracts; the columnar formats carry their own schema
+FILE_FORMAT_READ_OPTIONS = {"csv": {"header": "true", "inferSchema": "true"}}
+
+# Column that collects the raw text of malformed CSV rows when the ingestion quarantines bad records
+CORRUPT_RECORD_COLUMN = "_corrupt_record"
+
+# Suffix of the chunks a large table is split into by the extractor (e.g. PRD_MARC_0001.csv)
+CHUNK_SUFFIX_PATTERN = r"_\d+$"
+
+# Input tables each pipeline reads; extracts of other tables in the data directory are ignored
+LOCAL_MATERIAL_TABLES = ["MARA", "MBEW", "MARC", "T001W", "T001K", "T001"]
+PROCESS_ORDER_TABLES = ["AFKO", "AFPO", "AUFK", "MARA"]
+
+# Row filters of the prep steps on deletion and validity flags, by table and filter name. A row passes
+# a filter if any of its conditions holds; a condition is `(column, "is_null")`, `(column, "eq", value)`
+# or `(column, "not_in", values)`. The same definitions are pushed into columnar scans, used to sort
+# staged extracts and evaluated against Parquet row group statistics (see `ace.utils._pushdown_utils`)
+SCAN_FILTERS = {
+    "MARA": {
+        "valid_old_material_number": [
+            ("BISMT", "is_null"),
+            ("BISMT", "not_in", ["ARCHIVE", "DUPLICATE", "RENUMBERED"]),
+        ],
+        "material_not_deleted": [("LVORM", "is_null"), ("LVORM", "eq", "")],
+    },
+    "MBEW": {
+        "material_not_deleted": [("LVORM", "is_null")],
+        "no_split_valuation": [("BWTAR", "is_null")],
+    },
+    "MARC": {
+        "material_not_deleted": [("LVORM", "is_null")],
+    },
+}
+
+# Stage metrics flags: a Spark stage is skewed if its slowest task runs this many times longer than
+# its median task, and GC bound if garbage collection takes this fraction of its run time
+METRICS_SKEW_RATIO_THRESHOLD = 3.0
+METRICS_GC_FRACTION_THRESHOLD = 0.1
+
+# Run history: a run is flagged as a regression if its throughput (input bytes per second) falls this
+# fraction below the median throughput of the previous runs of the same pipeline and output
+RUN_HISTORY_BASELINE_WINDOW = 5
+RUN_HISTORY_REGRESSION_THRESHOLD = 0.2
+
+# Run history: parameters that change the plan of a run, with their defaults. Runs are only compared
+# with runs of the same values; a parameter defaulting to False only counts whether it is set
+RUN_HISTORY_PLAN_PARAMETERS = {
+    "sample": None,
+    "output_format": "csv",
+    "stage_metrics": False,
+    "quality_checks": False,
+    "surrogate_keys": False,
+    "surrogate_key_report": False,
+    "validated_dir": False,
+}
+
+# Development samples (`--sample`): the driving key of each pipeline is sampled by its hash, so every
+# table with that key keeps the same keys. A related table without the key keeps the rows matching a
+# sampled table (`table: (sampled table, join keys)`); the small reference tables are read in full
+SAMPLE_KEY_COLUMNS = {"local_material": "MATNR", "process_order": "AUFNR"}
+SAMPLE_RELATED_TABLES = {
+    "local_material": {},
+    "process_order": {"MARA": ("AFPO", ["MATNR"])},
+}
+SAMPLE_SEED = 42
+
+# Key columns of the point lookup indexes built over the CSV outputs (`--lookup_index`, `ace-lookup`)
+LOOKUP_INDEX_COLUMNS = {
+    "local_material": ["primary_key_inter", "material_number"],
+    "process_order": ["primary_key_inter", "order_number", "material_number"],
+}
+
+# Parquet outputs (`--output_format parquet`): columns the rows are sorted by within the files, so
+# the min/max statistics of the files and row groups are selective, and high-cardinality key
+# columns that get Bloom filters for point lookups
+OUTPUT_SORT_COLUMNS = {
+    "local_material": ["plant", "material_number"],
+    "process_order": ["plant", "order_number"],
+}
+BLOOM_FILTER_COLUMNS = {
+    "local_material": ["material_number", "primary_key_inter"],
+    "process_order": ["order_number", "material_number"],
+}
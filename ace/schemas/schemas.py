@@ -87,8 +87,8 @@ AFKO_SCHEMA = T.StructType(
         T.StructField("start_date", T.DateType(), True),
         T.StructField("finish_date", T.DateType(), True),
         # Add additional fields like GLTRP, GSTRP, FTRMS, DISPO, FEVOR, PLGRP, FHORI, AUFPL, etc.
-        T.StructField("GLTRP", T.StringType(), True),
-        T.StructField("GSTRI", T.StringType(), True),
+        T.StructField("GLTRP", T.DateType(), True),
+        T.StructField("GSTRI", T.DateType(), True),
         # T.StructField("DISPO", T.StringType(), True),
     ]
 )
@@ -102,7 +102,7 @@ AFPO_SCHEMA = T.StructType(
         # T.StructField("MEINS", T.StringType(), True),  # Unit of Measure (optional)
         T.StructField("KDAUF", T.StringType(), True),  # Sales Order Number (optional)
         # T.StructField("KDPOS", T.StringType(), True),   # Sales Order Item (optional)
-        T.StructField("LTRMI", T.StringType(), True),
+        T.StructField("LTRMI", T.DateType(), True),
     ]
 )
 
@@ -110,12 +110,10 @@ AUFK_SCHEMA = T.StructType(
     [
         T.StructField("AUFNR", T.StringType(), True),  # Order Number
         T.StructField("OBJNR", T.StringType(), True),  # Object Number
-        T.StructField("ERDAT", T.StringType(), True),  # Creation Date
+        T.StructField("ERDAT", T.DateType(), True),  # Creation Date
         T.StructField("ERNAM", T.StringType(), True),  # Created By
         T.StructField("AUART", T.StringType(), True),  # Order Type
-        T.StructField(
-            "ZZGLTRP_ORIG", T.StringType(), True
-        ),  # Original Basic Finish Date
+        T.StructField("ZZGLTRP_ORIG", T.DateType(), True),  # Original Basic Finish Date
         T.StructField("ZZPRO_TEXT", T.StringType(), True),  # Project Text
     ]
 )
@@ -193,3 +191,15 @@ UNIFIED_SCHEMA = T.StructType(
         ),  # Parsed timestamp
     ]
 )
+
+# Narrow 64-bit surrogate keys emitted next to the readable concatenated keys
+SURROGATE_KEY_SCHEMA = T.StructType(
+    [
+        T.StructField("surrogate_key_intra", T.LongType(), True),
+        T.StructField("surrogate_key_inter", T.LongType(), True),
+    ]
+)
+
+UNIFIED_SCHEMA_WITH_SURROGATE_KEYS = T.StructType(
+    UNIFIED_SCHEMA.fields[:4] + SURROGATE_KEY_SCHEMA.fields + UNIFIED_SCHEMA.fields[4:]
+)
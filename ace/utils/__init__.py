@@ -2,8 +2,13 @@
 Package for SAP Data Processing and Transformation
 """
 
+from ._arrow_utils import read_arrow_batches, to_arrow_batches, to_arrow_table
+from ._attrition_utils import AttritionTracker
 from ._business_utils import (
+    build_on_time_kpi_cube,
     dataframe_with_enforced_schema,
+    derive_surrogate_key,
+    detect_surrogate_key_collisions,
     integrate_data,
     integration_order,
     post_prep_local_material,
@@ -15,18 +20,71 @@ from ._business_utils import (
     prep_plant_and_branches,
     prep_plant_data_for_material,
     prep_valuation_area,
+    refresh_on_time_kpi_cube,
+    report_surrogate_key_collisions,
+)
+from ._concurrency_utils import (
+    estimated_size_bytes,
+    fair_spark_session,
+    materialize_concurrently,
+    run_pipelines_concurrently,
+)
+from ._data_skipping_utils import parquet_statistics_report
+from ._history_utils import (
+    detect_regressions,
+    input_table_bytes,
+    load_run_history,
+    perf_report,
+    record_run,
+)
+from ._lookup_utils import LookupIndex, build_lookup_index
+from ._metrics_utils import StageMetricsCollector
+from ._pushdown_utils import scan_filter, scan_filter_report, stage_table_files
+from ._quality_utils import (
+    QualityObserver,
+    compute_quality_metrics,
+    run_quality_checks,
+    validate_quality_rules,
+)
+from ._registry_utils import TableRegistry
+from ._sampling_utils import sample_by_key, sample_registry
+from ._statistics_utils import (
+    broadcast_if_small,
+    check_join_fanout,
+    check_join_fanouts,
+    estimate_join_fanout,
+    profile_table,
+    profile_tables,
+    shuffle_join_sides,
+    suggest_shuffle_partitions,
+    table_fingerprint,
 )
 from ._use_case_utils import (
     add_missing_columns,
+    add_partition_columns,
     compare_dataframes,
+    decode_identifier_column,
+    decode_identifier_columns,
+    detect_file_format,
+    discover_table_files,
+    encode_identifier_columns,
     enforce_schema,
+    parse_sap_dates,
     process_data,
     read_file,
     read_multiple_data,
+    read_table,
+    reduce_by_driving_keys,
+    register_bucketed_table,
     rename_and_select,
+    save_df_as_arrow,
+    save_df_as_bucketed_table,
     save_df_as_csv,
+    save_df_as_parquet,
     union_many,
+    write_output,
 )
+from ._validation_utils import validate_csv_file, validate_extracts
 
 __all__ = [
     "read_file",
@@ -50,4 +108,61 @@ __all__ = [
     "rename_and_select",
     "add_missing_columns",
     "union_many",
+    "derive_surrogate_key",
+    "detect_surrogate_key_collisions",
+    "report_surrogate_key_collisions",
+    "encode_identifier_columns",
+    "decode_identifier_column",
+    "decode_identifier_columns",
+    "add_partition_columns",
+    "save_df_as_bucketed_table",
+    "register_bucketed_table",
+    "write_output",
+    "QualityObserver",
+    "compute_quality_metrics",
+    "run_quality_checks",
+    "validate_quality_rules",
+    "table_fingerprint",
+    "profile_table",
+    "profile_tables",
+    "broadcast_if_small",
+    "suggest_shuffle_partitions",
+    "shuffle_join_sides",
+    "estimate_join_fanout",
+    "check_join_fanout",
+    "check_join_fanouts",
+    "reduce_by_driving_keys",
+    "parse_sap_dates",
+    "build_on_time_kpi_cube",
+    "refresh_on_time_kpi_cube",
+    "TableRegistry",
+    "fair_spark_session",
+    "run_pipelines_concurrently",
+    "estimated_size_bytes",
+    "materialize_concurrently",
+    "discover_table_files",
+    "read_table",
+    "detect_file_format",
+    "scan_filter",
+    "stage_table_files",
+    "scan_filter_report",
+    "validate_csv_file",
+    "validate_extracts",
+    "StageMetricsCollector",
+    "input_table_bytes",
+    "record_run",
+    "load_run_history",
+    "detect_regressions",
+    "perf_report",
+    "AttritionTracker",
+    "sample_by_key",
+    "sample_registry",
+    "build_lookup_index",
+    "LookupIndex",
+    "save_df_as_parquet",
+    "parquet_statistics_report",
+    "save_df_as_arrow",
+    "to_arrow_table",
+    "read_arrow_batches",
+    "to_arrow_batches",
 ]
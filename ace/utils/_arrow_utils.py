@@ -0,0 +1,169 @@
+"""
+Arrow Export of the Pipeline Outputs for Python Consumers
+
+Python services that run the pipelines in-process used to read the written CSV back with pandas,
+parsing every value a second time. The functions of this module hand them the output as Arrow
+record batches instead:
+
+- `to_arrow_table` collects a DataFrame on the driver with Spark's Arrow serialisation
+  (`DataFrame.toArrow` where available), without converting the rows to Python objects.
+- `read_arrow_batches` memory-maps the Arrow IPC (Feather v2) files written by `save_df_as_arrow`
+  (`--output_format arrow`) and yields their record batches without copying them, so outputs
+  larger than the driver memory can be streamed.
+- `to_arrow_batches` streams a DataFrame either way: fetched one partition at a time, or spilled
+  to Arrow IPC files by the executors with `mapInArrow` and read back memory-mapped.
+
+The pipelines return their output this way with `return_arrow=True`, spilled next to the output.
+
+Example usage:
+--------------
+>>> for batch in process_local_material(..., return_arrow=True):
+...     handle(batch.to_pandas())
+>>> batches = to_arrow_batches(df, spill_dir="/path/to/spill/local_material")
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import glob
+import os
+from typing import Iterator, Optional
+
+# Pyspark libraries
+from pyspark.sql import DataFrame
+
+# Custom utils imports
+from ace.utils._use_case_utils import _write_arrow_files, process_data
+
+
+def _stream_arrow_batches(df: DataFrame) -> Iterator:
+    """
+    Yields the Arrow record batches of a DataFrame, fetching one partition at a time.
+
+    The executors serialise the record batches Spark already converts to Arrow (`mapInArrow`) as
+    Arrow IPC streams, and `toLocalIterator` sends them to the driver partition by partition, so
+    the values are never converted to Python objects and only one partition is held at once.
+    """
+    import pyarrow as pa
+
+    def serialise_batches(batches):
+        for batch in batches:
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, batch.schema) as writer:
+                writer.write_batch(batch)
+            yield pa.RecordBatch.from_pydict({"batch": [sink.getvalue().to_pybytes()]})
+
+    for row in df.mapInArrow(serialise_batches, "batch binary").toLocalIterator():
+        yield from pa.ipc.open_stream(row.batch)
+
+
+def to_arrow_table(df: DataFrame):
+    """
+    Collects a DataFrame on the driver as an Arrow table.
+
+    Uses `DataFrame.toArrow` (Spark 4) or gathers the record batches the executors convert to
+    Arrow (see `_stream_arrow_batches`), so the values are never converted to rows. The whole
+    table is held in the driver memory; stream large DataFrames with `to_arrow_batches`.
+
+    args:
+    -----
+    - df : DataFrame
+        The DataFrame to collect.
+
+    Returns:
+    --------
+    pyarrow.Table
+        The rows of the DataFrame, with its schema also if it is empty.
+    """
+    # Check input parameters
+    process_data(dataframe_check=df)
+
+    import pyarrow as pa
+    from pyspark.sql.pandas.types import to_arrow_schema
+
+    if hasattr(df, "toArrow"):
+        return df.toArrow()
+
+    batches = list(_stream_arrow_batches(df))
+    if not batches:
+        return to_arrow_schema(df.schema).empty_table()
+
+    return pa.Table.from_batches(batches)
+
+
+def read_arrow_batches(path: str) -> Iterator:
+    """
+    Yields the record batches of Arrow IPC files, memory-mapped without copying them.
+
+    The batches reference the mapped files; the operating system pages them in as they are read,
+    so only the batches in use take memory.
+
+    args:
+    -----
+    - path : str
+        An Arrow IPC file, or a directory of `*.arrow` files (e.g. written by `save_df_as_arrow`).
+
+    Returns:
+    --------
+    Iterator[pyarrow.RecordBatch]
+        The record batches of the files, in file order.
+
+    Raises:
+    -------
+    FileNotFoundError
+        If the path has no Arrow IPC files.
+    """
+    # Check input parameters
+    process_data(string_check=path)
+
+    if os.path.isdir(path):
+        file_paths = sorted(glob.glob(os.path.join(path, "*.arrow")))
+    else:
+        file_paths = [path] if os.path.isfile(path) else []
+    if not file_paths:
+        raise FileNotFoundError(f"No Arrow IPC files found in '{path}'.")
+
+    def batches():
+        import pyarrow as pa
+
+        for file_path in file_paths:
+            reader = pa.ipc.open_file(pa.memory_map(file_path, "r"))
+            for index in range(reader.num_record_batches):
+                yield reader.get_batch(index)
+
+    return batches()
+
+
+def to_arrow_batches(df: DataFrame, spill_dir: Optional[str] = None) -> Iterator:
+    """
+    Streams a DataFrame as Arrow record batches.
+
+    args:
+    -----
+    - df : DataFrame
+        The DataFrame to export.
+    - spill_dir : str, optional
+        If given, the executors write the partitions to Arrow IPC files in this directory
+        (replacing its content; see `save_df_as_arrow`), which are then read memory-mapped, so
+        the DataFrame is computed once, up front, and its batches take no memory until they are
+        read. The directory must be reachable by the executors and the driver; the files stay
+        for other consumers. Otherwise the partitions are fetched one at a time while the
+        batches are consumed, which computes the DataFrame lazily during the iteration.
+
+    Returns:
+    --------
+    Iterator[pyarrow.RecordBatch]
+        The record batches of the DataFrame.
+    """
+    # Check input parameters
+    process_data(dataframe_check=df)
+
+    if spill_dir is None:
+        return _stream_arrow_batches(df)
+
+    _write_arrow_files(df, os.path.abspath(spill_dir))
+    return read_arrow_batches(os.path.abspath(spill_dir))
@@ -0,0 +1,177 @@
+"""
+Row Attrition of the SAP Data Pipelines
+
+The prep steps drop rows with several filters (archived old material numbers, deletion flags,
+split valuation) and deduplications. Counting the rows after each of them with `count()` would
+run the lineage once per count. `AttritionTracker` instead attaches an `Observation` (a row count
+of `Dataset.observe`) to every checkpoint of the plan; Spark fills all of them while the pipeline
+runs its own actions, and the funnel is read after the final write at no extra scan cost.
+
+An observation collects its counts during the first action that evaluates its checkpoint (the
+materialisation of the prepared tables or the output write). After the write, the pipelines pass
+the written frame to `executed`, and only the checkpoints in its plan are read; a checkpoint no
+action evaluated is reported without a count instead of being waited for. Checkpoints on the raw
+inputs sit between the scan and the filters, so while tracking, the prep filters are evaluated
+after the scan instead of being pushed into columnar scans.
+
+Example usage:
+--------------
+>>> attrition = AttritionTracker()
+>>> mbew = prep_material_valuation(registry["MBEW"], attrition=attrition)
+>>> write_output(output, ...)
+>>> attrition.executed(output)
+>>> attrition.write_report("/path/to/attrition_report.json")
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import json
+import os
+import uuid
+
+# Pyspark libraries
+import pyspark.sql.functions as F
+from pyspark.sql import DataFrame, Observation
+
+# Custom utils imports
+from ace.utils._use_case_utils import process_data
+
+
+class AttritionTracker:
+    """
+    Counts the rows at the checkpoints of the prep steps with observations.
+
+    args:
+    -----
+    - enabled : bool, optional (default=True)
+        If False, `track` returns the DataFrames unchanged, so the pipelines can use the tracker
+        unconditionally.
+    """
+
+    def __init__(self, enabled: bool = True):
+        # Check input parameters
+        process_data(boolean_check=enabled)
+
+        self.enabled = enabled
+        self._checkpoints = []
+        self._executed = set()
+
+    def track(self, df: DataFrame, table: str, step: str) -> DataFrame:
+        """
+        Counts the rows of a DataFrame at a checkpoint, when it is first evaluated.
+
+        args:
+        -----
+        - df : DataFrame
+            The DataFrame at the checkpoint.
+        - table : str
+            The table of the funnel (e.g. 'MBEW').
+        - step : str
+            The checkpoint, usually the name of the filter the rows passed (e.g. 'input',
+            'material_not_deleted').
+
+        Returns:
+        --------
+        DataFrame
+            The observed DataFrame, to be used in place of `df`.
+        """
+        if not self.enabled:
+            return df
+
+        # A unique name finds the checkpoint in the plans of the executed frames
+        name = f"attrition_{uuid.uuid4().hex}"
+        observation = Observation(name)
+        self._checkpoints.append((table, step, name, observation))
+        return df.observe(observation, F.count(F.lit(1)).alias("rows"))
+
+    def executed(self, df: DataFrame) -> None:
+        """
+        Marks the checkpoints in the plan of a DataFrame an action has run on as evaluated.
+
+        args:
+        -----
+        - df : DataFrame
+            A DataFrame whose action has finished, e.g. the written output.
+        """
+        if not self.enabled or not self._checkpoints:
+            return
+
+        plan = df._jdf.queryExecution().analyzed().toString()
+        self._executed.update(
+            name for _, _, name, _ in self._checkpoints if name in plan
+        )
+
+    def funnel(self) -> list:
+        """
+        Returns the row counts of all checkpoints with the rows each step dropped.
+
+        Only the checkpoints of executed frames are read (see `executed`); reading another one
+        would block until an action evaluates it, which may never come.
+
+        Returns:
+        --------
+        list
+            One entry per checkpoint, in the order they were tracked, with the table, the step,
+            the rows and the rows dropped since the previous checkpoint of the table (None for
+            the first checkpoint, or if a count is missing).
+        """
+        funnel, previous_rows = [], {}
+        for table, step, name, observation in self._checkpoints:
+            rows = observation.get["rows"] if name in self._executed else None
+            previous = previous_rows.get(table)
+            funnel.append(
+                {
+                    "table": table,
+                    "step": step,
+                    "rows": rows,
+                    "dropped": (
+                        previous - rows
+                        if previous is not None and rows is not None
+                        else None
+                    ),
+                }
+            )
+            previous_rows[table] = rows
+
+        return funnel
+
+    def write_report(self, report_path: str) -> list:
+        """
+        Writes the attrition funnel to a JSON file and prints it per table.
+
+        args:
+        -----
+        - report_path : str
+            The JSON file the funnel is written to.
+
+        Returns:
+        --------
+        list
+            The funnel (see `funnel`).
+        """
+        # Check input parameters
+        process_data(string_check=report_path)
+
+        funnel = self.funnel()
+
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w") as report_file:
+            json.dump(funnel, report_file, indent=2)
+
+        tables = {}
+        for checkpoint in funnel:
+            tables.setdefault(checkpoint["table"], []).append(checkpoint)
+        for table, checkpoints in tables.items():
+            steps = [
+                f"{c['step']} {c['rows']}"
+                + (f" (-{c['dropped']})" if c["dropped"] else "")
+                for c in checkpoints
+            ]
+            print(f"Attrition of {table}: {' -> '.join(steps)}")
+
+        return funnel
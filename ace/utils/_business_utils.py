@@ -56,6 +56,11 @@ Date:
     01/12/2024
 """
 
+# Local imports
+import json
+import os
+import shutil
+
 # Pyspark libraries
 import pyspark.sql.functions as F
 import pyspark.sql.types as T
@@ -66,13 +71,43 @@ from pyspark.sql.window import Window
 from ace.schemas import (
     AFKO_SCHEMA,
     COMPANY_CODE_DATA_SCHEMA,
+    KPI_CUBE_DIMENSIONS,
+    KPI_CUBE_ORDER_COLUMNS,
+    KPI_CUBE_PARTITION_COLUMNS,
+    KPI_CUBE_PERCENTILES,
+    LATE_DELIVERY_BUCKETS,
+    LATE_DELIVERY_DEFAULT_BUCKET,
     MARA_SCHEMA,
     MARC_SCHEMA,
     MBEW_SCHEMA,
     PLANT_DATA_SCHEMA,
     VALUATION_DATA_SCHEMA,
 )
-from ace.utils._use_case_utils import enforce_schema, process_data
+from ace.utils._attrition_utils import AttritionTracker
+from ace.utils._pushdown_utils import scan_filter
+from ace.utils._statistics_utils import (
+    broadcast_if_small,
+    check_join_fanouts,
+    shuffle_join_sides,
+    suggest_shuffle_partitions,
+)
+from ace.utils._use_case_utils import (
+    add_partition_columns,
+    decode_identifier_column,
+    enforce_schema,
+    process_data,
+    save_df_as_csv,
+    save_df_as_parquet,
+)
+
+
+def _track(
+    df: DataFrame, attrition: AttritionTracker, table: str, step: str
+) -> DataFrame:
+    """
+    Counts the rows at a checkpoint of a prep step, if an attrition tracker is given.
+    """
+    return df if attrition is None else attrition.track(df, table, step)
 
 
 def prep_general_material_data(
@@ -81,6 +116,7 @@ def prep_general_material_data(
     check_old_material_number_is_valid: bool = True,
     check_material_is_not_deleted: bool = True,
     schema: T.StructType = MARA_SCHEMA,
+    attrition: AttritionTracker = None,
 ):
     """
     Filters materials based on validity of the old material number (BISMT) and deletion flag (LVORM)
@@ -99,6 +135,8 @@ def prep_general_material_data(
         If True, excludes rows where the deletion flag is not null or not empty.
     - rename_global_material_number : str, optional (default=None)
         If specified, renames the global material number column to this consistent name.
+    - attrition : AttritionTracker, optional
+        If given, the rows are counted before and after each filter (table 'MARA').
 
     Returns:
     --------
@@ -127,17 +165,17 @@ def prep_general_material_data(
         boolean_check=check_old_material_number_is_valid,
     )
     process_data(boolean_check=check_material_is_not_deleted)
+    df = _track(df, attrition, "MARA", "input")
 
     # Apply old material number validity filter
     if check_old_material_number_is_valid:
-        df = df.filter(
-            (F.col("BISMT").isNull())
-            | (~F.col("BISMT").isin("ARCHIVE", "DUPLICATE", "RENUMBERED"))
-        )
+        df = df.filter(scan_filter("MARA", "valid_old_material_number"))
+        df = _track(df, attrition, "MARA", "valid_old_material_number")
 
     # Apply material not deleted filter
     if check_material_is_not_deleted:
-        df = df.filter((F.col("LVORM").isNull()) | (F.col("LVORM") == ""))
+        df = df.filter(scan_filter("MARA", "material_not_deleted"))
+        df = _track(df, attrition, "MARA", "material_not_deleted")
 
     # Rename global material number column
     df = df.withColumnRenamed(col_mara_global_material_number, "global_material_number")
@@ -145,7 +183,9 @@ def prep_general_material_data(
     return enforce_schema(df, schema)
 
 
-def prep_material_valuation(df: DataFrame) -> DataFrame:
+def prep_material_valuation(
+    df: DataFrame, attrition: AttritionTracker = None
+) -> DataFrame:
     """
     Prepares the Material Valuation data by applying specified transformations.
 
@@ -153,6 +193,8 @@ def prep_material_valuation(df: DataFrame) -> DataFrame:
     -----
     - df : DataFrame
         Input PySpark DataFrame containing material valuation data.
+    - attrition : AttritionTracker, optional
+        If given, the rows are counted after each filter and deduplication (table 'MBEW').
 
     Returns:
     --------
@@ -183,25 +225,33 @@ def prep_material_valuation(df: DataFrame) -> DataFrame:
     # Check input parameter
     process_data(dataframe_check=df)
 
+    df = _track(df, attrition, "MBEW", "input")
+
     # Filter out materials flagged for deletion (LVORM is null)
-    df = df.filter(F.col("LVORM").isNull())
+    df = df.filter(scan_filter("MBEW", "material_not_deleted"))
+    df = _track(df, attrition, "MBEW", "material_not_deleted")
 
     # Filter for entries where BWTAR (Valuation Type) is null
-    df = df.filter(F.col("BWTAR").isNull())
+    df = df.filter(scan_filter("MBEW", "no_split_valuation"))
+    df = _track(df, attrition, "MBEW", "no_split_valuation")
 
     # Deduplicate records by selecting the record with the highest evaluated price (LAEPR)
     window_spec = Window.partitionBy("MATNR", "BWKEY").orderBy(F.desc("LAEPR"))
     df = df.withColumn("row_num", F.row_number().over(window_spec)).filter(
         F.col("row_num") == 1
     )
+    df = _track(df, attrition, "MBEW", "highest_evaluated_price")
+
+    df = enforce_schema(df, MBEW_SCHEMA).dropDuplicates()
 
-    return enforce_schema(df, MBEW_SCHEMA).dropDuplicates()
+    return _track(df, attrition, "MBEW", "drop_duplicates")
 
 
 def prep_plant_data_for_material(
     df: DataFrame,
     check_deletion_flag_is_null: bool = True,
     drop_duplicate_records: bool = False,
+    attrition: AttritionTracker = None,
 ) -> DataFrame:
     """
     Prepares plant data for material by filtering and selecting required fields.
@@ -214,6 +264,8 @@ def prep_plant_data_for_material(
         If True, excludes records where the deletion flag (LVORM) is not null. Default is True.
     - drop_duplicate_records : bool, optional
         If True, drops duplicate records from the DataFrame. Default is False.
+    - attrition : AttritionTracker, optional
+        If given, the rows are counted after the filter and the deduplication (table 'MARC').
 
     Returns:
     -------
@@ -237,16 +289,19 @@ def prep_plant_data_for_material(
     # Check input parameter
     process_data(dataframe_check=df, boolean_check=check_deletion_flag_is_null)
     process_data(boolean_check=drop_duplicate_records)
+    df = _track(df, attrition, "MARC", "input")
 
     # Filter records where LVORM is null if the parameter is enabled
     if check_deletion_flag_is_null:
-        df = df.filter(F.col("LVORM").isNull())
+        df = df.filter(scan_filter("MARC", "material_not_deleted"))
+        df = _track(df, attrition, "MARC", "material_not_deleted")
 
     df = enforce_schema(df, MARC_SCHEMA)
 
     # Drop duplicate records if the parameter is enabled
     if drop_duplicate_records:
         df = df.dropDuplicates()
+        df = _track(df, attrition, "MARC", "drop_duplicates")
 
     return df
 
@@ -281,7 +336,7 @@ def prep_plant_and_branches(df: DataFrame) -> DataFrame:
     return df
 
 
-def prep_valuation_area(df: DataFrame) -> DataFrame:
+def prep_valuation_area(df: DataFrame, attrition: AttritionTracker = None) -> DataFrame:
     """
     Prepares the valuation area data by selecting required fields and removing duplicates.
 
@@ -292,6 +347,8 @@ def prep_valuation_area(df: DataFrame) -> DataFrame:
     -----
     - df : DataFrame
         Input DataFrame containing the SAP T001K table data.
+    - attrition : AttritionTracker, optional
+        If given, the rows are counted before and after the deduplication (table 'T001K').
 
     Returns:
     -------
@@ -305,10 +362,12 @@ def prep_valuation_area(df: DataFrame) -> DataFrame:
     # Check input parameter
     process_data(dataframe_check=df)
 
+    df = _track(df, attrition, "T001K", "input")
+
     # Select the required columns and drop duplicates
     df = enforce_schema(df, VALUATION_DATA_SCHEMA).dropDuplicates()
 
-    return df
+    return _track(df, attrition, "T001K", "drop_duplicates")
 
 
 def prep_company_codes(df: DataFrame) -> DataFrame:
@@ -347,6 +406,8 @@ def integrate_data(
     sap_t001w: DataFrame,
     sap_t001k: DataFrame,
     sap_t001: DataFrame,
+    table_stats: dict = None,
+    max_join_fanout: float = None,
 ) -> DataFrame:
     """
     Integrates multiple SAP DataFrames (Material Data, Valuation Data, Plant Data, etc.)
@@ -378,6 +439,17 @@ def integrate_data(
         The DataFrame containing Company Codes Data (sap_t001).
         Required columns: MANDT, BUKRS, WAERS, etc.
 
+    - table_stats : dict, optional
+        Statistics of the input tables as returned by `profile_tables`, keyed by SAP table name
+        (e.g. 'MARA'). Joined tables that are small enough are broadcast instead of shuffled; the
+        other joins are shuffled into the partitions `suggest_shuffle_partitions` derives from the
+        input sizes. Without statistics, Spark chooses the join strategies on its own.
+
+    - max_join_fanout : float, optional
+        If given, the fan-out of every join is estimated from the key frequencies of both sides
+        before any join runs (see `check_join_fanouts`). Joins that add rows are reported with their
+        offending keys, and a fan-out above this factor raises a ValueError.
+
     Returns:
     --------
     DataFrame
@@ -415,25 +487,222 @@ def integrate_data(
     for df_check in [sap_marc, sap_mbew, sap_mara, sap_t001w, sap_t001k, sap_t001]:
         process_data(dataframe_check=df_check)
 
-    # Join sap_marc with sap_mara on MATNR
-    df_integrated = sap_marc.join(sap_mara, ["MATNR"], "left")
+    # Join sap_marc with sap_mara on MATNR, sap_t001w on MANDT and WERKS, sap_mbew on
+    # MANDT, MATNR and BWKEY, sap_t001k on MANDT and BWKEY and sap_t001 on MANDT and BUKRS
+    joins = [
+        ("MARA", sap_mara, ["MATNR"]),
+        ("T001W", sap_t001w, ["MANDT", "WERKS"]),
+        ("MBEW", sap_mbew, ["MANDT", "MATNR", "BWKEY"]),
+        ("T001K", sap_t001k, ["MANDT", "BWKEY"]),
+        ("T001", sap_t001, ["MANDT", "BUKRS"]),
+    ]
+
+    # Estimate the fan-out of every join from key frequencies before any join runs
+    if max_join_fanout is not None:
+        check_join_fanouts(sap_marc, joins, "MARC", max_join_fanout)
+
+    shuffle_partitions = (
+        suggest_shuffle_partitions(table_stats) if table_stats else None
+    )
+    df_integrated = sap_marc
+    for table_name, sap_table, keys in joins:
+        # Broadcast the tables that the statistics show to be small, and shuffle the others
+        # into the number of partitions the statistics suggest for this run
+        joined_table = broadcast_if_small(sap_table, table_stats, table_name)
+        if joined_table is sap_table:
+            df_integrated, joined_table = shuffle_join_sides(
+                df_integrated, sap_table, keys, shuffle_partitions
+            )
+        df_integrated = df_integrated.join(joined_table, keys, "left")
 
-    # Join with sap_t001w on MANDT and WERKS
-    df_integrated = df_integrated.join(sap_t001w, ["MANDT", "WERKS"], "left")
+    return df_integrated
 
-    # Join with sap_mbew on MANDT, MATNR, and BWKEY
-    df_integrated = df_integrated.join(sap_mbew, ["MANDT", "MATNR", "BWKEY"], "left")
 
-    # Join with sap_t001k on MANDT and BWKEY
-    df_integrated = df_integrated.join(sap_t001k, ["MANDT", "BWKEY"], "left")
+def derive_surrogate_key(df: DataFrame, key_col: str, surrogate_col: str) -> DataFrame:
+    """
+    Derives a compact 64-bit surrogate key from a readable (concatenated) key column.
 
-    # Join with sap_t001 on MANDT and BUKRS
-    df_integrated = df_integrated.join(sap_t001, ["MANDT", "BUKRS"], "left")
+    The surrogate key is the 64-bit xxHash of the readable key, so the same readable key always maps
+    to the same integer across runs and systems. Joins and dedupes on the surrogate key shuffle 8 bytes
+    per row instead of the full concatenated string.
 
-    return df_integrated
+    args:
+    -----
+    - df : DataFrame
+        The DataFrame containing the readable key column.
+    - key_col : str
+        Name of the readable key column (e.g. 'primary_key_inter').
+    - surrogate_col : str
+        Name of the surrogate key column to add (e.g. 'surrogate_key_inter').
 
+    Returns:
+    --------
+    DataFrame
+        The input DataFrame with the additional LongType surrogate key column.
 
-def derive_intra_and_inter_primary_key(df: DataFrame) -> DataFrame:
+    Notes:
+    ------
+        - Hash collisions are possible in principle; use `detect_surrogate_key_collisions`
+          to verify the keys of a dataset before relying on them.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df, string_check=key_col)
+    process_data(string_check=surrogate_col)
+
+    return df.withColumn(surrogate_col, F.xxhash64(F.col(key_col)))
+
+
+def detect_surrogate_key_collisions(
+    df: DataFrame, key_col: str, surrogate_col: str
+) -> DataFrame:
+    """
+    Detects surrogate keys that are shared by more than one distinct readable key.
+
+    args:
+    -----
+    - df : DataFrame
+        The DataFrame containing both the readable and the surrogate key columns.
+    - key_col : str
+        Name of the readable key column.
+    - surrogate_col : str
+        Name of the surrogate key column derived from `key_col`.
+
+    Returns:
+    --------
+    DataFrame
+        One row per colliding surrogate key with the columns:
+        - `surrogate_col`: The colliding surrogate key.
+        - `no_of_keys`: Number of distinct readable keys mapped to it.
+        - `keys`: The distinct readable keys mapped to it.
+        The DataFrame is empty when the surrogate keys are collision free.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df, string_check=key_col)
+    process_data(string_check=surrogate_col)
+
+    return (
+        df.groupBy(surrogate_col)
+        .agg(F.collect_set(key_col).alias("keys"))
+        .withColumn("no_of_keys", F.size("keys"))
+        .filter(F.col("no_of_keys") > 1)
+        .select(surrogate_col, "no_of_keys", "keys")
+    )
+
+
+def report_surrogate_key_collisions(
+    df: DataFrame,
+    key_pairs: dict = None,
+    raise_on_collision: bool = False,
+    report_path: str = None,
+    max_examples: int = 10,
+) -> dict:
+    """
+    Checks every readable/surrogate key pair of a dataset for collisions and reports them.
+
+    All key pairs are checked in one aggregation over `df`; pass a persisted or written output
+    to avoid computing it again. Only the number of colliding surrogate keys and the first
+    `max_examples` of them per key pair are collected to the driver.
+
+    args:
+    -----
+    - df : DataFrame
+        The DataFrame containing the readable and surrogate key columns.
+    - key_pairs : dict, optional
+        Mapping of readable key column to surrogate key column. Defaults to the intra and inter
+        primary keys.
+    - raise_on_collision : bool, optional (default=False)
+        If True, a ValueError is raised when any collision is found.
+    - report_path : str, optional
+        If given, the number of collisions and the example collisions (surrogate key and its
+        readable keys) of every key pair are written to this JSON file.
+    - max_examples : int, optional (default=10)
+        Number of colliding surrogate keys collected per key pair.
+
+    Returns:
+    --------
+    dict
+        Mapping of surrogate key column to the number of colliding surrogate keys.
+
+    Raises:
+    -------
+    ValueError
+        If `raise_on_collision` is True and at least one collision is found.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df, boolean_check=raise_on_collision)
+
+    if key_pairs is None:
+        key_pairs = {
+            "primary_key_intra": "surrogate_key_intra",
+            "primary_key_inter": "surrogate_key_inter",
+        }
+
+    # Stack every key pair into one frame, so all pairs are checked in a single aggregation
+    stacked = df.select(
+        F.explode(
+            F.array(
+                *[
+                    F.struct(
+                        F.lit(surrogate_col).alias("surrogate_col"),
+                        F.col(surrogate_col).cast("long").alias("surrogate_key"),
+                        F.col(key_col).cast("string").alias("key"),
+                    )
+                    for key_col, surrogate_col in key_pairs.items()
+                ]
+            )
+        ).alias("pair")
+    ).select("pair.*")
+
+    # Count the collisions per key pair, but only collect the first examples of each
+    pair_window = Window.partitionBy("surrogate_col")
+    collisions = (
+        stacked.groupBy("surrogate_col", "surrogate_key")
+        .agg(F.collect_set("key").alias("keys"))
+        .filter(F.size("keys") > 1)
+        .withColumn("no_of_collisions", F.count(F.lit(1)).over(pair_window))
+        .withColumn(
+            "example", F.row_number().over(pair_window.orderBy("surrogate_key"))
+        )
+        .filter(F.col("example") <= max_examples)
+        .collect()
+    )
+
+    report = {
+        surrogate_col: {"collisions": 0, "examples": []}
+        for surrogate_col in key_pairs.values()
+    }
+    for row in collisions:
+        report[row.surrogate_col]["collisions"] = row.no_of_collisions
+        report[row.surrogate_col]["examples"].append(
+            {"surrogate_key": row.surrogate_key, "keys": sorted(row["keys"])}
+        )
+
+    for surrogate_col, pair_report in report.items():
+        if pair_report["collisions"] > 0:
+            print(
+                f"Found {pair_report['collisions']} colliding values in {surrogate_col}:"
+            )
+            for example in pair_report["examples"]:
+                print(f"  {example['surrogate_key']}: {example['keys']}")
+
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2)
+
+    counts = {
+        surrogate_col: pair_report["collisions"]
+        for surrogate_col, pair_report in report.items()
+    }
+    if raise_on_collision and any(counts.values()):
+        raise ValueError(f"Surrogate key collisions detected: {counts}")
+
+    return counts
+
+
+def derive_intra_and_inter_primary_key(
+    df: DataFrame, with_surrogate_keys: bool = False
+) -> DataFrame:
     """
     Derives the primary keys for intra-system and inter-system harmonized views.
 
@@ -445,6 +714,8 @@ def derive_intra_and_inter_primary_key(df: DataFrame) -> DataFrame:
     -----
     - df : DataFrame
         The DataFrame containing the necessary columns to derive the primary keys.
+    - with_surrogate_keys : bool, optional (default=False)
+        If True, also adds the 64-bit surrogate keys 'surrogate_key_intra' and 'surrogate_key_inter'.
 
     Returns:
     --------
@@ -453,21 +724,42 @@ def derive_intra_and_inter_primary_key(df: DataFrame) -> DataFrame:
         which are concatenated from MATNR, WERKS, and SOURCE_SYSTEM_ERP.
     """
     # Check input parameter
-    process_data(dataframe_check=df)
+    process_data(dataframe_check=df, boolean_check=with_surrogate_keys)
 
     # Derive the primary key for intra-system matching (MATNR + WERKS)
-    df = df.withColumn("primary_key_intra", F.concat_ws("-", df["MATNR"], df["WERKS"]))
+    df = df.withColumn(
+        "primary_key_intra",
+        F.concat_ws(
+            "-",
+            decode_identifier_column(df, "MATNR"),
+            decode_identifier_column(df, "WERKS"),
+        ),
+    )
 
     # Derive the primary key for inter-system matching (SOURCE_SYSTEM_ERP + MATNR + WERKS)
     df = df.withColumn(
         "primary_key_inter",
-        F.concat_ws("-", df["SOURCE_SYSTEM_ERP"], df["MATNR"], df["WERKS"]),
+        F.concat_ws(
+            "-",
+            decode_identifier_column(df, "SOURCE_SYSTEM_ERP"),
+            decode_identifier_column(df, "MATNR"),
+            decode_identifier_column(df, "WERKS"),
+        ),
     )
 
+    # Derive the narrow surrogate keys next to the readable ones
+    if with_surrogate_keys:
+        df = derive_surrogate_key(df, "primary_key_intra", "surrogate_key_intra")
+        df = derive_surrogate_key(df, "primary_key_inter", "surrogate_key_inter")
+
     return df
 
 
-def post_prep_local_material(df: DataFrame) -> DataFrame:
+def post_prep_local_material(
+    df: DataFrame,
+    with_surrogate_keys: bool = False,
+    attrition: AttritionTracker = None,
+) -> DataFrame:
     """
     Post-processing transformation for local material data after integration.
 
@@ -481,6 +773,11 @@ def post_prep_local_material(df: DataFrame) -> DataFrame:
     -----------
     df : DataFrame
         The resulting DataFrame from the integration step.
+    with_surrogate_keys : bool, optional (default=False)
+        If True, also derives the 64-bit surrogate keys next to the readable primary keys.
+    attrition : AttritionTracker, optional
+        If given, the rows are counted before and after the deduplication (table
+        'local_material').
 
     Returns:
     --------
@@ -490,18 +787,23 @@ def post_prep_local_material(df: DataFrame) -> DataFrame:
         - Added duplicate count ('no_of_duplicates') and deduplicated records based on SOURCE_SYSTEM_ERP, MATNR, and WERKS.
     """
     # Check input parameter
-    process_data(dataframe_check=df)
+    process_data(dataframe_check=df, boolean_check=with_surrogate_keys)
+    df = _track(df, attrition, "local_material", "integrated")
 
     # Concatenate WERKS (Plant) and NAME1 (Name of Plant/Branch) with a hyphen to create 'mtl_plant_emd'
-    df = df.withColumn("mtl_plant_emd", F.concat_ws("-", df["WERKS"], df["NAME1"]))
+    df = df.withColumn(
+        "mtl_plant_emd",
+        F.concat_ws("-", decode_identifier_column(df, "WERKS"), df["NAME1"]),
+    )
 
     # Assign global_mtl_id from MATNR or the global material number
     df = df.withColumn(
-        "global_mtl_id", F.coalesce(df["MATNR"], df["global_material_number"])
+        "global_mtl_id",
+        F.coalesce(decode_identifier_column(df, "MATNR"), df["global_material_number"]),
     )
 
     # Derive primary keys (intra and inter)
-    df = derive_intra_and_inter_primary_key(df)
+    df = derive_intra_and_inter_primary_key(df, with_surrogate_keys)
 
     # Create a temporary column to count the number of duplicates based on the relevant keys (SOURCE_SYSTEM_ERP, MATNR, WERKS)
     window_spec = Window.partitionBy("SOURCE_SYSTEM_ERP", "MATNR", "WERKS")
@@ -510,7 +812,7 @@ def post_prep_local_material(df: DataFrame) -> DataFrame:
     # Drop duplicates based on SOURCE_SYSTEM_ERP, MATNR, and WERKS
     df = df.dropDuplicates(["SOURCE_SYSTEM_ERP", "MATNR", "WERKS"])
 
-    return df
+    return _track(df, attrition, "local_material", "drop_duplicates")
 
 
 def prep_order_header_data(df: DataFrame) -> DataFrame:
@@ -528,17 +830,12 @@ def prep_order_header_data(df: DataFrame) -> DataFrame:
     # Check input parameter
     process_data(dataframe_check=df)
 
-    # Format GSTRP to create start_date
+    # Truncate GSTRP (or today, if it is missing) to the first day of its month
     df = df.withColumn(
         "start_date",
-        F.when(
-            F.col("GSTRP").isNull(),
-            F.date_format(F.current_date(), "yyyy-MM"),
-        ).otherwise(F.date_format("GSTRP", "yyyy-MM")),
+        F.trunc(F.coalesce(F.to_date(F.col("GSTRP")), F.current_date()), "month"),
     )
 
-    df = df.withColumn("start_date", F.concat_ws("-", F.col("start_date"), F.lit("01")))
-
     return enforce_schema(df, AFKO_SCHEMA)
 
 
@@ -581,6 +878,8 @@ def integration_order(
     sap_aufk: DataFrame,
     sap_mara: DataFrame,
     sap_cdpos: DataFrame = None,
+    table_stats: dict = None,
+    max_join_fanout: float = None,
 ) -> DataFrame:
     """
     Integrates order-related data by performing multiple join operations on the provided DataFrames.
@@ -600,6 +899,12 @@ def integration_order(
     - sap_aufk (DataFrame): The Order Master Data.
     - sap_mara (DataFrame): The General Material Data.
     - sap_cdpos (DataFrame, optional): The Change Document Data. Defaults to None.
+    - table_stats (dict, optional): Statistics of the input tables as returned by `profile_tables`,
+      keyed by SAP table name. Joined tables that are small enough are broadcast, the other joins
+      are shuffled into the partitions `suggest_shuffle_partitions` derives. Defaults to None.
+    - max_join_fanout (float, optional): If given, the fan-out of every join is estimated from key
+      frequencies before any join runs (see `check_join_fanouts`); joins that add rows are reported and a fan-out above this factor raises a ValueError.
+      Defaults to None.
 
     Returns:
     --------
@@ -608,18 +913,34 @@ def integration_order(
     for df_check in [sap_afpo, sap_aufk, sap_mara, sap_cdpos]:
         process_data(dataframe_check=df_check)
 
-    # Left join sap_afko with sap_afpo on AUFNR
-    result = sap_afko.join(sap_afpo, on="AUFNR", how="left")
-
-    # Left join the result with sap_aufk on AUFNR
-    result = result.join(sap_aufk, on="AUFNR", how="left")
-
-    # Left join the result with sap_mara on MATNR
-    result = result.join(sap_mara, on="MATNR", how="left")
+    # Left join sap_afko with sap_afpo and sap_aufk on AUFNR, then with sap_mara on MATNR
+    joins = [
+        ("AFPO", sap_afpo, ["AUFNR"]),
+        ("AUFK", sap_aufk, ["AUFNR"]),
+        ("MARA", sap_mara, ["MATNR"]),
+    ]
 
     # If sap_cdpos is provided, left join with sap_cdpos on OBJNR
     if sap_cdpos is not None:
-        result = result.join(sap_cdpos, on="OBJNR", how="left")
+        joins.append(("CDPOS", sap_cdpos, ["OBJNR"]))
+
+    # Estimate the fan-out of every join from key frequencies before any join runs
+    if max_join_fanout is not None:
+        check_join_fanouts(sap_afko, joins, "AFKO", max_join_fanout)
+
+    shuffle_partitions = (
+        suggest_shuffle_partitions(table_stats) if table_stats else None
+    )
+    result = sap_afko
+    for table_name, sap_table, keys in joins:
+        # Broadcast the tables that the statistics show to be small, and shuffle the others
+        # into the number of partitions the statistics suggest for this run
+        joined_table = broadcast_if_small(sap_table, table_stats, table_name)
+        if joined_table is sap_table:
+            result, joined_table = shuffle_join_sides(
+                result, sap_table, keys, shuffle_partitions
+            )
+        result = result.join(joined_table, on=keys, how="left")
 
     # Handle missing values in GLTRP by using ZZGLTRP_ORIG if available
     result = result.withColumn(
@@ -629,7 +950,11 @@ def integration_order(
     return result
 
 
-def post_prep_process_order(df: DataFrame) -> DataFrame:
+def post_prep_process_order(
+    df: DataFrame,
+    with_surrogate_keys: bool = False,
+    late_delivery_buckets: list = None,
+) -> DataFrame:
     """
     Post-processes the resulting DataFrame by deriving primary keys, calculating flags, deviations,
     and timestamps based on specific business logic.
@@ -641,10 +966,20 @@ def post_prep_process_order(df: DataFrame) -> DataFrame:
         4. Ensures `ZZGLTRP_ORIG` is present in the DataFrame, adding it with null values if missing.
         5. Derives the `mto_vs_mts_flag` based on the presence of `KDAUF`.
         6. Converts `LTRMI` and `GSTRI` to timestamps for order start and finish.
+        7. Optionally derives the 64-bit `surrogate_key_intra` and `surrogate_key_inter` keys.
+
+    All columns are derived in a single projection: the deviation is computed once and shared
+    by `on_time_flag`, `actual_on_time_deviation` and `late_delivery_bucket`, and the readable
+    keys are shared by the surrogate keys.
 
     args:
     -----
     - df (DataFrame): The input DataFrame resulting from the integration step.
+    - with_surrogate_keys (bool, optional): If True, derives the surrogate keys next to the
+      readable primary keys. Defaults to False.
+    - late_delivery_buckets (list, optional): `(upper bound in days, label)` pairs in ascending
+      order; deviations above the last bound (or unknown) get `LATE_DELIVERY_DEFAULT_BUCKET`.
+      Defaults to `LATE_DELIVERY_BUCKETS`.
 
     Returns:
     --------
@@ -652,60 +987,226 @@ def post_prep_process_order(df: DataFrame) -> DataFrame:
 
     """
     # Check input parameter
-    process_data(dataframe_check=df)
+    process_data(dataframe_check=df, boolean_check=with_surrogate_keys)
+
+    if late_delivery_buckets is None:
+        late_delivery_buckets = LATE_DELIVERY_BUCKETS
+
+    # Ensure ZZGLTRP_ORIG is present (if missing, add it with null values)
+    if "ZZGLTRP_ORIG" not in df.columns:
+        df = df.withColumn("ZZGLTRP_ORIG", F.lit(None).cast(T.DateType()))
 
     # Derive Intra and Inter Primary Keys
-    df = df.withColumn(
-        "primary_key_intra", F.concat_ws("_", df["AUFNR"], df["POSNR"], df["DWERK"])
+    aufnr = decode_identifier_column(df, "AUFNR")
+    posnr = decode_identifier_column(df, "POSNR")
+    dwerk = decode_identifier_column(df, "DWERK")
+    primary_key_intra = F.concat_ws("_", aufnr, posnr, dwerk)
+    primary_key_inter = F.concat_ws(
+        "_", decode_identifier_column(df, "SOURCE_SYSTEM_ERP"), aufnr, posnr, dwerk
     )
+    columns = [
+        primary_key_intra.alias("primary_key_intra"),
+        primary_key_inter.alias("primary_key_inter"),
+    ]
+
+    # Derive the narrow surrogate keys next to the readable ones
+    if with_surrogate_keys:
+        columns += [
+            F.xxhash64(primary_key_intra).alias("surrogate_key_intra"),
+            F.xxhash64(primary_key_inter).alias("surrogate_key_inter"),
+        ]
+
+    # Calculate the On-Time Deviation once; the flag and the bucket are derived from it
+    deviation = F.datediff(F.col("ZZGLTRP_ORIG"), F.col("LTRMI"))
+    on_time_flag = F.when(deviation >= 0, 1).when(deviation < 0, 0).otherwise(None)
 
-    df = df.withColumn(
-        "primary_key_inter",
-        F.concat_ws(
-            "_", df["SOURCE_SYSTEM_ERP"], df["AUFNR"], df["POSNR"], df["DWERK"]
-        ),
-    )
+    # Categorize late delivery bucket based on deviation
+    late_delivery_bucket = F.lit(LATE_DELIVERY_DEFAULT_BUCKET)
+    for upper_bound, label in reversed(late_delivery_buckets):
+        late_delivery_bucket = F.when(deviation <= upper_bound, label).otherwise(
+            late_delivery_bucket
+        )
 
-    # Calculate On-Time Flag
-    df = df.withColumn(
-        "on_time_flag",
-        F.when(F.col("ZZGLTRP_ORIG") >= F.col("LTRMI"), 1)
-        .when(F.col("ZZGLTRP_ORIG") < F.col("LTRMI"), 0)
-        .otherwise(None),
-    )
+    columns += [
+        on_time_flag.alias("on_time_flag"),
+        deviation.alias("actual_on_time_deviation"),
+        late_delivery_bucket.alias("late_delivery_bucket"),
+        # Step 5: Derive MTO vs MTS Flag
+        F.when(F.col("KDAUF").isNotNull(), "MTO")
+        .otherwise("MTS")
+        .alias("mto_vs_mts_flag"),
+        # Step 6: Convert Dates to Timestamps (the dates are parsed at ingest)
+        F.to_date(F.col("LTRMI"))
+        .cast(T.TimestampType())
+        .alias("order_finish_timestamp"),
+        F.to_date(F.col("GSTRI"))
+        .cast(T.TimestampType())
+        .alias("order_start_timestamp"),
+    ]
+
+    return df.select("*", *columns)
+
+
+def build_on_time_kpi_cube(
+    df: DataFrame,
+    dimensions: list = None,
+    percentiles: list = None,
+    late_delivery_buckets: list = None,
+) -> DataFrame:
+    """
+    Pre-aggregates the process order output into an on-time delivery KPI cube.
 
-    # Calculate On-Time Deviation and Late Delivery Bucket
-    df = df.withColumn(
-        "actual_on_time_deviation", F.datediff(F.col("ZZGLTRP_ORIG"), F.col("LTRMI"))
+    Dashboards read the cube (one row per dimension combination) instead of scanning all orders.
+    Counts and sums are additive, so rates and averages over any roll-up of the dimensions can be
+    computed from the cube; the deviation percentiles are approximate and per cube row.
+
+    args:
+    -----
+    - df (DataFrame): The process order output (with `system_name`, `start_date`, `plant`,
+      `order_type`, `mto_vs_mts_flag`, `on_time_flag`, `actual_on_time_deviation` and
+      `late_delivery_bucket`).
+    - dimensions (list, optional): The cube dimensions. A `<date>_month` dimension is derived from
+      its date column (see `add_partition_columns`). Defaults to `KPI_CUBE_DIMENSIONS`.
+    - percentiles (list, optional): Percentiles of `actual_on_time_deviation` to compute.
+      Defaults to `KPI_CUBE_PERCENTILES`.
+    - late_delivery_buckets (list, optional): The `(upper bound, label)` pairs of the late delivery
+      buckets; the default bucket is always counted. Defaults to `LATE_DELIVERY_BUCKETS`.
+
+    Returns:
+    --------
+        DataFrame: The KPI cube with the dimensions, `order_count`, `on_time_count`,
+        `deviation_count`, `deviation_sum`, `deviation_min`, `deviation_max`, one
+        `deviation_p<percentile>` column per percentile and one `bucket_<label>` order count per
+        late delivery bucket.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df)
+
+    if dimensions is None:
+        dimensions = KPI_CUBE_DIMENSIONS
+    if percentiles is None:
+        percentiles = KPI_CUBE_PERCENTILES
+    if late_delivery_buckets is None:
+        late_delivery_buckets = LATE_DELIVERY_BUCKETS
+
+    df = add_partition_columns(df, dimensions)
+    deviation = F.col("actual_on_time_deviation").cast(T.DoubleType())
+    labels = [label for _, label in late_delivery_buckets] + [
+        LATE_DELIVERY_DEFAULT_BUCKET
+    ]
+
+    cube = df.groupBy(*dimensions).agg(
+        F.count(F.lit(1)).alias("order_count"),
+        F.sum(
+            F.when(F.col("on_time_flag").cast(T.IntegerType()) == 1, 1).otherwise(0)
+        ).alias("on_time_count"),
+        F.count(deviation).alias("deviation_count"),
+        F.sum(deviation).alias("deviation_sum"),
+        F.min(deviation).alias("deviation_min"),
+        F.max(deviation).alias("deviation_max"),
+        F.percentile_approx(deviation, percentiles).alias("deviation_percentiles"),
+        *[
+            F.sum(F.when(F.col("late_delivery_bucket") == label, 1).otherwise(0)).alias(
+                f"bucket_{label.lower().replace('-', '_').replace(' ', '_')}"
+            )
+            for label in labels
+        ],
     )
 
-    # Categorize late delivery bucket based on deviation
-    df = df.withColumn(
-        "late_delivery_bucket",
-        F.when(F.col("actual_on_time_deviation") <= 0, "On-Time")
-        .when(F.col("actual_on_time_deviation").between(1, 5), "Slightly Late")
-        .when(F.col("actual_on_time_deviation").between(6, 10), "Moderately Late")
-        .otherwise("Severely Late"),
+    # Spread the percentiles over scalar columns, so the cube can be stored as CSV
+    return cube.select(
+        *[c for c in cube.columns if c != "deviation_percentiles"],
+        *[
+            F.col("deviation_percentiles")[i].alias(f"deviation_p{round(p * 100)}")
+            for i, p in enumerate(percentiles)
+        ],
     )
 
-    # Ensure ZZGLTRP_ORIG is present (if missing, add it with null values)
-    if "ZZGLTRP_ORIG" not in df.columns:
-        df = df.withColumn("ZZGLTRP_ORIG", F.lit(None))
 
-    # Step 5: Derive MTO vs MTS Flag
-    df = df.withColumn(
-        "mto_vs_mts_flag", F.when(F.col("KDAUF").isNotNull(), "MTO").otherwise("MTS")
-    )
+def refresh_on_time_kpi_cube(
+    df: DataFrame, kpi_cube_dir: str, key: str = "primary_key_inter"
+) -> list:
+    """
+    Refreshes the on-time delivery KPI cube with the orders of a run.
 
-    # Step 6: Convert Dates to Timestamps
-    df = df.withColumn(
-        "order_finish_timestamp",
-        F.to_timestamp(df["LTRMI"], "yyyy-MM-dd"),  # Adjust format as needed
+    The cube rows of a month cannot be updated from the new orders alone: the percentiles of partial
+    aggregates cannot be merged, and a run on only the new orders would replace the aggregates of a
+    month with partial ones. The orders behind the cube are therefore kept in an order store
+    (`<kpi_cube_dir>/on_time_kpi_orders`, Parquet with the `KPI_CUBE_ORDER_COLUMNS`, partitioned
+    like the cube). For every system and start month the run touches, the stored orders are merged
+    with the orders of the run (the run's version of an order replaces the stored one), and the
+    month is written back to the store and re-aggregated from all its orders into
+    `<kpi_cube_dir>/on_time_kpi_cube`. Other months are neither read nor rewritten.
+
+    The extracts may hold all orders or only the new and changed ones; orders deleted in SAP are
+    not removed from the store. An order whose start month changed moves to its new month.
+
+    args:
+    -----
+    - df (DataFrame): The process order output of the run; pass the persisted or written output,
+      it is read twice.
+    - kpi_cube_dir (str): The directory of the cube and of its order store.
+    - key (str, optional): The order key a run's version of an order is matched by.
+      Defaults to 'primary_key_inter'.
+
+    Returns:
+    --------
+        list: The refreshed `(system_name, start_date_month)` partitions.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df, string_check=kpi_cube_dir)
+
+    partition_columns = KPI_CUBE_PARTITION_COLUMNS
+    orders_path = os.path.join(kpi_cube_dir, "on_time_kpi_orders")
+
+    orders = add_partition_columns(
+        df.select(key, *[c for c in KPI_CUBE_ORDER_COLUMNS if c != key]),
+        partition_columns,
     )
+    touched = orders.select(*partition_columns)
+    merged = orders
 
-    df = df.withColumn(
-        "order_start_timestamp",
-        F.to_timestamp(df["GSTRI"], "yyyy-MM-dd"),  # Adjust format as needed
+    # Merge the run's orders with the stored orders of the months they touch
+    if os.path.exists(orders_path):
+        stored = df.sparkSession.read.schema(orders.schema).parquet(orders_path)
+        run_keys = orders.select(key)
+
+        # The former month of a moved order is touched as well
+        touched = touched.unionByName(
+            stored.join(run_keys, key, "left_semi").select(*partition_columns)
+        )
+        merged = (
+            stored.join(F.broadcast(touched.distinct()), partition_columns, "left_semi")
+            .join(run_keys, key, "left_anti")
+            .unionByName(orders)
+        )
+
+    # Read the touched months completely before they are overwritten
+    merged = merged.localCheckpoint()
+    touched_partitions = sorted(tuple(row) for row in touched.distinct().collect())
+
+    save_df_as_parquet(merged, kpi_cube_dir, "on_time_kpi_orders", partition_columns)
+    save_df_as_csv(
+        build_on_time_kpi_cube(merged),
+        kpi_cube_dir,
+        "on_time_kpi_cube",
+        partition_columns,
     )
 
-    return df
+    # Dynamic partition overwrite keeps the partitions without rows: drop months left empty
+    remaining = {
+        tuple(row) for row in merged.select(*partition_columns).distinct().collect()
+    }
+    for partition in set(touched_partitions) - remaining:
+        partition_dir = os.path.join(
+            *[
+                f"{c}={'__HIVE_DEFAULT_PARTITION__' if value is None else value}"
+                for c, value in zip(partition_columns, partition)
+            ]
+        )
+        for name in ["on_time_kpi_orders", "on_time_kpi_cube"]:
+            shutil.rmtree(
+                os.path.join(kpi_cube_dir, name, partition_dir), ignore_errors=True
+            )
+
+    return touched_partitions
@@ -0,0 +1,269 @@
+"""
+Concurrent Pipeline Execution
+
+Runs several pipelines (e.g. both pipelines, or one pipeline for several systems) on threads of
+one Python process against one SparkSession. Every pipeline submits its Spark jobs to its own
+FAIR scheduler pool, so a long pipeline does not starve the others and the cluster stays busy
+while a pipeline waits on the driver.
+
+Independent inputs of one pipeline can likewise be persisted and materialised concurrently
+(`materialize_concurrently`), smallest first, so small tables do not wait behind large ones.
+
+The FAIR scheduler has to be enabled when the SparkContext is created
+(`spark.scheduler.mode=FAIR`); see `fair_spark_session`. With the default FIFO mode the
+pipelines still run concurrently, but their jobs are queued in submission order.
+
+Example usage:
+--------------
+>>> spark = fair_spark_session()
+>>> results = run_pipelines_concurrently(
+...     {
+...         "local_material_system_1": (process_local_material, {"data_dir": ..., ...}),
+...         "process_order_system_2": (process_order, {"data_dir": ..., ...}),
+...     }
+... )
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+# Pyspark libraries
+from pyspark import StorageLevel
+from pyspark.sql import DataFrame, SparkSession
+
+
+def fair_spark_session(app_name: str = "ace") -> SparkSession:
+    """
+    Returns a SparkSession whose scheduler runs the jobs of different pools fairly.
+
+    If a SparkContext already exists, its scheduler mode can no longer be changed and the
+    existing session is returned as is.
+
+    args:
+    -----
+    - app_name : str, optional
+        The application name. Defaults to 'ace'.
+
+    Returns:
+    --------
+    SparkSession
+        The Spark session.
+    """
+    return (
+        SparkSession.builder.appName(app_name)
+        .config("spark.scheduler.mode", "FAIR")
+        .getOrCreate()
+    )
+
+
+def _run_tagged(
+    spark: SparkSession, pool: str, job_group: str, description: str, function, **kwargs
+):
+    """
+    Calls a function with the Spark jobs of this thread in the given scheduler pool and job
+    group, and restores the previous pool and job group of the thread afterwards.
+    """
+    context = spark.sparkContext
+    previous = {
+        key: context.getLocalProperty(key)
+        for key in (
+            "spark.scheduler.pool",
+            "spark.jobGroup.id",
+            "spark.job.description",
+        )
+    }
+    context.setLocalProperty("spark.scheduler.pool", pool)
+    context.setJobGroup(job_group, description)
+    try:
+        return function(**kwargs)
+    finally:
+        for key, value in previous.items():
+            context.setLocalProperty(key, value)
+
+
+def _run_in_pool(spark: SparkSession, pool: str, pipeline, kwargs: dict):
+    """
+    Runs one pipeline with all its Spark jobs submitted to the given scheduler pool.
+    """
+    return _run_tagged(spark, pool, pool, f"pipeline {pool}", pipeline, **kwargs)
+
+
+def run_pipelines_concurrently(
+    pipelines: dict,
+    max_workers: Optional[int] = None,
+    spark: Optional[SparkSession] = None,
+) -> dict:
+    """
+    Runs several pipelines concurrently on threads that share one SparkSession.
+
+    Every pipeline runs in the FAIR scheduler pool named after its key. The pipelines must not
+    share module level state; the main scripts keep their inputs in a `TableRegistry`.
+
+    args:
+    -----
+    - pipelines : dict
+        Mapping of run name to a `(pipeline function, keyword arguments)` pair, e.g.
+        `{"process_order_system_2": (process_order, {"data_dir": ..., ...})}`.
+    - max_workers : int, optional
+        Maximum number of pipelines running at the same time. Defaults to all of them.
+    - spark : SparkSession, optional
+        An existing Spark session. If not provided, the active one is used.
+
+    Returns:
+    --------
+    dict
+        Mapping of run name to the return value of its pipeline.
+
+    Raises:
+    -------
+    Exception
+        The first error raised by a pipeline, after all pipelines have finished.
+    """
+    if not pipelines:
+        return {}
+
+    if spark is None:
+        spark = SparkSession.builder.getOrCreate()
+    if spark.sparkContext.getConf().get("spark.scheduler.mode", "FIFO") != "FAIR":
+        print(
+            "spark.scheduler.mode is not FAIR: the pipelines run concurrently, "
+            "but their jobs are scheduled first in, first out."
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(pipelines)) as executor:
+        futures = {
+            name: executor.submit(_run_in_pool, spark, name, pipeline, kwargs)
+            for name, (pipeline, kwargs) in pipelines.items()
+        }
+
+    errors = {name: f.exception() for name, f in futures.items() if f.exception()}
+    for name, error in errors.items():
+        print(f"Pipeline {name} failed: {error!r}")
+    if errors:
+        raise next(iter(errors.values()))
+
+    return {name: future.result() for name, future in futures.items()}
+
+
+def estimated_size_bytes(
+    df: DataFrame, table_stats: Optional[dict] = None, name: Optional[str] = None
+) -> int:
+    """
+    Estimates the size of a DataFrame, preferring the profiled input size of the table.
+
+    args:
+    -----
+    - df : DataFrame
+        The DataFrame.
+    - table_stats : dict, optional
+        Table statistics as returned by `profile_tables`.
+    - name : str, optional
+        The table name to look up in `table_stats`.
+
+    Returns:
+    --------
+    int
+        The profiled input size, or else the size estimate of Spark's optimized plan.
+    """
+    stats = (table_stats or {}).get(name) or {}
+    if stats.get("size_bytes") is not None:
+        return stats["size_bytes"]
+
+    return int(str(df._jdf.queryExecution().optimizedPlan().stats().sizeInBytes()))
+
+
+def _materialize(
+    spark: SparkSession, name: str, df: DataFrame, job_group: str
+) -> DataFrame:
+    """
+    Triggers the computation of a persisted DataFrame in its own scheduler pool and job group.
+    """
+    _run_tagged(spark, f"prepare_{name}", job_group, f"prepare {name}", df.count)
+    return df
+
+
+def materialize_concurrently(
+    frames: dict,
+    max_workers: int = 4,
+    table_stats: Optional[dict] = None,
+    storage_level: StorageLevel = StorageLevel.MEMORY_AND_DISK,
+    spark: Optional[SparkSession] = None,
+) -> dict:
+    """
+    Persists independent DataFrames and materialises them concurrently, smallest first.
+
+    Spark runs the jobs of one thread one after another, so persisted inputs prepared in a
+    sequence of actions wait for each other. Here every DataFrame is materialised by its own job
+    on a bounded thread pool; the smallest DataFrames are submitted first, so they do not wait
+    behind a large table such as MBEW.
+
+    args:
+    -----
+    - frames : dict
+        Mapping of table name to the (prepared) DataFrame.
+    - max_workers : int, optional
+        Maximum number of DataFrames materialised at the same time. Defaults to 4.
+    - table_stats : dict, optional
+        Table statistics as returned by `profile_tables`, used to order the tables by size.
+        Without statistics, Spark's plan size estimates are used.
+    - storage_level : StorageLevel, optional
+        Storage level of the persisted DataFrames. Defaults to MEMORY_AND_DISK.
+    - spark : SparkSession, optional
+        An existing Spark session. If not provided, the active one is used.
+
+    Returns:
+    --------
+    dict
+        Mapping of table name to the persisted and materialised DataFrame.
+
+    Raises:
+    -------
+    Exception
+        The first error raised while materialising a DataFrame, after all DataFrames have been
+        unpersisted.
+    """
+    if not frames:
+        return {}
+    if max_workers < 1:
+        raise ValueError("max_workers must be at least 1.")
+
+    if spark is None:
+        spark = SparkSession.builder.getOrCreate()
+
+    # The worker threads do not inherit the job group of the caller: nest theirs under it
+    parent_group = spark.sparkContext.getLocalProperty("spark.jobGroup.id")
+    order = sorted(
+        frames, key=lambda name: estimated_size_bytes(frames[name], table_stats, name)
+    )
+    persisted = {name: frames[name].persist(storage_level) for name in order}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            name: executor.submit(
+                _materialize,
+                spark,
+                name,
+                persisted[name],
+                (
+                    f"{parent_group}/prepare_{name}"
+                    if parent_group
+                    else f"prepare_{name}"
+                ),
+            )
+            for name in order
+        }
+
+    # Release the cached blocks of all frames if one of them failed
+    errors = [futures[name].exception() for name in order if futures[name].exception()]
+    if errors:
+        for df in persisted.values():
+            df.unpersist()
+        raise errors[0]
+
+    return {name: futures[name].result() for name in frames}
@@ -0,0 +1,208 @@
+"""
+Data Skipping Statistics of the Parquet Outputs
+
+Downstream consumers filter the outputs by `material_number`, `plant` and `order_number`. A scan of
+a Parquet output skips every file and row group whose min/max statistics exclude the filter value,
+and every row group whose Bloom filter shows that the value does not occur. How much a scan can
+skip therefore depends on the layout the writer chose: rows sorted by the key give files and row
+groups with narrow, disjoint ranges; unsorted rows give ranges that all overlap.
+
+`parquet_statistics_report` reads the footers of the written files with pyarrow (no data pages are
+read) and reports, per key column, the value range, the row groups with statistics and Bloom
+filters, and the share of files and row groups whose min/max range overlaps that of the others,
+an estimate of the share a point lookup by that column still has to read. Parquet writes no Bloom
+filter for a column chunk that is fully dictionary encoded: its dictionary answers the lookup.
+
+Example usage:
+--------------
+>>> save_df_as_parquet(df, "/path/to/output", "local_material", ["plant", "material_number"], ["material_number"])
+>>> parquet_statistics_report("/path/to/output/local_material", ["plant", "material_number"])
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import bisect
+import glob
+import json
+import os
+from typing import Optional
+
+# Custom utils imports
+from ace.utils._use_case_utils import process_data
+
+
+def _read_fraction(ranges: list) -> Optional[float]:
+    """
+    Returns the mean share of the (min, max) ranges that overlap each range; None stands for a
+    chunk without statistics, which overlaps every range.
+    """
+    if not ranges:
+        return None
+
+    known = [r for r in ranges if r is not None]
+    mins = sorted(r[0] for r in known)
+    maxs = sorted(r[1] for r in known)
+    overlapping = 0
+    for current in ranges:
+        if current is None:
+            overlapping += len(ranges)
+        else:
+            # All ranges but those starting after its max or ending before its min
+            overlapping += (
+                len(ranges)
+                - (len(mins) - bisect.bisect_right(mins, current[1]))
+                - bisect.bisect_left(maxs, current[0])
+            )
+
+    return round(overlapping / len(ranges) ** 2, 4)
+
+
+def _merge_ranges(ranges: list) -> Optional[tuple]:
+    """
+    Returns the range covering all ranges, or None if one of them has no statistics.
+    """
+    if not ranges or None in ranges:
+        return None
+
+    return min(r[0] for r in ranges), max(r[1] for r in ranges)
+
+
+def parquet_statistics_report(
+    output_path: str, columns: list, report_path: Optional[str] = None
+) -> Optional[dict]:
+    """
+    Reports the file and row group statistics of a Parquet output for the given key columns.
+
+    args:
+    -----
+    - output_path : str
+        The Parquet output directory (a plain, partitioned or bucketed output).
+    - columns : list
+        The key columns to report, e.g. the sort and Bloom filter columns of the output.
+    - report_path : str, optional
+        If given, the report is written to this JSON file.
+
+    Returns:
+    --------
+    dict
+        The files, row groups, rows and compressed bytes of the output and, per column, the
+        min, max and null count, the row groups with statistics, with a Bloom filter (None if
+        the installed pyarrow does not expose them) and fully dictionary encoded, and the
+        estimated share of the files and row groups a point lookup reads
+        (`file_read_fraction`, `row_group_read_fraction`). None if pyarrow is not installed.
+
+    Raises:
+    -------
+    ValueError
+        If the output has no Parquet files.
+    """
+    # Check input parameters
+    process_data(string_check=output_path)
+
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("pyarrow is not installed: the Parquet statistics are not reported.")
+        return None
+
+    file_paths = sorted(
+        glob.glob(os.path.join(output_path, "**", "*.parquet"), recursive=True)
+    )
+    if not file_paths:
+        raise ValueError(f"No Parquet files found in '{output_path}'.")
+
+    has_bloom_filters = hasattr(pq.ColumnChunkMetaData, "bloom_filter_offset")
+    report = {"path": output_path, "files": len(file_paths)}
+    report.update(dict.fromkeys(["row_groups", "rows", "bytes"], 0))
+    row_group_chunks = {col_name: [] for col_name in columns}
+    file_ranges = {col_name: [] for col_name in columns}
+    for file_path in file_paths:
+        metadata = pq.ParquetFile(file_path).metadata
+        positions = {
+            metadata.schema.column(i).path: i for i in range(metadata.num_columns)
+        }
+        first_chunks = {
+            col_name: len(row_group_chunks[col_name]) for col_name in columns
+        }
+        for index in range(metadata.num_row_groups):
+            row_group = metadata.row_group(index)
+            report["row_groups"] += 1
+            report["rows"] += row_group.num_rows
+            report["bytes"] += sum(
+                row_group.column(i).total_compressed_size
+                for i in range(row_group.num_columns)
+            )
+            for col_name in columns:
+                if col_name not in positions:
+                    continue
+                chunk = row_group.column(positions[col_name])
+                statistics = chunk.statistics if chunk.is_stats_set else None
+                row_group_chunks[col_name].append(
+                    {
+                        "range": (
+                            (statistics.min, statistics.max)
+                            if statistics is not None and statistics.has_min_max
+                            else None
+                        ),
+                        "null_count": (
+                            statistics.null_count
+                            if statistics is not None and statistics.has_null_count
+                            else None
+                        ),
+                        "bloom_filter": has_bloom_filters
+                        and chunk.bloom_filter_offset is not None,
+                        "dictionary": chunk.has_dictionary_page
+                        and "PLAIN" not in chunk.encodings,
+                    }
+                )
+        for col_name in columns:
+            chunks = row_group_chunks[col_name][first_chunks[col_name] :]
+            if chunks:
+                file_ranges[col_name].append(
+                    _merge_ranges([chunk["range"] for chunk in chunks])
+                )
+
+    report["columns"] = {}
+    for col_name, chunks in row_group_chunks.items():
+        if not chunks:
+            continue
+        ranges = [chunk["range"] for chunk in chunks]
+        null_counts = [chunk["null_count"] for chunk in chunks]
+        value_range = _merge_ranges([r for r in ranges if r is not None])
+        report["columns"][col_name] = {
+            "min": value_range[0] if value_range else None,
+            "max": value_range[1] if value_range else None,
+            "null_count": None if None in null_counts else sum(null_counts),
+            "row_groups_with_statistics": sum(r is not None for r in ranges),
+            "row_groups_with_bloom_filter": (
+                sum(chunk["bloom_filter"] for chunk in chunks)
+                if has_bloom_filters
+                else None
+            ),
+            "row_groups_dictionary_encoded": sum(
+                chunk["dictionary"] for chunk in chunks
+            ),
+            "file_read_fraction": _read_fraction(file_ranges[col_name]),
+            "row_group_read_fraction": _read_fraction(ranges),
+        }
+
+        statistics = report["columns"][col_name]
+        print(
+            f"Parquet statistics of {col_name}: {len(chunks)} row groups in "
+            f"{report['files']} files, {statistics['row_groups_with_bloom_filter']} with "
+            f"a Bloom filter, {statistics['row_groups_dictionary_encoded']} dictionary "
+            f"encoded; a point lookup reads ~{statistics['file_read_fraction']:.0%} "
+            f"of the files and ~{statistics['row_group_read_fraction']:.0%} of the row groups"
+        )
+
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=2, default=str)
+
+    return report
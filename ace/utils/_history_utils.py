@@ -0,0 +1,452 @@
+"""
+Run History of the SAP Data Pipelines
+
+Every run of `process_local_material` / `process_order` with a `history_path` appends its
+parameters, input sizes, step timings and output row count to a local SQLite store. The history
+shows how the run times evolve and how they scale with the input size: the throughput of a run
+(input bytes per second) is compared with the median throughput of the previous runs of the same
+pipeline, output and plan changing parameters (`RUN_HISTORY_PLAN_PARAMETERS`), and a run that falls more than `RUN_HISTORY_REGRESSION_THRESHOLD` below this
+rolling baseline is flagged as a performance regression (see `perf_report` and the
+`ace-perf-report` command).
+
+Tables:
+-------
+- runs : one row per run (pipeline, run name, system, start time, duration, input bytes, input
+  bytes per table, output rows and parameters as JSON).
+- stage_timings : the wall time of every pipeline step of a run.
+
+Example usage:
+--------------
+>>> process_local_material(..., history_path="/path/to/run_history.sqlite")
+>>> perf_report("/path/to/run_history.sqlite", pipeline="local_material")
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import json
+import os
+import sqlite3
+import statistics
+from datetime import datetime, timezone
+from typing import Optional
+
+# Custom utils imports
+from ace.schemas import (
+    RUN_HISTORY_BASELINE_WINDOW,
+    RUN_HISTORY_PLAN_PARAMETERS,
+    RUN_HISTORY_REGRESSION_THRESHOLD,
+)
+from ace.utils._use_case_utils import discover_table_files, process_data
+
+HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pipeline TEXT NOT NULL,
+    run_name TEXT NOT NULL,
+    system_name TEXT,
+    started_at TEXT NOT NULL,
+    duration_seconds REAL NOT NULL,
+    input_bytes INTEGER,
+    input_table_bytes TEXT,
+    output_rows INTEGER,
+    parameters TEXT
+);
+CREATE TABLE IF NOT EXISTS stage_timings (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id),
+    step TEXT NOT NULL,
+    seconds REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_pipeline ON runs (pipeline, run_name, run_id);
+"""
+
+
+def _connect(history_path: str) -> sqlite3.Connection:
+    """
+    Opens the history store, creating it and its tables if needed.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(history_path)), exist_ok=True)
+    # Concurrent runs of one process or of several processes wait for each other's writes
+    connection = sqlite3.connect(history_path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(HISTORY_SCHEMA)
+    return connection
+
+
+def input_table_bytes(data_dir: str, tables: Optional[list] = None) -> dict:
+    """
+    Measures the size of the extracts of a data directory per table.
+
+    args:
+    -----
+    - data_dir : str
+        Directory containing the extracts.
+    - tables : list, optional
+        SAP table names to measure. Defaults to all tables of the directory.
+
+    Returns:
+    --------
+    dict
+        Mapping of logical table name (e.g. 'PRD_MARC') to the bytes of all its files.
+    """
+    sizes = {}
+    for base_name, file_paths in discover_table_files(data_dir).items():
+        if tables is not None and base_name.split("_")[-1] not in tables:
+            continue
+        size = 0
+        for file_path in file_paths:
+            if os.path.isdir(file_path):
+                size += sum(
+                    os.path.getsize(os.path.join(root, name))
+                    for root, _, names in os.walk(file_path)
+                    for name in names
+                )
+            else:
+                size += os.path.getsize(file_path)
+        sizes[base_name] = size
+
+    return sizes
+
+
+def record_run(
+    history_path: str,
+    pipeline: str,
+    run_name: str,
+    started_at: float,
+    duration_seconds: float,
+    system_name: Optional[str] = None,
+    input_bytes: Optional[dict] = None,
+    stage_timings: Optional[dict] = None,
+    output_rows: Optional[int] = None,
+    parameters: Optional[dict] = None,
+) -> int:
+    """
+    Appends a run to the history store.
+
+    args:
+    -----
+    - history_path : str
+        The SQLite file of the run history; created if it does not exist.
+    - pipeline : str
+        The pipeline (e.g. 'local_material').
+    - run_name : str
+        The output of the run (e.g. 'local_material_system_1'). Runs are compared with the previous
+        runs of the same pipeline and run name.
+    - started_at : float
+        Start of the run as a POSIX timestamp.
+    - duration_seconds : float
+        Wall time of the run.
+    - system_name : str, optional
+        The source system of the run.
+    - input_bytes : dict, optional
+        Bytes per input table (see `input_table_bytes`).
+    - stage_timings : dict, optional
+        Wall seconds per pipeline step (see `StageMetricsCollector.timings`).
+    - output_rows : int, optional
+        Number of rows written.
+    - parameters : dict, optional
+        The parameters of the run; values that are not JSON serialisable are stored as strings.
+
+    Returns:
+    --------
+    int
+        The id of the recorded run.
+    """
+    # Check input parameters
+    process_data(string_check=history_path)
+
+    input_bytes = input_bytes or {}
+    connection = _connect(history_path)
+    try:
+        with connection:
+            cursor = connection.execute(
+                "INSERT INTO runs (pipeline, run_name, system_name, started_at, duration_seconds,"
+                " input_bytes, input_table_bytes, output_rows, parameters)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    pipeline,
+                    run_name,
+                    system_name,
+                    datetime.fromtimestamp(started_at, timezone.utc).isoformat(
+                        timespec="seconds"
+                    ),
+                    duration_seconds,
+                    sum(input_bytes.values()),
+                    json.dumps(input_bytes),
+                    output_rows,
+                    json.dumps(parameters or {}, default=str),
+                ),
+            )
+            run_id = cursor.lastrowid
+            connection.executemany(
+                "INSERT INTO stage_timings (run_id, step, seconds) VALUES (?, ?, ?)",
+                [
+                    (run_id, step, seconds)
+                    for step, seconds in (stage_timings or {}).items()
+                ],
+            )
+    finally:
+        connection.close()
+
+    return run_id
+
+
+def load_run_history(
+    history_path: str, pipeline: Optional[str] = None, run_name: Optional[str] = None
+) -> list:
+    """
+    Reads the recorded runs in the order they were recorded.
+
+    args:
+    -----
+    - history_path : str
+        The SQLite file of the run history.
+    - pipeline : str, optional
+        Only return the runs of this pipeline.
+    - run_name : str, optional
+        Only return the runs of this run name.
+
+    Returns:
+    --------
+    list
+        One dict per run with the columns of `runs`, the parsed JSON columns, the step timings
+        (`stage_timings`) and the throughput in input bytes per second (`bytes_per_second`).
+
+    Raises:
+    -------
+    FileNotFoundError
+        If the history store does not exist.
+    """
+    # Check input parameters
+    process_data(string_check=history_path)
+    if not os.path.exists(history_path):
+        raise FileNotFoundError(f"The run history '{history_path}' does not exist.")
+
+    conditions, values = [], []
+    for column, value in (("pipeline", pipeline), ("run_name", run_name)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            values.append(value)
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    connection = _connect(history_path)
+    try:
+        runs = [
+            dict(row)
+            for row in connection.execute(
+                f"SELECT * FROM runs{where} ORDER BY run_id", values
+            )
+        ]
+        timings = {}
+        for row in connection.execute(
+            "SELECT run_id, step, seconds FROM stage_timings ORDER BY rowid"
+        ):
+            timings.setdefault(row["run_id"], {})[row["step"]] = row["seconds"]
+    finally:
+        connection.close()
+
+    for run in runs:
+        run["input_table_bytes"] = json.loads(run["input_table_bytes"] or "{}")
+        run["parameters"] = json.loads(run["parameters"] or "{}")
+        run["stage_timings"] = timings.get(run["run_id"], {})
+        run["bytes_per_second"] = (
+            run["input_bytes"] / run["duration_seconds"]
+            if run["input_bytes"] and run["duration_seconds"]
+            else None
+        )
+
+    return runs
+
+
+def _run_group(run: dict) -> tuple:
+    """
+    Returns the runs a run is compared with: same pipeline, run name and plan changing parameters
+    (`RUN_HISTORY_PLAN_PARAMETERS`, only those that differ from their defaults).
+    """
+    plan = []
+    for name, default in RUN_HISTORY_PLAN_PARAMETERS.items():
+        value = run["parameters"].get(name, default)
+        if default is False:
+            value = bool(value)
+        if value != default:
+            plan.append((name, value))
+
+    return run["pipeline"], run["run_name"], tuple(plan)
+
+
+def detect_regressions(
+    runs: list,
+    window: int = RUN_HISTORY_BASELINE_WINDOW,
+    threshold: float = RUN_HISTORY_REGRESSION_THRESHOLD,
+) -> list:
+    """
+    Compares the throughput of every run with the rolling baseline of its pipeline and run name.
+
+    The baseline of a run is the median throughput of the `window` previous runs of the same
+    pipeline, run name and plan changing parameters (sample fraction, output format, quality
+    checks, ...); the first run of each has no baseline. Normalising by
+    the input bytes keeps runs on growing extracts comparable.
+
+    args:
+    -----
+    - runs : list
+        The runs as returned by `load_run_history`, in the order they were recorded.
+    - window : int, optional
+        Number of previous runs in the baseline. Defaults to `RUN_HISTORY_BASELINE_WINDOW`.
+    - threshold : float, optional
+        Fraction below the baseline from which a run is a regression. Defaults to
+        `RUN_HISTORY_REGRESSION_THRESHOLD`.
+
+    Returns:
+    --------
+    list
+        The runs with `baseline_bytes_per_second`, `throughput_change` (relative to the baseline)
+        and `regression` added.
+
+    Raises:
+    -------
+    ValueError
+        If the window is not positive or the threshold not between 0 and 1.
+    """
+    # Check input parameters
+    if window < 1 or not 0 < threshold < 1:
+        raise ValueError("The window must be positive and the threshold in (0, 1).")
+
+    previous = {}
+    for run in runs:
+        history = previous.setdefault(_run_group(run), [])
+        baseline = statistics.median(history[-window:]) if history else None
+        throughput = run["bytes_per_second"]
+
+        run["baseline_bytes_per_second"] = baseline
+        run["throughput_change"] = (
+            throughput / baseline - 1 if baseline and throughput is not None else None
+        )
+        run["regression"] = (
+            run["throughput_change"] is not None
+            and run["throughput_change"] < -threshold
+        )
+        if throughput is not None:
+            history.append(throughput)
+
+    return runs
+
+
+def _slower_steps(run: dict, runs: list, window: int) -> list:
+    """
+    Lists the steps of a run that took longer than the median of the same step in its baseline.
+    """
+    baseline_runs = [
+        r
+        for r in runs
+        if _run_group(r) == _run_group(run) and r["run_id"] < run["run_id"]
+    ][-window:]
+
+    slower = []
+    for step, seconds in run["stage_timings"].items():
+        baseline = [
+            r["stage_timings"][step]
+            for r in baseline_runs
+            if step in r["stage_timings"]
+        ]
+        if baseline and seconds > statistics.median(baseline):
+            slower.append((step, seconds, statistics.median(baseline)))
+
+    return sorted(slower, key=lambda s: s[1] - s[2], reverse=True)
+
+
+def perf_report(
+    history_path: str,
+    pipeline: Optional[str] = None,
+    run_name: Optional[str] = None,
+    window: int = RUN_HISTORY_BASELINE_WINDOW,
+    threshold: float = RUN_HISTORY_REGRESSION_THRESHOLD,
+    limit: int = 20,
+    latest_only: bool = False,
+) -> list:
+    """
+    Prints the throughput trend of the recorded runs and flags the performance regressions.
+
+    For every pipeline and run name the last `limit` runs are listed with their input size,
+    duration, throughput and change against the rolling baseline (see `detect_regressions`). For
+    each listed regression, the steps that took longer than in the baseline are listed.
+
+    args:
+    -----
+    - history_path : str
+        The SQLite file of the run history.
+    - pipeline : str, optional
+        Only report the runs of this pipeline.
+    - run_name : str, optional
+        Only report the runs of this run name.
+    - window : int, optional
+        Number of previous runs in the baseline. Defaults to `RUN_HISTORY_BASELINE_WINDOW`.
+    - threshold : float, optional
+        Fraction below the baseline from which a run is a regression. Defaults to
+        `RUN_HISTORY_REGRESSION_THRESHOLD`.
+    - limit : int, optional
+        Number of runs listed per pipeline and run name. Defaults to 20.
+    - latest_only : bool, optional (default=False)
+        Only return the regression of the latest run of each pipeline and run name, e.g. to fail
+        a scheduled check on the run that just finished rather than on a regression already
+        fixed since.
+
+    Returns:
+    --------
+    list
+        The flagged runs among the listed ones (see `detect_regressions`).
+    """
+    runs = detect_regressions(
+        load_run_history(history_path, pipeline, run_name), window, threshold
+    )
+
+    groups = {}
+    for run in runs:
+        groups.setdefault(_run_group(run), []).append(run)
+
+    for (group_pipeline, group_run_name, plan), group_runs in groups.items():
+        plan = ", ".join(
+            name if value is True else f"{name} {value}" for name, value in plan
+        )
+        print(
+            f"\n{group_pipeline} / {group_run_name}"
+            f"{f' ({plan})' if plan else ''} ({len(group_runs)} runs)"
+        )
+        print(
+            f"{'run':>5}  {'started at (UTC)':<25}  {'input MB':>9}  {'seconds':>8}  "
+            f"{'MB/s':>7}  {'baseline':>8}  {'change':>7}  {'output rows':>11}"
+        )
+        for run in group_runs[-limit:]:
+            throughput, baseline = (
+                run["bytes_per_second"],
+                run["baseline_bytes_per_second"],
+            )
+            change = run["throughput_change"]
+            print(
+                f"{run['run_id']:>5}  {run['started_at']:<25}  "
+                f"{(run['input_bytes'] or 0) / 1e6:>9.2f}  {run['duration_seconds']:>8.1f}  "
+                f"{throughput / 1e6 if throughput else 0:>7.2f}  "
+                f"{'' if baseline is None else f'{baseline / 1e6:.2f}':>8}  "
+                f"{'' if change is None else f'{change:+.0%}':>7}  "
+                f"{'' if run['output_rows'] is None else run['output_rows']:>11}"
+                f"{'  REGRESSION' if run['regression'] else ''}"
+            )
+
+    listed = [run for group_runs in groups.values() for run in group_runs[-limit:]]
+    regressions = [run for run in listed if run["regression"]]
+    for run in regressions:
+        print(
+            f"\nRegression in run {run['run_id']} of {run['pipeline']} / {run['run_name']}: "
+            f"throughput {run['throughput_change']:+.0%} against the baseline"
+        )
+        for step, seconds, baseline in _slower_steps(run, runs, window):
+            print(f"    {step}: {seconds:.1f}s (baseline {baseline:.1f}s)")
+
+    if latest_only:
+        latest = {group_runs[-1]["run_id"] for group_runs in groups.values()}
+        regressions = [run for run in regressions if run["run_id"] in latest]
+    return regressions
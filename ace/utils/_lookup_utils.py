@@ -0,0 +1,427 @@
+"""
+Point Lookup Indexes over the CSV Outputs
+
+Looking up single rows of the `local_material` / `process_order` outputs (by `primary_key_inter`,
+`material_number`, ...) used to mean starting Spark or grepping a multi-GB CSV. After the write,
+`build_lookup_index` streams the output once and writes a sorted key -> offset index: fixed-width
+records (key, file, byte offset, length) sorted by key, behind a small JSON header. `LookupIndex`
+memory-maps the index and the output files, finds the keys by binary search and reads only the
+matching rows, so a batch of lookups takes milliseconds and needs no JVM. The operating system
+keeps the hot index and data pages cached; recently read rows are also cached in memory.
+
+Both CSV layouts are supported: the single output file and the partitioned layout (the partition
+values are taken from the directory names). The index is sorted in chunks that are merged from
+temporary files, so outputs larger than memory can be indexed.
+
+Index file layout:
+------------------
+- `ACEIDX1\\n`, the header length (4 bytes, little endian) and the JSON header (key column, key
+  width, record count, output files relative to the index with their size and modification
+  time, CSV columns). An index whose output files changed since it was built is rejected.
+- The records, `<key width>s` (right padded with null bytes), offset `Q`, length `I`, file `H`.
+
+Example usage:
+--------------
+>>> build_lookup_index("/path/to/output/local_material.csv", "material_number")
+'/path/to/output/local_material.material_number.idx'
+>>> with LookupIndex("/path/to/output/local_material.material_number.idx") as index:
+...     rows = index.lookup("M-1000")
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import csv
+import glob
+import heapq
+import json
+import mmap
+import os
+import struct
+import tempfile
+from functools import lru_cache
+from typing import Optional
+
+# Custom utils imports
+from ace.utils._use_case_utils import process_data
+
+INDEX_MAGIC = b"ACEIDX1\n"
+INDEX_HEADER_LENGTH = struct.Struct("<I")
+RUN_KEY_LENGTH = struct.Struct("<H")
+RUN_LOCATION = struct.Struct("<QIH")
+
+
+def _csv_reader_options(delimiter: str) -> dict:
+    """
+    Returns the options of `csv.reader` matching Spark's CSV writer (backslash escaped quotes).
+    """
+    return {"delimiter": delimiter, "quotechar": '"', "escapechar": "\\"}
+
+
+def _output_files(output_path: str) -> list:
+    """
+    Lists the CSV files of an output: the file itself, or the part files of a partitioned layout.
+    """
+    if os.path.isfile(output_path):
+        return [output_path]
+
+    return sorted(
+        path
+        for path in glob.glob(os.path.join(output_path, "**", "*.csv"), recursive=True)
+        if os.path.getsize(path) > 0
+    )
+
+
+def _partition_values(file_path: str, output_path: str) -> dict:
+    """
+    Reads the partition values of a part file from its `column=value` directories.
+    """
+    relative_dir = os.path.relpath(os.path.dirname(file_path), output_path)
+    return dict(
+        part.split("=", 1) for part in relative_dir.split(os.sep) if "=" in part
+    )
+
+
+def _scan_records(data: mmap.mmap, start: int):
+    """
+    Yields the byte offset and length of every CSV record; quoted line breaks are kept.
+    """
+    size = len(data)
+    offset = start
+    while offset < size:
+        end, open_quotes = offset, 0
+        # A record with an open quote continues on the next line
+        while end == offset or (end < size and open_quotes % 2):
+            line_end = data.find(b"\n", end)
+            line_end = size if line_end == -1 else line_end + 1
+            line = data[end:line_end]
+            open_quotes += line.count(b'"') - line.count(b'\\"')
+            end = line_end
+        if data[offset:end].strip():
+            yield offset, end - offset
+        offset = end
+
+
+def _parse_record(record: bytes, delimiter: str) -> list:
+    """
+    Parses one CSV record into its fields.
+    """
+    text = record.decode("utf-8").rstrip("\r\n")
+    return next(csv.reader([text], **_csv_reader_options(delimiter)))
+
+
+def _write_run(entries: list, directory: str) -> str:
+    """
+    Sorts index entries and writes them to a temporary run file.
+    """
+    entries.sort()
+    with tempfile.NamedTemporaryFile("wb", dir=directory, delete=False) as run_file:
+        for key, file_id, offset, length in entries:
+            run_file.write(RUN_KEY_LENGTH.pack(len(key)) + key)
+            run_file.write(RUN_LOCATION.pack(offset, length, file_id))
+    return run_file.name
+
+
+def _read_run(run_path: str):
+    """
+    Yields the sorted index entries of a run file.
+    """
+    with open(run_path, "rb") as run_file:
+        while True:
+            prefix = run_file.read(RUN_KEY_LENGTH.size)
+            if not prefix:
+                return
+            key = run_file.read(RUN_KEY_LENGTH.unpack(prefix)[0])
+            offset, length, file_id = RUN_LOCATION.unpack(
+                run_file.read(RUN_LOCATION.size)
+            )
+            yield key, file_id, offset, length
+
+
+def build_lookup_index(
+    output_path: str,
+    key_column: str,
+    index_path: Optional[str] = None,
+    delimiter: str = ",",
+    chunk_rows: int = 1_000_000,
+) -> str:
+    """
+    Builds a sorted key -> offset index over a CSV output for point lookups.
+
+    args:
+    -----
+    - output_path : str
+        The CSV output file, or the directory of a partitioned CSV output.
+    - key_column : str
+        The column to look rows up by (e.g. 'primary_key_inter'). Keys need not be unique.
+    - index_path : str, optional
+        The index file. Defaults to `<output without .csv>.<key_column>.idx` next to the output.
+    - delimiter : str, optional
+        The field delimiter of the output. Defaults to ','.
+    - chunk_rows : int, optional
+        Number of index entries sorted in memory at a time. Defaults to 1,000,000.
+
+    Returns:
+    --------
+    str
+        The path of the index file.
+
+    Raises:
+    -------
+    ValueError
+        If the output has no CSV files (e.g. a bucketed table) or lacks the key column.
+    """
+    # Check input parameters
+    process_data(string_check=output_path)
+    process_data(string_check=key_column)
+
+    output_path = os.path.abspath(output_path)
+    if index_path is None:
+        base_path = output_path[:-4] if output_path.endswith(".csv") else output_path
+        index_path = f"{base_path}.{key_column}.idx"
+    index_dir = os.path.dirname(os.path.abspath(index_path))
+
+    file_paths = _output_files(output_path)
+    if not file_paths:
+        raise ValueError(f"No CSV output files found in '{output_path}'.")
+
+    columns, files, runs, entries = None, [], [], []
+    key_width = records = 0
+    try:
+        for file_id, file_path in enumerate(file_paths):
+            with open(file_path, "rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                header_end = data.find(b"\n") + 1 or len(data)
+                file_columns = _parse_record(data[:header_end], delimiter)
+                if key_column not in file_columns:
+                    raise ValueError(
+                        f"The output '{file_path}' has no column '{key_column}'."
+                    )
+                columns = columns or file_columns
+                key_position = file_columns.index(key_column)
+                stat = os.fstat(file.fileno())
+                files.append(
+                    {
+                        "path": os.path.relpath(file_path, index_dir),
+                        "size": stat.st_size,
+                        "mtime_ns": stat.st_mtime_ns,
+                        "columns": file_columns,
+                        "partition_values": _partition_values(file_path, output_path),
+                    }
+                )
+
+                for offset, length in _scan_records(data, header_end):
+                    record = data[offset : offset + length]
+                    if b'"' in record:
+                        key = _parse_record(record, delimiter)[key_position]
+                    else:
+                        key = (
+                            record.rstrip(b"\r\n")
+                            .split(delimiter.encode())[key_position]
+                            .decode("utf-8")
+                        )
+                    key = key.encode("utf-8")
+                    key_width = max(key_width, len(key))
+                    entries.append((key, file_id, offset, length))
+                    records += 1
+                    if len(entries) >= chunk_rows:
+                        runs.append(_write_run(entries, index_dir))
+                        entries = []
+
+        # Merge the sorted runs into fixed-width records
+        key_width = max(key_width, 1)
+        record_format = struct.Struct(f"<{key_width}sQIH")
+        entries.sort()
+        header = json.dumps(
+            {
+                "key_column": key_column,
+                "key_width": key_width,
+                "records": records,
+                "delimiter": delimiter,
+                "columns": columns,
+                "files": files,
+            }
+        ).encode("utf-8")
+        with open(index_path + ".tmp", "wb") as index_file:
+            index_file.write(INDEX_MAGIC + INDEX_HEADER_LENGTH.pack(len(header)))
+            index_file.write(header)
+            for key, file_id, offset, length in heapq.merge(
+                entries, *[_read_run(run_path) for run_path in runs]
+            ):
+                index_file.write(record_format.pack(key, offset, length, file_id))
+        os.replace(index_path + ".tmp", index_path)
+    finally:
+        for run_path in runs:
+            os.remove(run_path)
+
+    print(f"Indexed {records} rows of {output_path} by {key_column} in {index_path}")
+    return index_path
+
+
+class LookupIndex:
+    """
+    Answers key lookups from an index built by `build_lookup_index`, without Spark.
+
+    args:
+    -----
+    - index_path : str
+        The index file.
+    - cache_size : int, optional (default=4096)
+        Number of recently read rows kept in memory.
+
+    Raises:
+    -------
+    ValueError
+        If the file is not a lookup index, or an output file changed (size or modification
+        time) after the index was built.
+    """
+
+    def __init__(self, index_path: str, cache_size: int = 4096):
+        # Check input parameters
+        process_data(string_check=index_path)
+
+        self._data = {}
+        self._index_file = open(index_path, "rb")
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._index[: len(INDEX_MAGIC)] != INDEX_MAGIC:
+            self.close()
+            raise ValueError(f"'{index_path}' is not a lookup index.")
+
+        header_start = len(INDEX_MAGIC) + INDEX_HEADER_LENGTH.size
+        (header_length,) = INDEX_HEADER_LENGTH.unpack(
+            self._index[len(INDEX_MAGIC) : header_start]
+        )
+        header = json.loads(self._index[header_start : header_start + header_length])
+
+        self.key_column = header["key_column"]
+        self.records = header["records"]
+        self._delimiter = header["delimiter"]
+        self._key_width = header["key_width"]
+        self._record = struct.Struct(f"<{self._key_width}sQIH")
+        self._records_start = header_start + header_length
+        index_dir = os.path.dirname(os.path.abspath(index_path))
+        self._files = [
+            {**file, "path": os.path.join(index_dir, file["path"])}
+            for file in header["files"]
+        ]
+        # The offsets are only valid for the output the index was built from
+        for file in self._files:
+            stat = os.stat(file["path"]) if os.path.exists(file["path"]) else None
+            if stat is None or (stat.st_size, stat.st_mtime_ns) != (
+                file["size"],
+                file["mtime_ns"],
+            ):
+                self.close()
+                raise ValueError(
+                    f"The output '{file['path']}' changed after the index '{index_path}' "
+                    "was built; rebuild the index with `build_lookup_index`."
+                )
+        self._read_row = lru_cache(maxsize=cache_size)(self._read_row_uncached)
+
+    def _key_at(self, position: int) -> bytes:
+        start = self._records_start + position * self._record.size
+        return self._index[start : start + self._key_width]
+
+    def _lower_bound(self, key: bytes) -> int:
+        """
+        Returns the position of the first record whose key is not smaller than the key.
+        """
+        low, high = 0, self.records
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _data_file(self, file_id: int) -> mmap.mmap:
+        """
+        Memory-maps an output file on its first use.
+        """
+        if file_id not in self._data:
+            file = open(self._files[file_id]["path"], "rb")
+            self._data[file_id] = (
+                file,
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ),
+            )
+        return self._data[file_id][1]
+
+    def _read_row_uncached(self, file_id: int, offset: int, length: int) -> dict:
+        file = self._files[file_id]
+        record = self._data_file(file_id)[offset : offset + length]
+        row = dict(zip(file["columns"], _parse_record(record, self._delimiter)))
+        return {**row, **file["partition_values"]}
+
+    def lookup(self, key: str) -> list:
+        """
+        Returns all rows of a key.
+
+        args:
+        -----
+        - key : str
+            The key to look up.
+
+        Returns:
+        --------
+        list
+            The matching rows as dicts of column name to (string) value, in output order.
+        """
+        key_bytes = str(key).encode("utf-8")
+        if len(key_bytes) > self._key_width:
+            return []
+        padded_key = key_bytes.ljust(self._key_width, b"\0")
+
+        rows = []
+        position = self._lower_bound(padded_key)
+        while position < self.records:
+            start = self._records_start + position * self._record.size
+            record_key, offset, length, file_id = self._record.unpack(
+                self._index[start : start + self._record.size]
+            )
+            if record_key != padded_key:
+                break
+            rows.append(self._read_row(file_id, offset, length))
+            position += 1
+
+        return rows
+
+    def lookup_many(self, keys: list) -> dict:
+        """
+        Returns the rows of a batch of keys.
+
+        The keys are looked up in sorted order, so neighbouring keys share the cached pages.
+
+        args:
+        -----
+        - keys : list
+            The keys to look up.
+
+        Returns:
+        --------
+        dict
+            Mapping of every key to its rows (an empty list if the key is unknown).
+        """
+        return {key: self.lookup(key) for key in sorted(set(map(str, keys)))}
+
+    def close(self) -> None:
+        """
+        Releases the memory maps and files of the index.
+        """
+        for file, data in self._data.values():
+            data.close()
+            file.close()
+        self._data = {}
+        self._index.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,355 @@
+"""
+Stage Metrics of the SAP Data Pipelines
+
+Wall times alone do not explain a slow run. `StageMetricsCollector` tags the Spark jobs of
+every pipeline step with a job group (`<run>:<step>`) and, after the run, reads the task metrics
+of their Spark stages from the status store that Spark's own listener fills (exposed through the
+monitoring REST API of the driver UI): shuffle read/write bytes, spilled bytes, GC time and skew,
+the ratio of the slowest to the median task run time. The per-run summary aggregates them per
+pipeline step and flags the worst Spark stages.
+
+Spark evaluates lazily, so the Spark stages of a step run in the first action that needs it.
+Measuring does not change the plan of a run: the work of lazy steps (preparing and integrating
+the inputs) is attributed to the action that runs it, usually the output write, unless the
+prepared inputs are materialised on their own (see the pipeline option `prep_parallelism`).
+
+Example usage:
+--------------
+>>> metrics = StageMetricsCollector("local_material_system_1")
+>>> with metrics.stage("write_output"):
+...     write_output(df, ...)
+>>> summary = metrics.write_summary("/path/to/metrics.json")
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import json
+import os
+import statistics
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Optional
+
+# Pyspark libraries
+from pyspark.sql import SparkSession
+
+# Custom utils imports
+from ace.schemas import (
+    METRICS_GC_FRACTION_THRESHOLD,
+    METRICS_SKEW_RATIO_THRESHOLD,
+)
+from ace.utils._use_case_utils import process_data
+
+STAGE_METRICS = {
+    "executorRunTime": "executor_run_time_ms",
+    "jvmGcTime": "jvm_gc_time_ms",
+    "inputBytes": "input_bytes",
+    "outputBytes": "output_bytes",
+    "shuffleReadBytes": "shuffle_read_bytes",
+    "shuffleWriteBytes": "shuffle_write_bytes",
+    "memoryBytesSpilled": "memory_spilled_bytes",
+    "diskBytesSpilled": "disk_spilled_bytes",
+}
+
+
+class StageMetricsCollector:
+    """
+    Maps the Spark stages of a pipeline run to its steps and summarises their task metrics.
+
+    args:
+    -----
+    - run_name : str
+        Name of the run, the prefix of its job groups. Concurrent runs need different names.
+    - enabled : bool, optional (default=True)
+        If False, `stage` only records the wall time of the step, so the pipelines can use the
+        collector unconditionally.
+    - spark : SparkSession, optional
+        An existing Spark session. If not provided, the active one is used.
+    """
+
+    def __init__(
+        self,
+        run_name: str,
+        enabled: bool = True,
+        spark: Optional[SparkSession] = None,
+    ):
+        # Check input parameters
+        process_data(string_check=run_name, boolean_check=enabled)
+
+        self.run_name = run_name
+        self.enabled = enabled
+        self._spark = spark
+        self._steps = []
+        self.timings = {}
+
+    @property
+    def spark(self) -> SparkSession:
+        if self._spark is None:
+            self._spark = SparkSession.builder.getOrCreate()
+        return self._spark
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Tags the Spark jobs started in this block (by this thread) with the pipeline step name.
+
+        The wall time of the block is added to `timings[name]`, also if the collector is disabled.
+
+        args:
+        -----
+        - name : str
+            The pipeline step (e.g. 'integrate_data').
+        """
+        started = time.perf_counter()
+        if not self.enabled:
+            try:
+                yield
+            finally:
+                self._record_time(name, started)
+            return
+
+        context = self.spark.sparkContext
+        previous_group = context.getLocalProperty("spark.jobGroup.id")
+        previous_description = context.getLocalProperty("spark.job.description")
+        context.setJobGroup(f"{self.run_name}:{name}", f"{self.run_name} {name}")
+        if name not in self._steps:
+            self._steps.append(name)
+        try:
+            yield
+        finally:
+            context.setLocalProperty("spark.jobGroup.id", previous_group)
+            context.setLocalProperty("spark.job.description", previous_description)
+            self._record_time(name, started)
+
+    def _record_time(self, name: str, started: float) -> None:
+        """
+        Adds the wall time since `started` to the timing of a step.
+        """
+        self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - started
+
+    def _get(self, path: str):
+        """
+        Reads a resource of the monitoring REST API of this application.
+        """
+        context = self.spark.sparkContext
+        url = f"{context.uiWebUrl}/api/v1/applications/{context.applicationId}{path}"
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return json.load(response)
+
+    def _jobs(self, timeout: float) -> list:
+        """
+        Returns the finished jobs of this run, waiting for the listener to record all of them.
+        """
+        prefix = f"{self.run_name}:"
+        deadline = time.monotonic() + timeout
+        while True:
+            jobs = [
+                job
+                for job in self._get("/jobs")
+                if (job.get("jobGroup") or "").startswith(prefix)
+            ]
+            if time.monotonic() > deadline or all(
+                job["status"] != "RUNNING" for job in jobs
+            ):
+                return jobs
+            time.sleep(0.2)
+
+    def collect(self, timeout: float = 10.0) -> list:
+        """
+        Reads the metrics of every Spark stage run by the steps of this run.
+
+        args:
+        -----
+        - timeout : float, optional
+            Seconds to wait for Spark's listener to record the last jobs. Defaults to 10.
+
+        Returns:
+        --------
+        list
+            One entry per Spark stage attempt with its pipeline step, ids, name, task count,
+            the metrics of `STAGE_METRICS`, and the median and maximum task run time.
+        """
+        if not self.enabled:
+            return []
+
+        if not self.spark.sparkContext.uiWebUrl:
+            print("The Spark UI is disabled: no stage metrics can be collected.")
+            return []
+
+        prefix = f"{self.run_name}:"
+        stages, seen = [], set()
+        for job in sorted(self._jobs(timeout), key=lambda job: job["jobId"]):
+            step = job["jobGroup"][len(prefix) :]
+            for stage_id in job["stageIds"]:
+                try:
+                    attempts = self._get(f"/stages/{stage_id}")
+                except OSError:
+                    # Stages that were never submitted are not recorded
+                    continue
+
+                for attempt in attempts:
+                    key = (attempt["stageId"], attempt["attemptId"])
+                    if attempt["status"] in ("SKIPPED", "PENDING") or key in seen:
+                        continue
+                    seen.add(key)
+
+                    try:
+                        summary = self._get(
+                            f"/stages/{key[0]}/{key[1]}/taskSummary?quantiles=0.5,1.0"
+                        )
+                    except OSError:
+                        summary = {}
+                    median_ms, max_ms = summary.get("executorRunTime", [None, None])
+                    stages.append(
+                        {
+                            "step": step,
+                            "stage_id": key[0],
+                            "attempt_id": key[1],
+                            "name": attempt["name"],
+                            "status": attempt["status"],
+                            "tasks": attempt["numTasks"],
+                            **{
+                                field: attempt.get(metric, 0)
+                                for metric, field in STAGE_METRICS.items()
+                            },
+                            "median_task_ms": median_ms,
+                            "max_task_ms": max_ms,
+                        }
+                    )
+
+        return stages
+
+    def summarize(self, stages: list, top_n: int = 3) -> dict:
+        """
+        Aggregates stage metrics per pipeline step and flags the worst Spark stages.
+
+        A Spark stage is flagged for skew if its slowest task runs `METRICS_SKEW_RATIO_THRESHOLD`
+        times longer than its median task, for spill if it spilled at all, and for GC if the
+        garbage collector took `METRICS_GC_FRACTION_THRESHOLD` of its run time. The stages with
+        the most shuffle bytes are always listed.
+
+        args:
+        -----
+        - stages : list
+            The stage metrics as returned by `collect`.
+        - top_n : int, optional
+            Number of stages listed per issue. Defaults to 3.
+
+        Returns:
+        --------
+        dict
+            The run name, the totals per step and the worst offenders per issue.
+        """
+        for stage in stages:
+            median_ms, max_ms = stage["median_task_ms"], stage["max_task_ms"]
+            stage["skew"] = (
+                max_ms / median_ms if stage["tasks"] > 1 and median_ms else None
+            )
+            stage["spill_bytes"] = (
+                stage["memory_spilled_bytes"] + stage["disk_spilled_bytes"]
+            )
+            stage["shuffle_bytes"] = (
+                stage["shuffle_read_bytes"] + stage["shuffle_write_bytes"]
+            )
+            stage["gc_fraction"] = (
+                stage["jvm_gc_time_ms"] / stage["executor_run_time_ms"]
+                if stage["executor_run_time_ms"]
+                else None
+            )
+
+        # Nested job groups (e.g. 'prepare_inputs/prepare_MARA') follow their parent step
+        def step_order(step: str) -> tuple:
+            parent = step.split("/")[0]
+            position = (
+                self._steps.index(parent) if parent in self._steps else len(self._steps)
+            )
+            return position, step != parent, step
+
+        steps = sorted(set(self._steps) | {s["step"] for s in stages}, key=step_order)
+        totals = []
+        for step in steps:
+            step_stages = [stage for stage in stages if stage["step"] == step]
+            skews = [s["skew"] for s in step_stages if s["skew"] is not None]
+            totals.append(
+                {
+                    "step": step,
+                    "spark_stages": len(step_stages),
+                    "tasks": sum(s["tasks"] for s in step_stages),
+                    **{
+                        field: sum(s[field] for s in step_stages)
+                        for field in [*STAGE_METRICS.values(), "spill_bytes"]
+                    },
+                    "max_skew": max(skews) if skews else None,
+                    "median_skew": statistics.median(skews) if skews else None,
+                }
+            )
+
+        def worst(field: str, flagged) -> list:
+            candidates = [s for s in stages if s[field] is not None and flagged(s)]
+            return [
+                {
+                    "step": s["step"],
+                    "stage_id": s["stage_id"],
+                    "name": s["name"],
+                    field: s[field],
+                }
+                for s in sorted(candidates, key=lambda s: s[field], reverse=True)[
+                    :top_n
+                ]
+            ]
+
+        return {
+            "run": self.run_name,
+            "steps": totals,
+            "worst_offenders": {
+                "skew": worst(
+                    "skew", lambda s: s["skew"] >= METRICS_SKEW_RATIO_THRESHOLD
+                ),
+                "spill": worst("spill_bytes", lambda s: s["spill_bytes"] > 0),
+                "gc": worst(
+                    "gc_fraction",
+                    lambda s: s["gc_fraction"] >= METRICS_GC_FRACTION_THRESHOLD,
+                ),
+                "shuffle": worst("shuffle_bytes", lambda s: s["shuffle_bytes"] > 0),
+            },
+        }
+
+    def write_summary(self, summary_path: str, timeout: float = 10.0) -> dict:
+        """
+        Collects the stage metrics of the run, writes the summary and prints the flagged stages.
+
+        args:
+        -----
+        - summary_path : str
+            The JSON file the summary is written to.
+        - timeout : float, optional
+            Seconds to wait for Spark's listener to record the last jobs. Defaults to 10.
+
+        Returns:
+        --------
+        dict
+            The summary (see `summarize`).
+        """
+        # Check input parameters
+        process_data(string_check=summary_path)
+
+        summary = self.summarize(self.collect(timeout))
+
+        os.makedirs(os.path.dirname(os.path.abspath(summary_path)), exist_ok=True)
+        with open(summary_path, "w") as summary_file:
+            json.dump(summary, summary_file, indent=2)
+
+        for issue in ("skew", "spill", "gc"):
+            for offender in summary["worst_offenders"][issue]:
+                print(
+                    f"Stage metrics of {self.run_name}: {issue} in Spark stage "
+                    f"{offender['stage_id']} of {offender['step']} ({offender['name']})"
+                )
+
+        return summary
@@ -0,0 +1,381 @@
+"""
+Scan Filter Pushdown for the SAP Data Pipelines
+
+The prep steps drop deleted and archived rows (`LVORM`, `BISMT`, `BWTAR`). On a columnar input,
+Spark pushes these filters into the scan, and Parquet skips every row group whose statistics show
+that none of its rows can pass: those rows are never decoded. CSV extracts are always parsed in
+full, so they can be staged as Parquet first, sorted by the filter columns so that deleted rows
+end up in row groups of their own.
+
+The filters are declared once in `SCAN_FILTERS` (see `ace.schemas`) and used for all three: the
+prep steps build their conditions from them, the staging sorts by their columns, and the report
+evaluates them against the Parquet row group statistics to show the bytes each filter skips.
+
+Functions in this module include:
+---------------------------------------------------------------
+1. `scan_filter`:
+   Builds the Spark condition of a declared filter.
+
+2. `stage_table_files`:
+   Stages the extracts of a directory as Parquet, sorted by the filter columns of each table.
+
+3. `scan_filter_report`:
+   Reports the filters Spark pushes into the scan and the bytes the row group statistics skip.
+
+Example usage:
+--------------
+>>> staged_dir = stage_table_files("/path/to/system_1", "/path/to/staging/system_1")
+>>> registry = TableRegistry.from_directory(staged_dir)
+>>> results = scan_filter_report(registry.as_dict(), "/path/to/scan_filter_report.json")
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import json
+import os
+import re
+from functools import reduce
+from typing import Optional
+
+# Pyspark libraries
+import pyspark.sql.functions as F
+from pyspark.sql import Column, DataFrame
+
+# Custom utils imports
+from ace.schemas import SCAN_FILTERS
+from ace.utils._statistics_utils import _local_path
+from ace.utils._use_case_utils import (
+    detect_file_format,
+    discover_table_files,
+    process_data,
+    read_table,
+)
+
+SUPPORTED_OPERATORS = {"is_null", "eq", "not_in"}
+
+
+def _condition(column: str, operator: str, value=None) -> Column:
+    """
+    Returns the Spark condition of a single `(column, operator, value)` filter condition.
+    """
+    if operator == "is_null":
+        return F.col(column).isNull()
+    if operator == "eq":
+        return F.col(column) == value
+    if operator == "not_in":
+        return ~F.col(column).isin(*value)
+
+    raise ValueError(
+        f"Unsupported scan filter operator '{operator}'. Supported operators are: {', '.join(sorted(SUPPORTED_OPERATORS))}."
+    )
+
+
+def _arrow_condition(column: str, operator: str, value=None):
+    """
+    Returns the pyarrow expression of a single `(column, operator, value)` filter condition.
+    """
+    import pyarrow.compute as pc
+
+    if operator == "is_null":
+        return pc.field(column).is_null()
+    if operator == "eq":
+        return pc.field(column) == value
+    if operator == "not_in":
+        return ~pc.field(column).isin(value)
+
+    raise ValueError(
+        f"Unsupported scan filter operator '{operator}'. Supported operators are: {', '.join(sorted(SUPPORTED_OPERATORS))}."
+    )
+
+
+def scan_filter(table: str, name: str, filters: Optional[dict] = None) -> Column:
+    """
+    Builds the Spark condition of a declared scan filter; a row passes if any condition holds.
+
+    args:
+    -----
+    - table : str
+        The SAP table name (e.g. 'MARA').
+    - name : str
+        The filter name (e.g. 'material_not_deleted').
+    - filters : dict, optional
+        The filter declarations. Defaults to `SCAN_FILTERS`.
+
+    Returns:
+    --------
+    Column
+        The filter condition.
+
+    Raises:
+    -------
+    KeyError
+        If the filter is not declared for the table.
+    """
+    # Check input parameters
+    process_data(string_check=table)
+    process_data(string_check=name)
+
+    filters = SCAN_FILTERS if filters is None else filters
+    if name not in filters.get(table, {}):
+        raise KeyError(f"Scan filter '{name}' is not declared for table '{table}'.")
+
+    conditions = [_condition(*condition) for condition in filters[table][name]]
+    return reduce(lambda a, b: a | b, conditions)
+
+
+def _filter_columns(table: str, filters: dict) -> list:
+    """
+    Returns the columns used by the filters of a table, in declaration order.
+    """
+    columns = []
+    for conditions in filters.get(table, {}).values():
+        for condition in conditions:
+            if condition[0] not in columns:
+                columns.append(condition[0])
+    return columns
+
+
+def stage_table_files(
+    data_dir: str,
+    staging_dir: str,
+    tables: Optional[list] = None,
+    table_globs: Optional[dict] = None,
+    filters: Optional[dict] = None,
+    row_group_bytes: Optional[int] = None,
+    bad_records_path: Optional[str] = None,
+) -> str:
+    """
+    Stages the extracts of a directory as Parquet, sorted by the filter columns of each table.
+
+    Each logical table is written to `<staging_dir>/<table>.parquet` with its SAP date fields
+    parsed. Sorting by the filter columns gathers the deleted and archived rows in their own row
+    groups, which the pushed-down filters then skip. A staged table is rewritten only if one of
+    its extracts is newer than the staged copy.
+
+    args:
+    -----
+    - data_dir : str
+        Directory containing the extracts.
+    - staging_dir : str
+        Directory the Parquet copies are written to.
+    - tables : list, optional
+        SAP table names to stage. Defaults to all tables of the directory.
+    - table_globs : dict, optional
+        Glob patterns of tables, passed to `discover_table_files`.
+    - filters : dict, optional
+        The filter declarations whose columns the tables are sorted by. Defaults to `SCAN_FILTERS`.
+    - row_group_bytes : int, optional
+        Target size of the Parquet row groups (`parquet.block.size`). Smaller row groups let the
+        filters skip at a finer grain. Defaults to the Parquet default.
+    - bad_records_path : str, optional
+        If given, malformed CSV rows are written to `<bad_records_path>/<extract>` and not
+        staged (see `read_table`).
+
+    Returns:
+    --------
+    str
+        The staging directory, to be read like the original data directory.
+    """
+    # Check input parameters
+    process_data(string_check=staging_dir)
+
+    filters = SCAN_FILTERS if filters is None else filters
+    os.makedirs(staging_dir, exist_ok=True)
+
+    for base_name, file_paths in discover_table_files(data_dir, table_globs).items():
+        table = base_name.split("_")[-1]
+        if tables is not None and table not in tables:
+            continue
+
+        staged_path = os.path.join(staging_dir, f"{base_name}.parquet")
+        success_path = os.path.join(staged_path, "_SUCCESS")
+        if os.path.exists(success_path) and os.path.getmtime(success_path) >= max(
+            map(os.path.getmtime, file_paths)
+        ):
+            continue
+
+        cached_frames = []
+        df = read_table(
+            file_paths,
+            os.path.join(bad_records_path, base_name) if bad_records_path else None,
+            cached_frames,
+        )
+        sort_columns = [c for c in _filter_columns(table, filters) if c in df.columns]
+        if sort_columns:
+            df = df.sortWithinPartitions(*sort_columns)
+
+        writer = df.write.mode("overwrite")
+        if row_group_bytes is not None:
+            writer = writer.option("parquet.block.size", row_group_bytes)
+        writer.parquet(staged_path)
+
+        # Release the rows cached to move malformed rows aside, once they are staged
+        for cached_df in cached_frames:
+            cached_df.unpersist()
+
+    return staging_dir
+
+
+def _pushed_filters(df: DataFrame) -> list:
+    """
+    Returns the filters Spark pushes into the file scans of a DataFrame.
+    """
+    plan = df._jdf.queryExecution().executedPlan().toString()
+
+    pushed_filters = []
+    for match in re.finditer(r"PushedFilters: \[", plan):
+        # Split the bracketed list at its top level commas; filters nest brackets themselves
+        depth, current = 0, ""
+        for char in plan[match.end() :]:
+            if char in "([":
+                depth += 1
+            elif char in ")]":
+                depth -= 1
+                if depth < 0:
+                    break
+            if char == "," and depth == 0:
+                pushed_filters.append(current.strip())
+                current = ""
+            else:
+                current += char
+        if current.strip():
+            pushed_filters.append(current.strip())
+
+    return pushed_filters
+
+
+def _skipped_row_groups(parquet_files: list, conditions: list) -> dict:
+    """
+    Evaluates a filter against the row group statistics of Parquet files with pyarrow.
+
+    args:
+    -----
+    - parquet_files : list
+        Local paths of the Parquet files.
+    - conditions : list
+        The declared conditions of the filter.
+
+    Returns:
+    --------
+    dict
+        The number of row groups, rows and compressed bytes in total and of the row groups whose
+        statistics show that no row passes the filter.
+    """
+    import pyarrow.dataset as ds
+
+    expression = reduce(
+        lambda a, b: a | b, [_arrow_condition(*condition) for condition in conditions]
+    )
+
+    measures = dict.fromkeys(
+        [
+            "row_groups",
+            "skipped_row_groups",
+            "rows",
+            "skipped_rows",
+            "bytes",
+            "skipped_bytes",
+        ],
+        0,
+    )
+    for fragment in ds.dataset(parquet_files, format="parquet").get_fragments():
+        kept = {row_group.id for row_group in fragment.subset(expression).row_groups}
+        for index in range(fragment.metadata.num_row_groups):
+            row_group = fragment.metadata.row_group(index)
+            size = sum(
+                row_group.column(i).total_compressed_size
+                for i in range(row_group.num_columns)
+            )
+            measures["row_groups"] += 1
+            measures["rows"] += row_group.num_rows
+            measures["bytes"] += size
+            if index not in kept:
+                measures["skipped_row_groups"] += 1
+                measures["skipped_rows"] += row_group.num_rows
+                measures["skipped_bytes"] += size
+
+    return measures
+
+
+def scan_filter_report(
+    tables: dict, report_path: Optional[str] = None, filters: Optional[dict] = None
+) -> list:
+    """
+    Reports the filters Spark pushes into the scan and the bytes each filter lets it skip.
+
+    The skipped bytes are the compressed size of the Parquet row groups whose statistics (min,
+    max and null count) show that no row passes the filter; they are measured with pyarrow from the
+    file footers only. For CSV inputs, and if pyarrow is not installed, they are reported as None.
+
+    args:
+    -----
+    - tables : dict
+        Mapping of SAP table name to DataFrame (e.g. `registry.as_dict()`).
+    - report_path : str, optional
+        If given, the results are written to this JSON file.
+    - filters : dict, optional
+        The filter declarations. Defaults to `SCAN_FILTERS`.
+
+    Returns:
+    --------
+    list
+        One result per table and filter with the input format, the pushed filters, and the
+        total and skipped row groups, rows and bytes.
+    """
+    filters = SCAN_FILTERS if filters is None else filters
+
+    try:
+        import pyarrow  # noqa: F401
+
+        has_pyarrow = True
+    except ImportError:
+        has_pyarrow = False
+        print(
+            "pyarrow is not installed: the bytes skipped by the scan filters are not measured."
+        )
+
+    results = []
+    for table, table_filters in filters.items():
+        if table not in tables:
+            continue
+
+        df = tables[table]
+        input_files = [_local_path(uri) for uri in df.inputFiles()]
+        formats = sorted(
+            {detect_file_format(path) or "unknown" for path in input_files}
+        )
+        parquet_files = [
+            path for path in input_files if detect_file_format(path) == "parquet"
+        ]
+
+        for name, conditions in table_filters.items():
+            result = {
+                "table": table,
+                "filter": name,
+                "formats": formats,
+                "pushed_filters": _pushed_filters(
+                    df.filter(scan_filter(table, name, filters))
+                ),
+            }
+            if has_pyarrow and parquet_files and formats == ["parquet"]:
+                result.update(_skipped_row_groups(parquet_files, conditions))
+            else:
+                result.update({"bytes": None, "skipped_bytes": None})
+            results.append(result)
+
+            print(
+                f"Scan filter {name} on {table}: pushed {result['pushed_filters']}, "
+                f"skips {result['skipped_bytes']} of {result['bytes']} bytes"
+            )
+
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w") as report_file:
+            json.dump(results, report_file, indent=2)
+
+    return results
@@ -0,0 +1,507 @@
+"""
+Data Quality Functions for the SAP Data Pipelines
+
+This module contains a small declarative data quality engine. Rules are plain dictionaries
+(see `LOCAL_MATERIAL_QUALITY_RULES` and `PROCESS_ORDER_QUALITY_RULES` in `ace.schemas`), and
+all rules of a DataFrame are evaluated in a single aggregation pass, so adding rules does not
+add Spark jobs.
+
+In the pipelines, `QualityObserver` attaches the rules of the inputs to the scans the pipeline
+runs anyway (an `Observation` of `Dataset.observe`), and the output rules are evaluated on the
+output kept in memory for the write, so the checks do not compute the pipeline a second time.
+Exact `duplicate_rate` rules need a distinct aggregation, which an observation cannot compute;
+on an observed frame they cost one extra aggregation pass.
+
+Supported checks:
+-----------------
+1. `null_rate`: Fraction of rows where `column` is null.
+2. `duplicate_rate`: Fraction of rows that are duplicates on `columns`. With `"approximate": True`
+   the distinct count is estimated with HyperLogLog (`approx_count_distinct`). In both cases a
+   null is a value of its own: rows with the same nulls in the same columns are duplicates.
+3. `out_of_range_rate`: Fraction of rows where `column` is below `min` or above `max`.
+4. `attrition_rate`: Fraction of the rows of the `reference` frame that did not reach this frame.
+
+Every check yields a "bad" fraction that is compared with the optional `warn` and `fail`
+thresholds of the rule: a metric above `fail` fails the rule, a metric above `warn` warns.
+
+Example usage:
+--------------
+>>> rules = {"MARC": [{"name": "matnr_null_rate", "check": "null_rate", "column": "MATNR", "fail": 0.0}]}
+>>> results = run_quality_checks({"MARC": marc_df}, rules, "/path/to/report.json")
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import json
+import os
+import uuid
+from typing import Optional
+
+# Pyspark libraries
+import pyspark.sql.functions as F
+from pyspark.sql import Column, DataFrame, Observation
+
+# Custom utils imports
+from ace.utils._use_case_utils import process_data
+
+SUPPORTED_CHECKS = {
+    "null_rate",
+    "duplicate_rate",
+    "out_of_range_rate",
+    "attrition_rate",
+}
+
+
+def _rule_aggregation(rule: dict) -> Optional[Column]:
+    """
+    Returns the aggregation expression that measures a rule, or None if the rule needs none.
+
+    args:
+    -----
+    - rule : dict
+        The quality rule.
+
+    Returns:
+    --------
+    Column
+        The aggregation expression aliased with the rule name.
+    """
+    check = rule["check"]
+
+    if check == "null_rate":
+        expression = F.sum(F.when(F.col(rule["column"]).isNull(), 1).otherwise(0))
+    elif check == "duplicate_rate":
+        # A struct of the key columns is never null, so both counts keep the rows with null keys
+        key = F.struct(*rule["columns"])
+        if rule.get("approximate", False):
+            # The sketch hash skips null fields; the null flags keep (null, x) and (x, null) apart
+            nulls = [F.isnull(c) for c in rule["columns"]]
+            expression = F.approx_count_distinct(
+                F.struct(key, *nulls), rule.get("rsd", 0.05)
+            )
+        else:
+            expression = F.countDistinct(key)
+    elif check == "out_of_range_rate":
+        value = F.col(rule["column"])
+        out_of_range = F.lit(False)
+        if rule.get("min") is not None:
+            out_of_range = out_of_range | (value < rule["min"])
+        if rule.get("max") is not None:
+            out_of_range = out_of_range | (value > rule["max"])
+        expression = F.sum(F.when(out_of_range, 1).otherwise(0))
+    else:
+        # The attrition rate only needs the row counts of both frames
+        return None
+
+    return expression.alias(rule["name"])
+
+
+def _is_observable(rule: dict) -> bool:
+    """
+    Tells whether a rule can be measured by an observation (no distinct aggregation).
+    """
+    return not (
+        rule["check"] == "duplicate_rate" and not rule.get("approximate", False)
+    )
+
+
+def _rule_status(rule: dict, metric: Optional[float]) -> str:
+    """
+    Compares a rule metric with the rule thresholds.
+
+    args:
+    -----
+    - rule : dict
+        The quality rule with the optional `warn` and `fail` thresholds.
+    - metric : float
+        The measured fraction of bad rows.
+
+    Returns:
+    --------
+    str
+        'fail', 'warn' or 'pass'.
+    """
+    if metric is None:
+        return "pass"
+    if rule.get("fail") is not None and metric > rule["fail"]:
+        return "fail"
+    if rule.get("warn") is not None and metric > rule["warn"]:
+        return "warn"
+    return "pass"
+
+
+def validate_quality_rules(rules: list) -> None:
+    """
+    Validates the structure of a list of quality rules.
+
+    args:
+    -----
+    - rules : list
+        The quality rules of one frame.
+
+    Raises:
+    -------
+    ValueError
+        If a rule has no name, an unsupported check or misses a required field.
+    """
+    required_fields = {
+        "null_rate": ["column"],
+        "duplicate_rate": ["columns"],
+        "out_of_range_rate": ["column"],
+        "attrition_rate": ["reference"],
+    }
+    names = set()
+    for rule in rules:
+        if "name" not in rule or rule["name"] in names:
+            raise ValueError(f"Every quality rule needs a unique name. Got {rule}.")
+        names.add(rule["name"])
+
+        if rule.get("check") not in SUPPORTED_CHECKS:
+            raise ValueError(
+                f"Unsupported quality check '{rule.get('check')}'. Supported checks are: {', '.join(sorted(SUPPORTED_CHECKS))}."
+            )
+
+        missing_fields = [f for f in required_fields[rule["check"]] if f not in rule]
+        if missing_fields:
+            raise ValueError(
+                f"Quality rule '{rule['name']}' is missing the fields {missing_fields}."
+            )
+
+
+def compute_quality_metrics(df: DataFrame, rules: list) -> dict:
+    """
+    Measures all rules of one frame in a single aggregation pass.
+
+    args:
+    -----
+    - df : DataFrame
+        The frame to be checked.
+    - rules : list
+        The quality rules of the frame.
+
+    Returns:
+    --------
+    dict
+        The row count of the frame (`__rows`) and the raw aggregation of every rule by rule name.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df)
+    validate_quality_rules(rules)
+
+    aggregations = [F.count(F.lit(1)).alias("__rows")]
+    aggregations += [
+        aggregation
+        for aggregation in map(_rule_aggregation, rules)
+        if aggregation is not None
+    ]
+
+    return df.agg(*aggregations).first().asDict()
+
+
+def _measure_frames(frames: dict, rules: dict, measures: dict = None) -> dict:
+    """
+    Measures the frames the rules need, one aggregation pass per frame that is not measured yet.
+
+    args:
+    -----
+    - frames : dict
+        Mapping of frame name to DataFrame.
+    - rules : dict
+        Mapping of frame name to its list of quality rules.
+    - measures : dict, optional
+        Measures that are already known by frame name (e.g. read from observations).
+
+    Returns:
+    --------
+    dict
+        The row count (`__rows`) and the raw aggregation of every rule, by frame name.
+
+    Raises:
+    -------
+    ValueError
+        If a frame the rules need is missing.
+    """
+    measures = dict(measures or {})
+
+    # Frames that are referenced by an attrition rule need at least their row count
+    needed_frames = set(rules)
+    for frame_rules in rules.values():
+        needed_frames.update(
+            rule["reference"]
+            for rule in frame_rules
+            if rule.get("check") == "attrition_rate"
+        )
+    missing_frames = needed_frames - set(frames) - set(measures)
+    if missing_frames:
+        raise ValueError(f"Quality rules reference missing frames {missing_frames}.")
+
+    # One aggregation pass per frame
+    for name in sorted(needed_frames - set(measures)):
+        measures[name] = compute_quality_metrics(frames[name], rules.get(name, []))
+
+    return measures
+
+
+def _evaluate_rules(
+    rules: dict,
+    measures: dict,
+    report_path: Optional[str],
+    raise_on_fail: bool,
+) -> list:
+    """
+    Turns the measures into rule results, writes the report and applies the thresholds.
+
+    See `run_quality_checks` for the arguments and the results.
+    """
+    results = []
+    for frame_name, frame_rules in rules.items():
+        rows = measures[frame_name]["__rows"]
+        for rule in frame_rules:
+            raw = measures[frame_name].get(rule["name"])
+
+            # A frame no action evaluated has no measures (see `QualityObserver.executed`)
+            measured = rows is not None
+            if rule["check"] == "duplicate_rate":
+                metric = 1 - raw / rows if rows else None
+            elif rule["check"] == "attrition_rate":
+                reference_rows = measures[rule["reference"]]["__rows"]
+                measured = measured and reference_rows is not None
+                metric = (
+                    1 - rows / reference_rows if measured and reference_rows else None
+                )
+            else:
+                metric = raw / rows if rows else None
+
+            results.append(
+                {
+                    "frame": frame_name,
+                    "rule": rule["name"],
+                    "check": rule["check"],
+                    "rows": rows,
+                    "metric": metric,
+                    "warn": rule.get("warn"),
+                    "fail": rule.get("fail"),
+                    "status": (
+                        _rule_status(rule, metric) if measured else "not measured"
+                    ),
+                }
+            )
+
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w") as report_file:
+            json.dump(results, report_file, indent=2)
+
+    for result in results:
+        if result["status"] != "pass":
+            print(
+                f"Quality rule {result['rule']} on {result['frame']}: {result['status']} "
+                f"(metric={result['metric']}, warn={result['warn']}, fail={result['fail']})"
+            )
+
+    failed = [result["rule"] for result in results if result["status"] == "fail"]
+    if raise_on_fail and failed:
+        raise ValueError(f"Data quality checks failed: {failed}")
+
+    return results
+
+
+def run_quality_checks(
+    frames: dict,
+    rules: dict,
+    report_path: Optional[str] = None,
+    raise_on_fail: bool = True,
+) -> list:
+    """
+    Evaluates the quality rules of several frames, writes a report and applies the thresholds.
+
+    Each frame is scanned exactly once, whatever the number of rules. Frames that are only
+    referenced by an `attrition_rate` rule are scanned once for their row count.
+
+    args:
+    -----
+    - frames : dict
+        Mapping of frame name (e.g. 'MARC' or 'output') to DataFrame.
+    - rules : dict
+        Mapping of frame name to its list of quality rules.
+    - report_path : str, optional
+        If given, the results are written to this JSON file.
+    - raise_on_fail : bool, optional (default=True)
+        If True, a ValueError is raised when any rule fails (after the report is written).
+
+    Returns:
+    --------
+    list
+        One result per rule with the frame, rule name, check, metric, thresholds and status.
+
+    Raises:
+    -------
+    ValueError
+        If `raise_on_fail` is True and at least one rule fails, or a frame is missing.
+    """
+    # Check input parameter
+    process_data(boolean_check=raise_on_fail)
+
+    return _evaluate_rules(
+        rules, _measure_frames(frames, rules), report_path, raise_on_fail
+    )
+
+
+class QualityObserver:
+    """
+    Measures the quality rules of the pipeline inputs while the pipeline scans them.
+
+    `observe` attaches the observable rules of a frame (and its row count) to the frame as an
+    `Observation`; Spark fills it during the first action that evaluates the frame, e.g. the
+    materialisation of the kept output. The pipeline passes the frames its actions ran on to
+    `executed`, and `run` then reads the observations of those frames instead of scanning the
+    inputs again. The rules of an observed frame no action evaluated (e.g. a join side adaptive
+    execution pruned) are reported as 'not measured' instead of waiting for its observation.
+
+    Observing a raw input puts a barrier between its scan and the filters of the prep steps, so
+    these filters are no longer pushed into columnar scans and cannot skip row groups (see
+    `scan_filter_report`).
+
+    args:
+    -----
+    - rules : dict
+        Mapping of frame name to its list of quality rules.
+    - enabled : bool, optional (default=True)
+        If False, `observe` returns the DataFrames unchanged, so the pipelines can use the
+        observer unconditionally.
+    """
+
+    def __init__(self, rules: dict, enabled: bool = True):
+        # Check input parameters
+        process_data(boolean_check=enabled)
+        for frame_rules in rules.values():
+            validate_quality_rules(frame_rules)
+
+        self.rules = rules
+        self.enabled = enabled
+        self._observations = {}
+        self._executed = set()
+
+    def observe(self, df: DataFrame, name: str) -> DataFrame:
+        """
+        Measures the rules of a frame when it is first evaluated.
+
+        args:
+        -----
+        - df : DataFrame
+            The frame, usually a raw input table.
+        - name : str
+            The frame name the rules are keyed by (e.g. 'MARC').
+
+        Returns:
+        --------
+        DataFrame
+            The observed DataFrame, to be used in place of `df`. The frame must be evaluated by
+            an action before `run`.
+        """
+        # Frames without rules are only observed if an attrition rule references them
+        referenced = any(
+            rule.get("reference") == name
+            for frame_rules in self.rules.values()
+            for rule in frame_rules
+        )
+        if not self.enabled or (name not in self.rules and not referenced):
+            return df
+
+        # Check input parameters
+        process_data(dataframe_check=df, string_check=name)
+
+        frame_rules = self.rules.get(name, [])
+        aggregations = [F.count(F.lit(1)).alias("__rows")]
+        aggregations += [
+            aggregation
+            for rule in frame_rules
+            if _is_observable(rule)
+            for aggregation in [_rule_aggregation(rule)]
+            if aggregation is not None
+        ]
+
+        # A unique name finds the observation in the plans of the executed frames
+        observation_name = f"quality_{uuid.uuid4().hex}"
+        observation = Observation(observation_name)
+        self._observations[name] = (observation_name, observation, df)
+        return df.observe(observation, *aggregations)
+
+    def executed(self, df: DataFrame) -> None:
+        """
+        Marks the observed frames in the plan of a DataFrame an action has run on as evaluated.
+
+        args:
+        -----
+        - df : DataFrame
+            A DataFrame whose action has finished, e.g. the materialised output.
+        """
+        if not self.enabled or not self._observations:
+            return
+
+        plan = df._jdf.queryExecution().analyzed().toString()
+        self._executed.update(
+            observation_name
+            for observation_name, _, _ in self._observations.values()
+            if observation_name in plan
+        )
+
+    def run(
+        self,
+        frames: dict = None,
+        report_path: Optional[str] = None,
+        raise_on_fail: bool = True,
+    ) -> list:
+        """
+        Evaluates the rules from the observations and the given frames (see `run_quality_checks`).
+
+        Exact `duplicate_rate` rules of an observed frame are measured with one aggregation pass
+        over the frame, as observations cannot compute distinct counts. Only the observations of
+        executed frames are read (see `executed`); the rules of the other observed frames are
+        'not measured'.
+
+        args:
+        -----
+        - frames : dict, optional
+            Frames that were not observed, e.g. the output kept in memory for the write.
+        - report_path : str, optional
+            If given, the results are written to this JSON file.
+        - raise_on_fail : bool, optional (default=True)
+            If True, a ValueError is raised when any rule fails (after the report is written).
+
+        Returns:
+        --------
+        list
+            One result per rule (see `run_quality_checks`); empty if the observer is disabled.
+        """
+        # Check input parameter
+        process_data(boolean_check=raise_on_fail)
+        if not self.enabled:
+            return []
+
+        measures = {}
+        for name, (observation_name, observation, df) in self._observations.items():
+            # Reading an observation blocks until an action evaluates its frame
+            if observation_name not in self._executed:
+                measures[name] = {"__rows": None}
+                continue
+            measures[name] = dict(observation.get)
+
+            # Distinct counts cannot be observed; measure them on the frame itself
+            exact_rules = [
+                rule for rule in self.rules.get(name, []) if not _is_observable(rule)
+            ]
+            if exact_rules:
+                measures[name].update(compute_quality_metrics(df, exact_rules))
+
+        return _evaluate_rules(
+            self.rules,
+            _measure_frames(frames or {}, self.rules, measures),
+            report_path,
+            raise_on_fail,
+        )
@@ -0,0 +1,248 @@
+"""
+Table Registry for the SAP Data Pipelines
+
+The pipelines used to publish their input tables as module globals (`globals()["MARA"] = df`),
+so two pipelines (or two systems) running in the same Python process overwrote each other's
+inputs. A `TableRegistry` holds the input tables of one pipeline run and is passed through the
+pipeline explicitly, which makes concurrent runs in one process safe.
+
+Tables are loaded on demand: a table read from a directory is only scanned when a pipeline stage
+first asks for it, and a pipeline only registers the tables it declares (see
+`LOCAL_MATERIAL_TABLES` and `PROCESS_ORDER_TABLES`), so unused extracts cost nothing.
+
+Example usage:
+--------------
+>>> registry = TableRegistry.from_directory("/path/to/system_2", tables=["AFKO", "MARA"])
+>>> registry.names()
+['AFKO', 'MARA']
+>>> registry["MARA"].count()  # PRD_MARA is read here, on first access
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import os
+import threading
+from functools import partial
+from typing import Callable, Optional
+
+# Pyspark libraries
+from pyspark.sql import DataFrame
+
+# Custom utils imports
+from ace.utils._use_case_utils import (
+    discover_table_files,
+    process_data,
+    read_multiple_data,
+    read_table,
+)
+
+
+class TableRegistry:
+    """
+    Holds the input tables of one pipeline run, keyed by SAP table name (e.g. 'MARA').
+
+    A table is either registered as a DataFrame or as a loader, a function without arguments
+    that returns the DataFrame. A loader runs on the first access to its table only.
+
+    args:
+    -----
+    - tables : dict, optional
+        Initial mapping of table name to DataFrame.
+    - loaders : dict, optional
+        Initial mapping of table name to loader.
+    """
+
+    def __init__(self, tables: Optional[dict] = None, loaders: Optional[dict] = None):
+        self._tables = {}
+        self._loaders = {}
+        self._cached_frames = []
+        self._lock = threading.Lock()
+        for name, df in (tables or {}).items():
+            self.register(name, df)
+        for name, loader in (loaders or {}).items():
+            self.register_loader(name, loader)
+
+    @staticmethod
+    def table_name(file_base_name: str) -> str:
+        """
+        Derives the SAP table name from the base name of an extract (e.g. 'PRE_MARA' -> 'MARA').
+
+        args:
+        -----
+        - file_base_name : str
+            The file name without extension.
+
+        Returns:
+        --------
+        str
+            The SAP table name.
+        """
+        return file_base_name.split("_")[-1]
+
+    @classmethod
+    def from_directory(
+        cls,
+        data_dir: str,
+        encode_identifiers: bool = False,
+        table_globs: Optional[dict] = None,
+        tables: Optional[list] = None,
+        bad_records_path: Optional[str] = None,
+    ) -> "TableRegistry":
+        """
+        Registers the extracts of a directory, to be read on first access.
+
+        args:
+        -----
+        - data_dir : str
+            Directory containing the extracts (e.g. PRE_MARA.csv, PRE_MARC.csv).
+        - encode_identifiers : bool, optional (default=False)
+            Passed to `read_multiple_data`. The identifiers are encoded consistently across all
+            tables, so with encoding the requested tables are read and profiled together, right
+            away, and not on first access.
+        - table_globs : dict, optional
+            Glob patterns of tables, passed to `discover_table_files`.
+        - tables : list, optional
+            SAP table names the pipeline needs. Extracts of other tables are not registered.
+            Defaults to all extracts of the directory.
+        - bad_records_path : str, optional
+            If given, malformed CSV rows are written to `<bad_records_path>/<extract>` and
+            dropped (see `read_table`). The frames persisted for this are released by
+            `release`.
+
+        Returns:
+        --------
+        TableRegistry
+            The registry with one table per (requested) extract.
+
+        Raises:
+        -------
+        FileNotFoundError
+            If a requested table has no extract in the directory.
+        """
+        registry = cls()
+        if encode_identifiers:
+            for base_name, df in read_multiple_data(
+                data_dir,
+                encode_identifiers,
+                table_globs,
+                tables,
+                bad_records_path,
+                registry._cached_frames,
+            ).items():
+                registry.register(cls.table_name(base_name), df)
+        else:
+            for base_name, file_paths in discover_table_files(
+                data_dir, table_globs
+            ).items():
+                if tables is not None and cls.table_name(base_name) not in tables:
+                    continue
+                registry.register_loader(
+                    cls.table_name(base_name),
+                    partial(
+                        read_table,
+                        file_paths,
+                        (
+                            os.path.join(bad_records_path, base_name)
+                            if bad_records_path
+                            else None
+                        ),
+                        registry._cached_frames,
+                    ),
+                )
+
+        missing_tables = set(tables or []) - set(registry.names())
+        if missing_tables:
+            raise FileNotFoundError(
+                f"The input tables {sorted(missing_tables)} are missing in '{data_dir}'."
+            )
+
+        return registry
+
+    def register(self, name: str, df: DataFrame) -> None:
+        """
+        Adds or replaces a table.
+
+        args:
+        -----
+        - name : str
+            The SAP table name.
+        - df : DataFrame
+            The table.
+        """
+        # Check input parameters
+        process_data(string_check=name, dataframe_check=df)
+
+        with self._lock:
+            self._loaders.pop(name, None)
+            self._tables[name] = df
+
+    def register_loader(self, name: str, loader: Callable[[], DataFrame]) -> None:
+        """
+        Adds or replaces a table that is loaded on its first access.
+
+        args:
+        -----
+        - name : str
+            The SAP table name.
+        - loader : callable
+            A function without arguments that returns the table.
+        """
+        # Check input parameters
+        process_data(string_check=name)
+
+        with self._lock:
+            self._tables.pop(name, None)
+            self._loaders[name] = loader
+
+    def names(self) -> list:
+        """
+        Returns the sorted names of the registered tables, loaded or not.
+        """
+        return sorted(set(self._tables) | set(self._loaders))
+
+    def loaded_names(self) -> list:
+        """
+        Returns the sorted names of the tables that have been loaded.
+        """
+        return sorted(self._tables)
+
+    def as_dict(self) -> dict:
+        """
+        Returns the mapping of table name to DataFrame, loading every table that is not loaded yet.
+        """
+        return {name: self[name] for name in self.names()}
+
+    def release(self) -> None:
+        """
+        Unpersists the frames cached while loading the tables (see `read_table`).
+
+        The tables stay usable; a table used again is read from its files.
+        """
+        with self._lock:
+            for df in self._cached_frames:
+                df.unpersist()
+            self._cached_frames.clear()
+
+    def __getitem__(self, name: str) -> DataFrame:
+        with self._lock:
+            if name in self._loaders:
+                self._tables[name] = self._loaders.pop(name)()
+            if name not in self._tables:
+                raise KeyError(
+                    f"Table '{name}' is not registered. Available tables: {self.names()}."
+                )
+            return self._tables[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tables or name in self._loaders
+
+    def __len__(self) -> int:
+        return len(self.names())
+
+    def __repr__(self) -> str:
+        return f"TableRegistry({self.names()})"
@@ -0,0 +1,166 @@
+"""
+Deterministic Development Samples of the SAP Extracts
+
+Iterating on business rules against production-size extracts is slow. A sampled run keeps a fixed
+fraction of the driving keys of a pipeline (`MATNR` for local material, `AUFNR` for process
+orders), selected by the xxHash64 of the key rather than at random: every table with the key keeps
+exactly the same keys without any join, and repeated runs on the same extracts return the same
+sample. Related tables without the key (MARA for the process orders) keep the rows matching the
+sampled rows of another table, and the small reference tables are read in full, so the joins of a
+sampled run stay referentially consistent.
+
+The key is hashed in its readable (hex) form, so a run with `encode_identifiers` samples the same
+keys as one without.
+
+Example usage:
+--------------
+>>> registry = TableRegistry.from_directory("/path/to/system_2", tables=PROCESS_ORDER_TABLES)
+>>> sampled = sample_registry(registry, "AUFNR", 0.01, {"MARA": ("AFPO", ["MATNR"])})
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+from functools import partial
+from typing import Optional
+
+# Pyspark libraries
+import pyspark.sql.functions as F
+from pyspark.sql import DataFrame
+
+# Custom utils imports
+from ace.schemas import SAMPLE_SEED
+from ace.utils._registry_utils import TableRegistry
+from ace.utils._use_case_utils import (
+    decode_identifier_column,
+    process_data,
+    reduce_by_driving_keys,
+)
+
+# Resolution of the sample fraction: keys are spread over this many hash buckets
+SAMPLE_BUCKETS = 1_000_000
+
+
+def sample_by_key(
+    df: DataFrame, key: str, fraction: float, seed: int = SAMPLE_SEED
+) -> DataFrame:
+    """
+    Keeps the rows of a fraction of the keys, selected by the hash of the key.
+
+    args:
+    -----
+    - df : DataFrame
+        The table to sample.
+    - key : str
+        The key column (e.g. 'MATNR').
+    - fraction : float
+        Fraction of the keys to keep, in (0, 1].
+    - seed : int, optional
+        Selects a different sample of the same size. Defaults to `SAMPLE_SEED`.
+
+    Returns:
+    --------
+    DataFrame
+        All rows of the selected keys. Rows with a null key are dropped.
+
+    Raises:
+    -------
+    ValueError
+        If the fraction is not in (0, 1].
+    """
+    # Check input parameters
+    process_data(dataframe_check=df, string_check=key)
+    if not 0 < fraction <= 1:
+        raise ValueError("The sample fraction must be in (0, 1].")
+
+    bucket = F.pmod(
+        F.xxhash64(decode_identifier_column(df, key), F.lit(seed)),
+        F.lit(SAMPLE_BUCKETS),
+    )
+    return df.filter(F.col(key).isNotNull() & (bucket < int(fraction * SAMPLE_BUCKETS)))
+
+
+def _sampled_table(
+    registry: TableRegistry,
+    name: str,
+    key: str,
+    fraction: float,
+    related_tables: dict,
+    seed: int,
+) -> DataFrame:
+    """
+    Loads the sample of a table of the registry (see `sample_registry`).
+    """
+    df = registry[name]
+    if name in related_tables:
+        sampled_name, keys = related_tables[name]
+        return reduce_by_driving_keys(
+            df, sample_by_key(registry[sampled_name], key, fraction, seed), keys
+        )
+    if key in df.columns:
+        return sample_by_key(df, key, fraction, seed)
+
+    return df
+
+
+def sample_registry(
+    registry: TableRegistry,
+    key: str,
+    fraction: float,
+    related_tables: Optional[dict] = None,
+    seed: int = SAMPLE_SEED,
+) -> TableRegistry:
+    """
+    Returns a registry with a consistent sample of the tables of another registry.
+
+    Tables with the key column are sampled by the hash of the key (see `sample_by_key`); a related
+    table keeps the rows whose join keys occur in the sample of another table; all other tables
+    are kept in full. The samples are loaded lazily, like the tables of the source registry.
+
+    args:
+    -----
+    - registry : TableRegistry
+        The registry with the full tables.
+    - key : str
+        The driving key of the pipeline (see `SAMPLE_KEY_COLUMNS`).
+    - fraction : float
+        Fraction of the keys to keep, in (0, 1].
+    - related_tables : dict, optional
+        Tables without the key, mapped to the sampled table and the join keys they are reduced
+        by, e.g. `{"MARA": ("AFPO", ["MATNR"])}` (see `SAMPLE_RELATED_TABLES`).
+    - seed : int, optional
+        Selects a different sample of the same size. Defaults to `SAMPLE_SEED`.
+
+    Returns:
+    --------
+    TableRegistry
+        A new registry with the sampled tables under the same names.
+
+    Raises:
+    -------
+    ValueError
+        If the fraction is not in (0, 1].
+    """
+    # Check input parameters
+    process_data(string_check=key)
+    if not 0 < fraction <= 1:
+        raise ValueError("The sample fraction must be in (0, 1].")
+
+    return TableRegistry(
+        loaders={
+            name: partial(
+                _sampled_table,
+                registry,
+                name,
+                key,
+                fraction,
+                related_tables or {},
+                seed,
+            )
+            for name in registry.names()
+        }
+    )
@@ -0,0 +1,555 @@
+"""
+Table Statistics Functions for the SAP Data Pipelines
+
+Spark has no statistics for the CSV extracts, so join strategies and shuffle partitioning
+are guesswork. This module profiles the input tables once, keeps the results in a small
+JSON statistics store and reuses them as long as the input files are unchanged. The
+statistics are then used to pick broadcast joins and the number of shuffle partitions.
+
+Functions in this module include:
+---------------------------------------------------------------
+1. `table_fingerprint`:
+   Identifies the input files of a table by path, size and modification time.
+
+2. `profile_table`:
+   Computes the row count, size, approximate distinct keys and null ratios of a table in one pass.
+
+3. `profile_tables`:
+   Profiles several tables, reusing the statistics store entries of unchanged tables.
+
+4. `broadcast_if_small`:
+   Marks a join side for broadcasting when its statistics show it is small.
+
+5. `suggest_shuffle_partitions` / `shuffle_join_sides`:
+   Derive the number of shuffle partitions from the input sizes and apply it to one join.
+
+6. `estimate_join_fanout` / `check_join_fanout` / `check_join_fanouts`:
+   Estimate the output cardinality of a join (or a chain of joins) from the key frequencies of
+   both sides and warn or abort before a join multiplies the row count.
+
+Example usage:
+--------------
+>>> stats = profile_tables(tables, "/path/to/stats.json")
+>>> integrated = integrate_data(..., table_stats=stats)
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import json
+import math
+import os
+from typing import Optional
+from urllib.parse import unquote, urlparse
+
+# Pyspark libraries
+import pyspark.sql.functions as F
+from pyspark.sql import DataFrame, SparkSession
+
+# Custom utils imports
+from ace.schemas import (
+    BROADCAST_THRESHOLD_BYTES,
+    TABLE_KEY_COLUMNS,
+    TARGET_SHUFFLE_PARTITION_BYTES,
+)
+from ace.utils._use_case_utils import decode_identifier_column, process_data
+
+
+def _local_path(uri: str) -> str:
+    """
+    Converts a file URI returned by Spark into a local path.
+
+    args:
+    -----
+    - uri : str
+        The file URI (e.g. 'file:///data/PRE_MARA.csv').
+
+    Returns:
+    --------
+    str
+        The local file path.
+    """
+    parsed = urlparse(uri)
+    return unquote(parsed.path) if parsed.scheme in ("", "file") else uri
+
+
+def table_fingerprint(df: DataFrame) -> list:
+    """
+    Identifies the input files of a file based DataFrame.
+
+    args:
+    -----
+    - df : DataFrame
+        A DataFrame read from files.
+
+    Returns:
+    --------
+    list
+        Sorted list of `[path, size, modification time]` per input file. Size and modification
+        time are None for files that are not on the local file system.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df)
+
+    fingerprint = []
+    for uri in sorted(df.inputFiles()):
+        path = _local_path(uri)
+        if os.path.exists(path):
+            status = os.stat(path)
+            fingerprint.append([path, status.st_size, status.st_mtime])
+        else:
+            fingerprint.append([path, None, None])
+
+    return fingerprint
+
+
+def profile_table(df: DataFrame, key_columns: Optional[list] = None) -> dict:
+    """
+    Profiles a table in a single aggregation pass.
+
+    args:
+    -----
+    - df : DataFrame
+        The table to be profiled.
+    - key_columns : list, optional
+        Columns whose approximate distinct count is recorded. Defaults to `TABLE_KEY_COLUMNS`.
+
+    Returns:
+    --------
+    dict
+        The statistics of the table:
+        - `row_count`: Number of rows.
+        - `size_bytes`: Size of the input files on disk (None if unknown).
+        - `distinct_keys`: Approximate distinct count per key column present in the table.
+        - `null_ratios`: Fraction of null values per column.
+        - `fingerprint`: The input files the statistics were computed from.
+    """
+    # Check input parameter
+    process_data(dataframe_check=df)
+
+    if key_columns is None:
+        key_columns = TABLE_KEY_COLUMNS
+    key_columns = [c for c in key_columns if c in df.columns]
+
+    aggregations = [F.count(F.lit(1)).alias("__rows")]
+    aggregations += [
+        F.approx_count_distinct(F.col(c)).alias(f"__distinct_{i}")
+        for i, c in enumerate(key_columns)
+    ]
+    aggregations += [
+        F.count(F.col(f"`{c}`")).alias(f"__non_null_{i}")
+        for i, c in enumerate(df.columns)
+    ]
+    row = df.agg(*aggregations).first()
+
+    rows = row["__rows"]
+    fingerprint = table_fingerprint(df)
+    sizes = [size for _, size, _ in fingerprint]
+
+    return {
+        "row_count": rows,
+        "size_bytes": sum(sizes) if sizes and None not in sizes else None,
+        "distinct_keys": {c: row[f"__distinct_{i}"] for i, c in enumerate(key_columns)},
+        "null_ratios": {
+            c: (1 - row[f"__non_null_{i}"] / rows) if rows else 0.0
+            for i, c in enumerate(df.columns)
+        },
+        "fingerprint": fingerprint,
+    }
+
+
+def profile_tables(
+    tables: dict,
+    stats_path: Optional[str] = None,
+    key_columns: Optional[list] = None,
+) -> dict:
+    """
+    Profiles several tables and keeps the results in a JSON statistics store.
+
+    Tables whose input files are unchanged since they were last profiled are not scanned
+    again; their statistics are taken from the store.
+
+    args:
+    -----
+    - tables : dict
+        Mapping of table name (e.g. 'MARA') to DataFrame.
+    - stats_path : str, optional
+        Path of the JSON statistics store. If not given, nothing is stored or reused.
+    - key_columns : list, optional
+        Columns whose approximate distinct count is recorded. Defaults to `TABLE_KEY_COLUMNS`.
+
+    Returns:
+    --------
+    dict
+        Mapping of table name to its statistics (see `profile_table`).
+    """
+    store = {}
+    if stats_path and os.path.exists(stats_path):
+        with open(stats_path) as stats_file:
+            store = json.load(stats_file)
+
+    stats = {}
+    for name, df in tables.items():
+        cached = store.get(name)
+        if cached is not None and cached["fingerprint"] == table_fingerprint(df):
+            stats[name] = cached
+        else:
+            stats[name] = profile_table(df, key_columns)
+
+    if stats_path:
+        store.update(stats)
+        os.makedirs(os.path.dirname(os.path.abspath(stats_path)), exist_ok=True)
+        with open(stats_path, "w") as stats_file:
+            json.dump(store, stats_file, indent=2)
+
+    return stats
+
+
+def broadcast_if_small(
+    df: DataFrame,
+    table_stats: Optional[dict],
+    table_name: str,
+    threshold_bytes: int = BROADCAST_THRESHOLD_BYTES,
+) -> DataFrame:
+    """
+    Marks a join side for broadcasting when its statistics show that it is small.
+
+    args:
+    -----
+    - df : DataFrame
+        The (prepared) join side.
+    - table_stats : dict, optional
+        Table statistics as returned by `profile_tables`. Without statistics, the DataFrame is
+        returned unchanged and Spark decides on its own.
+    - table_name : str
+        The table name the join side was prepared from (e.g. 'T001W').
+    - threshold_bytes : int, optional
+        Maximum input size to broadcast. Defaults to `BROADCAST_THRESHOLD_BYTES`.
+
+    Returns:
+    --------
+    DataFrame
+        The DataFrame, with a broadcast hint if it is small.
+    """
+    stats = (table_stats or {}).get(table_name)
+    if stats is None or stats.get("size_bytes") is None:
+        return df
+
+    return F.broadcast(df) if stats["size_bytes"] <= threshold_bytes else df
+
+
+def suggest_shuffle_partitions(
+    table_stats: dict,
+    target_partition_bytes: int = TARGET_SHUFFLE_PARTITION_BYTES,
+    max_partitions: int = 2000,
+) -> int:
+    """
+    Suggests the number of shuffle partitions for the given input tables.
+
+    args:
+    -----
+    - table_stats : dict
+        Table statistics as returned by `profile_tables`.
+    - target_partition_bytes : int, optional
+        Target amount of input data per partition. Defaults to `TARGET_SHUFFLE_PARTITION_BYTES`.
+    - max_partitions : int, optional
+        Upper bound of the suggestion. Defaults to 2000.
+
+    Returns:
+    --------
+    int
+        The suggested number of shuffle partitions (at least 1).
+    """
+    total_bytes = sum(stats.get("size_bytes") or 0 for stats in table_stats.values())
+    partitions = math.ceil(total_bytes / target_partition_bytes)
+
+    return max(1, min(partitions, max_partitions))
+
+
+def shuffle_join_sides(
+    left: DataFrame, right: DataFrame, keys: list, partitions: Optional[int]
+) -> tuple:
+    """
+    Hash partitions both sides of a shuffled join by the join keys into `partitions` partitions.
+
+    `spark.sql.shuffle.partitions` is a setting of the whole Spark session, which concurrent
+    pipeline runs share; repartitioning the join sides applies the number to this join only.
+
+    args:
+    -----
+    - left : DataFrame
+        The left side of the join.
+    - right : DataFrame
+        The right side of the join.
+    - keys : list
+        The join columns.
+    - partitions : int, optional
+        The number of partitions (see `suggest_shuffle_partitions`). If not given, both sides
+        are returned unchanged.
+
+    Returns:
+    --------
+    tuple
+        The left and the right side of the join.
+    """
+    if partitions is None:
+        return left, right
+
+    return left.repartition(partitions, *keys), right.repartition(partitions, *keys)
+
+
+def estimate_join_fanout(
+    left: DataFrame,
+    right: DataFrame,
+    keys: list,
+    sample_fraction: Optional[float] = None,
+    top_n: int = 10,
+    left_weight: Optional[str] = None,
+) -> dict:
+    """
+    Estimates the output cardinality of a left join from the key frequencies of both sides.
+
+    Both sides are reduced to one row per key with its frequency, so only the (much smaller)
+    frequency tables are joined. The output cardinality of the left join is the sum over all
+    keys of `left rows * max(1, right rows)`.
+
+    args:
+    -----
+    - left : DataFrame
+        The left (driving) side of the join.
+    - right : DataFrame
+        The right side of the join.
+    - keys : list
+        The join columns.
+    - sample_fraction : float, optional
+        If given, both sides are sampled with this fraction and the frequencies are scaled up.
+        Faster on large tables, at the cost of an approximate estimate.
+    - top_n : int, optional
+        Number of offending keys to report. Defaults to 10.
+    - left_weight : str, optional
+        If given, `left` is a frequency table and this column holds the number of rows each of
+        its rows stands for (see `check_join_fanouts`).
+
+    Returns:
+    --------
+    dict
+        - `left_rows`: (Estimated) number of rows of the left side.
+        - `output_rows`: Estimated number of rows of the join output.
+        - `fanout`: `output_rows / left_rows` (1.0 means the join does not add rows).
+        - `offending_keys`: Up to `top_n` keys with duplicates on the right side, ordered by the
+          number of output rows they produce, with their left, right and output row counts.
+    """
+    # Check input parameter
+    process_data(dataframe_check=left)
+    process_data(dataframe_check=right)
+
+    if sample_fraction is not None:
+        if not 0 < sample_fraction <= 1:
+            raise ValueError("The sample fraction must be in (0, 1].")
+        left = left.sample(fraction=sample_fraction, seed=42)
+        right = right.sample(fraction=sample_fraction, seed=42)
+    scale = 1 / sample_fraction if sample_fraction else 1
+
+    left_frequency = F.sum(left_weight) if left_weight else F.count(F.lit(1))
+    left_counts = left.groupBy(*keys).agg((left_frequency * scale).alias("left_rows"))
+    right_counts = right.groupBy(*keys).agg(
+        (F.count(F.lit(1)) * scale).alias("right_rows")
+    )
+    key_counts = (
+        left_counts.join(right_counts, keys, "left")
+        .withColumn(
+            "output_rows",
+            F.col("left_rows")
+            * F.greatest(F.coalesce("right_rows", F.lit(1)), F.lit(1)),
+        )
+        .cache()
+    )
+
+    totals = key_counts.agg(
+        F.sum("left_rows").alias("left_rows"),
+        F.sum("output_rows").alias("output_rows"),
+    ).first()
+    left_rows = totals["left_rows"] or 0
+    output_rows = totals["output_rows"] or 0
+
+    offending_keys = [
+        row.asDict()
+        for row in key_counts.filter(F.col("right_rows") > 1)
+        .orderBy(F.col("output_rows").desc())
+        .limit(top_n)
+        .select(
+            *[decode_identifier_column(key_counts, key).alias(key) for key in keys],
+            "left_rows",
+            "right_rows",
+            "output_rows",
+        )
+        .collect()
+    ]
+    key_counts.unpersist()
+
+    return {
+        "left_rows": left_rows,
+        "output_rows": output_rows,
+        "fanout": output_rows / left_rows if left_rows else 1.0,
+        "offending_keys": offending_keys,
+    }
+
+
+def check_join_fanout(
+    left: DataFrame,
+    right: DataFrame,
+    keys: list,
+    join_name: str,
+    max_fanout: Optional[float] = None,
+    sample_fraction: Optional[float] = None,
+    left_weight: Optional[str] = None,
+) -> dict:
+    """
+    Estimates the fan-out of a left join and warns or aborts before the join is run.
+
+    A fan-out above 1 means that duplicate keys on the right side add rows; it is reported
+    together with the offending keys. A fan-out above `max_fanout` aborts the pipeline.
+
+    args:
+    -----
+    - left : DataFrame
+        The left (driving) side of the join.
+    - right : DataFrame
+        The right side of the join.
+    - keys : list
+        The join columns.
+    - join_name : str
+        Name of the join used in the messages (e.g. 'MARC-MARA').
+    - max_fanout : float, optional
+        The highest accepted fan-out. If not given, the fan-out is only reported.
+    - sample_fraction : float, optional
+        Passed to `estimate_join_fanout`.
+    - left_weight : str, optional
+        Passed to `estimate_join_fanout`.
+
+    Returns:
+    --------
+    dict
+        The estimate as returned by `estimate_join_fanout`.
+
+    Raises:
+    -------
+    ValueError
+        If the estimated fan-out exceeds `max_fanout`.
+    """
+    estimate = estimate_join_fanout(
+        left, right, keys, sample_fraction, left_weight=left_weight
+    )
+
+    if estimate["fanout"] > 1:
+        print(
+            f"Join {join_name} on {keys} is expected to grow from {estimate['left_rows']:.0f} "
+            f"to {estimate['output_rows']:.0f} rows (fan-out {estimate['fanout']:.2f}). "
+            f"Offending keys: {estimate['offending_keys']}"
+        )
+
+    if max_fanout is not None and estimate["fanout"] > max_fanout:
+        raise ValueError(
+            f"Join {join_name} exceeds the maximum fan-out of {max_fanout}: "
+            f"expected fan-out {estimate['fanout']:.2f}, offending keys {estimate['offending_keys']}"
+        )
+
+    return estimate
+
+
+def check_join_fanouts(
+    driving: DataFrame,
+    joins: list,
+    driving_name: str,
+    max_fanout: Optional[float] = None,
+    sample_fraction: Optional[float] = None,
+) -> list:
+    """
+    Estimates the fan-out of every join of a chain of left joins before any of them runs.
+
+    The driving table is reduced to the row frequencies of the join key columns. Each join is
+    estimated from this frequency table and the key frequencies of the joined table only (see
+    `check_join_fanout`); the frequency table is then carried over the join, keeping only the
+    key columns later joins need, and persisted. No estimate runs the earlier joins again.
+
+    args:
+    -----
+    - driving : DataFrame
+        The driving (left-most) table of the chain.
+    - joins : list
+        `(table name, DataFrame, join columns)` of every left join, in join order.
+    - driving_name : str
+        Name of the driving table used in the messages (e.g. 'MARC').
+    - max_fanout : float, optional
+        The highest accepted fan-out of a join. If not given, the fan-outs are only reported.
+    - sample_fraction : float, optional
+        Passed to `estimate_join_fanout`.
+
+    Returns:
+    --------
+    list
+        The estimate of every join, as returned by `estimate_join_fanout`.
+
+    Raises:
+    -------
+    ValueError
+        If the estimated fan-out of a join exceeds `max_fanout`.
+    """
+    # Check input parameter
+    process_data(dataframe_check=driving, string_check=driving_name)
+
+    def later_keys(position: int) -> list:
+        return list(dict.fromkeys(c for _, _, keys in joins[position:] for c in keys))
+
+    frequencies = (
+        driving.groupBy(*[c for c in later_keys(0) if c in driving.columns])
+        .agg(F.count(F.lit(1)).alias("__rows"))
+        .persist()
+    )
+    estimates = []
+    try:
+        for position, (table_name, table, keys) in enumerate(joins):
+            estimates.append(
+                check_join_fanout(
+                    frequencies,
+                    table,
+                    keys,
+                    f"{driving_name}-{table_name}",
+                    max_fanout,
+                    sample_fraction,
+                    left_weight="__rows",
+                )
+            )
+            if position == len(joins) - 1:
+                break
+
+            # Carry the frequencies over the join, with the key columns of the later joins
+            needed = later_keys(position + 1)
+            added = [
+                c
+                for c in table.columns
+                if c in needed and c not in keys and c not in frequencies.columns
+            ]
+            right_counts = table.groupBy(*keys, *added).agg(
+                F.count(F.lit(1)).alias("__right_rows")
+            )
+            carried = (
+                frequencies.join(right_counts, keys, "left")
+                .withColumn(
+                    "__rows",
+                    F.col("__rows") * F.coalesce("__right_rows", F.lit(1)),
+                )
+                .groupBy(*[c for c in needed if c in frequencies.columns + added])
+                .agg(F.sum("__rows").alias("__rows"))
+                .persist()
+            )
+            frequencies.unpersist()
+            frequencies = carried
+    finally:
+        frequencies.unpersist()
+
+    return estimates
@@ -18,14 +18,34 @@ Date:
 """
 
 # Local imports
+import glob
+import json
 import os
+import re
 import shutil
-from typing import Optional
+from functools import reduce
+from typing import Optional, Union
 
 # Pyspark libraries
 import pyspark.sql.functions as F
 import pyspark.sql.types as T
-from pyspark.sql import DataFrame, SparkSession
+from pyspark.sql import Column, DataFrame, SparkSession
+
+# Custom imports
+from ace.schemas import (
+    CHUNK_SUFFIX_PATTERN,
+    COLUMNAR_FILE_EXTENSIONS,
+    CORRUPT_RECORD_COLUMN,
+    CSV_FILE_EXTENSIONS,
+    DEFAULT_BUCKET_COLUMNS,
+    DEFAULT_NUM_BUCKETS,
+    FILE_FORMAT_MAGIC_BYTES,
+    FILE_FORMAT_READ_OPTIONS,
+    HEX_IDENTIFIER_COLUMNS,
+    HEX_IDENTIFIER_PATTERN,
+    SAP_DATE_COLUMNS,
+    SAP_NULL_DATES,
+)
 
 
 def compare_dataframes(input_df: DataFrame, output_df: DataFrame) -> None:
@@ -57,19 +77,23 @@ def compare_dataframes(input_df: DataFrame, output_df: DataFrame) -> None:
 
 
 def read_file(
-    file_path: str,
+    file_path: Union[str, list],
     file_format: str,
     options: Optional[dict] = None,
     spark: Optional[SparkSession] = None,
+    schema: Optional[T.StructType] = None,
 ) -> DataFrame:
     """
     Reads a file of a specified format into a PySpark DataFrame.
 
     Parameters:
-        file_path (str): The path to the input file.
+        file_path (str or list): The path to the input file, or a list of paths (e.g. the chunks of
+            one table) that are read together in a single multi-file scan.
         file_format (str): The format of the file (e.g., 'csv', 'json', 'parquet', 'avro', 'orc').
         options (Optional[dict]): Additional options to pass to the reader (e.g., for headers, delimiters).
         spark (Optional[SparkSession]): An existing Spark session. If not provided, a new one will be created.
+        schema (Optional[StructType]): The schema to read the file with, instead of the schema of the file or
+            the inferred one.
 
     Returns:
         DataFrame: The loaded PySpark DataFrame.
@@ -84,7 +108,10 @@ def read_file(
     """
     # Validate inputs
     supported_formats = {"csv", "json", "parquet", "avro", "orc"}
-    if not isinstance(file_path, str) or not file_path.strip():
+    file_paths = file_path if isinstance(file_path, list) else [file_path]
+    if not file_paths or any(
+        not isinstance(path, str) or not path.strip() for path in file_paths
+    ):
         raise ValueError("Invalid file path. It must be a non-empty string.")
 
     if file_format.lower() not in supported_formats:
@@ -92,12 +119,10 @@ def read_file(
             f"Unsupported file format '{file_format}'. Supported formats are: {', '.join(supported_formats)}."
         )
 
-    # Convert relative path to absolute path
-    abs_file_path = os.path.abspath(file_path)
-
-    # Check if file path exists
-    if not os.path.exists(abs_file_path):
-        raise FileNotFoundError(f"The file path '{file_path}' does not exist.")
+    # Check if every file path exists (relative to the working directory)
+    for path in file_paths:
+        if not os.path.exists(os.path.abspath(path)):
+            raise FileNotFoundError(f"The file path '{path}' does not exist.")
 
     # Create Spark session if not provided
     if spark is None:
@@ -108,6 +133,8 @@ def read_file(
 
     # Read file
     reader = spark.read.format(file_format.lower())
+    if schema is not None:
+        reader = reader.schema(schema)
 
     if options:
         if not isinstance(options, dict):
@@ -174,10 +201,17 @@ def enforce_schema(df: DataFrame, schema: T.StructType) -> DataFrame:
     +--------+-------------+-------------+
 
     """
+    data_types = {field.name: field.dataType for field in df.schema}
     existing_columns = [
-        F.col(field.name).cast(field.dataType)
+        (
+            # Binary encoded identifiers are kept as they are until they are decoded for output
+            F.col(field.name)
+            if isinstance(data_types[field.name], T.BinaryType)
+            and isinstance(field.dataType, T.StringType)
+            else F.col(field.name).cast(field.dataType)
+        )
         for field in schema
-        if field.name in df.columns
+        if field.name in data_types
     ]
     return df.select(existing_columns)
 
@@ -250,7 +284,505 @@ def process_data(
             )
 
 
-def read_multiple_data(data_dir: str) -> dict:
+def encode_identifier_columns(
+    dataframes: dict, candidate_columns: Optional[list] = None
+) -> dict:
+    """
+    Encodes hex-hash identifier columns as 32-byte binary values and constant columns as literals.
+
+    Every identifier in the SAP extracts is a 64-character SHA-256 hex string. Storing them as
+    binary halves the memory and shuffle size of every join and window that uses them. The
+    encoding is applied to a candidate column only if every non-null value of that column
+    is a lower case 64-character hex string in every table that contains it, so join keys
+    always have the same type on both sides.
+
+    Columns that hold a single value in a table (e.g. `SOURCE_SYSTEM_ERP`) are replaced by
+    a literal, so no per-row value is stored or shuffled for them.
+
+    All statistics for a table are computed in a single aggregation pass.
+
+    args:
+    -----
+        dataframes (dict): Mapping of table name to DataFrame, as returned by `read_multiple_data`.
+        candidate_columns (Optional[list]): Identifier columns to consider. Defaults to
+            `HEX_IDENTIFIER_COLUMNS`.
+
+    Returns:
+    --------
+        dict: Mapping of table name to the encoded DataFrame.
+
+    Notes:
+    ------
+        - Use `decode_identifier_columns` to turn the binary columns back into hex strings for output.
+
+    Example:
+    --------
+        >>> tables = encode_identifier_columns(read_multiple_data("/path/to/data_dir"))
+        >>> tables["PRE_MARA"].schema["MATNR"].dataType
+        BinaryType()
+    """
+    if candidate_columns is None:
+        candidate_columns = HEX_IDENTIFIER_COLUMNS
+
+    # Profile all candidate columns of each table in one aggregation pass
+    profiles = {}
+    for name, df in dataframes.items():
+        process_data(dataframe_check=df)
+        columns = [c for c in candidate_columns if c in df.columns]
+        if not columns:
+            profiles[name] = {}
+            continue
+
+        aggregations = [F.count(F.lit(1)).alias("__rows")]
+        for c in columns:
+            value = F.col(c).cast("string")
+            aggregations += [
+                F.count(value).alias(f"{c}__non_null"),
+                F.sum(
+                    F.when(~value.rlike(HEX_IDENTIFIER_PATTERN), 1).otherwise(0)
+                ).alias(f"{c}__non_hex"),
+                F.min(value).alias(f"{c}__min"),
+                F.max(value).alias(f"{c}__max"),
+            ]
+        row = df.agg(*aggregations).first()
+
+        profiles[name] = {
+            c: {
+                "constant": row["__rows"] > 0
+                and row[f"{c}__non_null"] == row["__rows"]
+                and row[f"{c}__min"] == row[f"{c}__max"],
+                "hex": not row[f"{c}__non_hex"],
+                "value": row[f"{c}__min"],
+            }
+            for c in columns
+        }
+
+    # A column is encoded only if it is hex in every table, so join keys keep matching types
+    encodable = {
+        c
+        for c in candidate_columns
+        if all(profile[c]["hex"] for profile in profiles.values() if c in profile)
+    }
+
+    encoded = {}
+    for name, df in dataframes.items():
+        expressions = {}
+        for c, profile in profiles[name].items():
+            if profile["constant"]:
+                value = F.lit(profile["value"])
+                expressions[c] = F.unhex(value) if c in encodable else value
+            elif c in encodable:
+                expressions[c] = F.unhex(F.col(c))
+
+        encoded[name] = df.withColumns(expressions) if expressions else df
+
+    return encoded
+
+
+def decode_identifier_column(df: DataFrame, col_name: str) -> Column:
+    """
+    Returns a column expression with the readable (hex string) value of an identifier column.
+
+    Binary encoded identifiers are decoded back to lower case hex strings, while any other
+    column is returned unchanged. Use it wherever an identifier has to be handled as a string,
+    e.g. in `concat_ws` or `coalesce` with string columns.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame containing the column.
+        col_name (str): The name of the identifier column.
+
+    Returns:
+    --------
+        Column: The readable column expression.
+    """
+    if isinstance(df.schema[col_name].dataType, T.BinaryType):
+        return F.lower(F.hex(F.col(col_name)))
+    return F.col(col_name)
+
+
+def decode_identifier_columns(df: DataFrame) -> DataFrame:
+    """
+    Decodes all binary encoded identifier columns of a DataFrame back to hex strings.
+
+    This is the counterpart of `encode_identifier_columns` and is applied once, right before
+    the output is written.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame with binary encoded identifier columns.
+
+    Returns:
+    --------
+        DataFrame: The DataFrame with every binary column decoded to a lower case hex string.
+    """
+    # Check input parameters
+    process_data(dataframe_check=df)
+
+    expressions = {
+        field.name: decode_identifier_column(df, field.name)
+        for field in df.schema
+        if isinstance(field.dataType, T.BinaryType)
+    }
+    return df.withColumns(expressions) if expressions else df
+
+
+def reduce_by_driving_keys(
+    df: DataFrame, driving_df: DataFrame, keys: list, broadcast_keys: bool = True
+) -> DataFrame:
+    """
+    Keeps only the rows of a DataFrame whose keys occur in a driving DataFrame.
+
+    Rows whose keys are missing from the driving table can never match a left join from that
+    table, so they can be dropped before any expensive window, dedupe or shuffle. The distinct
+    key set of the driving table is compact, so it is broadcast and applied as a left semi join.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame to be reduced (e.g. MBEW or MARA).
+        driving_df (DataFrame): The driving table of the later left join (e.g. the prepared MARC).
+        keys (list): The key columns present in both DataFrames (e.g. `["MATNR"]`).
+        broadcast_keys (bool): If True (default), the key set is broadcast instead of shuffled.
+
+    Returns:
+    --------
+        DataFrame: The rows of `df` whose keys occur in `driving_df`.
+    """
+    # Check input parameters
+    process_data(dataframe_check=df, boolean_check=broadcast_keys)
+    process_data(dataframe_check=driving_df)
+
+    key_set = driving_df.select(*keys).dropna().distinct()
+    if broadcast_keys:
+        key_set = F.broadcast(key_set)
+
+    return df.join(key_set, keys, "left_semi")
+
+
+def parse_sap_dates(df: DataFrame, date_columns: Optional[dict] = None) -> DataFrame:
+    """
+    Parses the SAP date fields of a DataFrame to DateType.
+
+    Every field is parsed once, trying the formats of the registry in order, so the later logic
+    compares, truncates and subtracts native dates instead of parsing strings again. SAP's empty
+    date (`00000000`) and values that match none of the formats become null.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame read from an SAP extract.
+        date_columns (dict, optional): Mapping of date field to the formats to try.
+            Defaults to `SAP_DATE_COLUMNS`.
+
+    Returns:
+    --------
+        DataFrame: The DataFrame with every date field present as a DateType column.
+    """
+    # Check input parameters
+    process_data(dataframe_check=df)
+
+    if date_columns is None:
+        date_columns = SAP_DATE_COLUMNS
+
+    expressions = {}
+    for col_name, formats in date_columns.items():
+        if col_name not in df.columns:
+            continue
+
+        data_type = df.schema[col_name].dataType
+        if isinstance(data_type, T.DateType):
+            continue
+        if isinstance(data_type, T.TimestampType):
+            expressions[col_name] = F.to_date(F.col(col_name))
+            continue
+
+        value = F.trim(F.col(col_name).cast(T.StringType()))
+        parsed = F.coalesce(
+            *[F.to_date(F.try_to_timestamp(value, F.lit(fmt))) for fmt in formats]
+        )
+        expressions[col_name] = F.when(~value.isin(*SAP_NULL_DATES), parsed)
+
+    return df.withColumns(expressions) if expressions else df
+
+
+def _split_extension(file_name: str) -> tuple:
+    """
+    Splits a file name into its stem and its known extract extension.
+
+    args:
+    -----
+        file_name (str): The file name (e.g. 'PRD_MARC_0001.csv.gz').
+
+    Returns:
+    --------
+        tuple: The stem and the extension (e.g. `('PRD_MARC_0001', '.csv.gz')`), or the file name
+            and None if the extension is not known.
+    """
+    extensions = [*CSV_FILE_EXTENSIONS, *COLUMNAR_FILE_EXTENSIONS]
+
+    # Longest extensions first, so '.csv.gz' is not mistaken for an unknown '.gz' file
+    for extension in sorted(extensions, key=len, reverse=True):
+        if file_name.endswith(extension):
+            return file_name[: -len(extension)], extension
+
+    return file_name, None
+
+
+def detect_file_format(file_path: str) -> Optional[str]:
+    """
+    Detects the Spark format of an extract from its extension, or else from its magic bytes.
+
+    args:
+    -----
+        file_path (str): The path of the file (or Spark output directory).
+
+    Returns:
+    --------
+        str: 'csv', 'parquet', 'orc' or 'avro', or None if the format is not recognised.
+    """
+    # Check input parameters
+    process_data(string_check=file_path)
+
+    _, extension = _split_extension(os.path.basename(os.path.normpath(file_path)))
+    if extension in CSV_FILE_EXTENSIONS:
+        return "csv"
+    if extension is not None:
+        return COLUMNAR_FILE_EXTENSIONS[extension]
+
+    if os.path.isfile(file_path):
+        with open(file_path, "rb") as file:
+            head = file.read(max(map(len, FILE_FORMAT_MAGIC_BYTES)))
+        for magic_bytes, file_format in FILE_FORMAT_MAGIC_BYTES.items():
+            if head.startswith(magic_bytes):
+                return file_format
+
+    return None
+
+
+def discover_table_files(data_dir: str, table_globs: Optional[dict] = None) -> dict:
+    """
+    Groups the extract files of a directory by the logical table they belong to.
+
+    The extractor splits large tables into chunks (`PRD_MARC_0001.csv`, `PRD_MARC_0002.csv.gz`);
+    the chunk suffix and the (compression) extension are stripped, so all chunks of a table end up
+    in one group (`PRD_MARC`). Columnar extracts (`.parquet`, `.orc`, `.avro`) may also be Spark
+    output directories; files without a known extension are kept if their magic bytes identify a
+    columnar format (see `detect_file_format`). Other files are ignored.
+
+    args:
+    -----
+        data_dir (str): Path to the directory containing the extracts.
+        table_globs (dict, optional): Mapping of logical table name to a glob pattern (relative to
+            `data_dir`, e.g. `{"PRD_MARC": "marc/*.csv.gz"}`); the matched files replace the
+            discovered files of that table.
+
+    Returns:
+    --------
+        dict: Mapping of logical table name to the sorted list of its file paths.
+    """
+    # Check input parameters
+    process_data(string_check=data_dir)
+
+    groups = {}
+    for file_name in sorted(os.listdir(data_dir)):
+        file_path = os.path.join(data_dir, file_name)
+        stem, extension = _split_extension(file_name)
+        if os.path.isdir(file_path):
+            # Only columnar formats are written as directories of part files
+            if extension not in COLUMNAR_FILE_EXTENSIONS:
+                continue
+        elif extension is None:
+            if detect_file_format(file_path) is None:
+                continue
+            stem = os.path.splitext(file_name)[0]
+
+        table_name = re.sub(CHUNK_SUFFIX_PATTERN, "", stem)
+        groups.setdefault(table_name, []).append(file_path)
+
+    for table_name, pattern in (table_globs or {}).items():
+        file_paths = sorted(glob.glob(os.path.join(data_dir, pattern)))
+        if not file_paths:
+            raise FileNotFoundError(
+                f"No files match the pattern '{pattern}' of table '{table_name}'."
+            )
+        groups[table_name] = file_paths
+
+    return groups
+
+
+def _infer_csv_column_types(df: DataFrame) -> dict:
+    """
+    Infers the types of the string columns of a CSV read, like Spark's `inferSchema` does.
+
+    A column becomes the first of int, bigint, double and boolean that all of its values parse
+    as; columns without values and all other columns stay strings. All columns are checked in a
+    single aggregation.
+
+    args:
+    -----
+        df (DataFrame): The CSV rows, every column a string.
+
+    Returns:
+    --------
+        dict: Mapping of column name to the inferred Spark type name.
+    """
+    integer = r"^[+-]?\d+$"
+    candidates = {
+        "int": lambda value: value.rlike(integer) & value.cast("int").isNotNull(),
+        "bigint": lambda value: value.rlike(integer) & value.cast("bigint").isNotNull(),
+        "double": lambda value: value.cast("double").isNotNull(),
+        "boolean": lambda value: F.lower(value).isin("true", "false"),
+    }
+
+    # Count the values of each column and the values each candidate type cannot parse
+    aggregations = [F.count(F.col(c)).alias(f"{c}|values") for c in df.columns]
+    for type_name, parses in candidates.items():
+        aggregations += [
+            F.count(F.when(~parses(F.trim(F.col(c))), True)).alias(f"{c}|{type_name}")
+            for c in df.columns
+        ]
+    counts = df.agg(*aggregations).first().asDict()
+
+    column_types = {}
+    for c in df.columns:
+        column_types[c] = "string"
+        if counts[f"{c}|values"]:
+            column_types[c] = next(
+                (t for t in candidates if counts[f"{c}|{t}"] == 0), "string"
+            )
+    return column_types
+
+
+def _read_csv_without_bad_records(
+    file_path: Union[str, list],
+    options: dict,
+    bad_records_path: str,
+    cached_frames: Optional[list] = None,
+) -> DataFrame:
+    """
+    Reads CSV files, moving malformed rows (e.g. with a wrong number of fields) to a side path.
+
+    The files are read once, every column as a string, in PERMISSIVE mode with a corrupt record
+    column, so a malformed row is kept as raw text instead of failing the read or being silently
+    padded. The result is persisted, the malformed rows are written as JSON (`record`) to
+    `bad_records_path` and dropped; the path is cleared if there are none, so it only ever holds
+    the rows of the latest read. If `inferSchema` is set, the column types are inferred from the
+    well-formed rows only (see `_infer_csv_column_types`).
+
+    args:
+    -----
+        file_path (str or list): The CSV file(s).
+        options (dict): The reader options.
+        bad_records_path (str): Directory the malformed rows are written to.
+        cached_frames (list, optional): The persisted frame is appended to it, so its owner can
+            release it once the rows are no longer needed (see `TableRegistry.release`).
+
+    Returns:
+    --------
+        DataFrame: The well-formed rows.
+    """
+    infer_schema = str(options.get("inferSchema", "false")).lower() == "true"
+    options = {**options, "inferSchema": "false"}
+
+    # Without inference only the header is read for the schema
+    schema = read_file(file_path, "csv", options).schema
+    schema = T.StructType(
+        [T.StructField(field.name, T.StringType()) for field in schema.fields]
+        + [T.StructField(CORRUPT_RECORD_COLUMN, T.StringType())]
+    )
+    df = read_file(
+        file_path,
+        "csv",
+        {
+            **options,
+            "mode": "PERMISSIVE",
+            "columnNameOfCorruptRecord": CORRUPT_RECORD_COLUMN,
+        },
+        schema=schema,
+    )
+
+    # Spark only allows queries on the corrupt record column of a cached frame
+    df = df.persist()
+    if cached_frames is not None:
+        cached_frames.append(df)
+    bad_records = df.filter(F.col(CORRUPT_RECORD_COLUMN).isNotNull())
+    bad_count = bad_records.count()
+    if bad_count:
+        bad_records.select(F.col(CORRUPT_RECORD_COLUMN).alias("record")).write.mode(
+            "overwrite"
+        ).json(bad_records_path)
+        print(f"Moved {bad_count} malformed rows to {bad_records_path}")
+    else:
+        shutil.rmtree(bad_records_path, ignore_errors=True)
+
+    df = df.filter(F.col(CORRUPT_RECORD_COLUMN).isNull()).drop(CORRUPT_RECORD_COLUMN)
+    if infer_schema:
+        column_types = _infer_csv_column_types(df)
+        df = df.select([F.col(c).cast(column_types[c]).alias(c) for c in df.columns])
+    return df
+
+
+def read_table(
+    file_paths: list,
+    bad_records_path: Optional[str] = None,
+    cached_frames: Optional[list] = None,
+) -> DataFrame:
+    """
+    Reads the files of one logical table (e.g. all chunks of PRD_MARC) into a DataFrame.
+
+    The files of each format are read in a single multi-file scan; the formats are detected per
+    file (see `detect_file_format`), so the chunks of a table may mix formats and are unioned by
+    column name. Columnar files are read natively, so later filters and column selections are
+    pushed down into the scan. The SAP date fields are parsed (see `parse_sap_dates`).
+
+    args:
+    -----
+        file_paths (list): The files of the table.
+        bad_records_path (str, optional): If given, malformed CSV rows are written to this
+            directory and dropped instead of being read with shifted or missing values.
+        cached_frames (list, optional): The frames persisted to move malformed rows aside are
+            appended to it, to be released by the caller (see `_read_csv_without_bad_records`).
+
+    Returns:
+    --------
+        DataFrame: The table.
+
+    Raises:
+    -------
+        ValueError: If the format of a file is not recognised.
+    """
+    paths_by_format = {}
+    for file_path in file_paths:
+        file_format = detect_file_format(file_path)
+        if file_format is None:
+            raise ValueError(f"The format of the file '{file_path}' is not recognised.")
+        paths_by_format.setdefault(file_format, []).append(file_path)
+
+    frames = []
+    for file_format, paths in paths_by_format.items():
+        path = paths if len(paths) > 1 else paths[0]
+        options = FILE_FORMAT_READ_OPTIONS.get(file_format)
+        if file_format == "csv" and bad_records_path is not None:
+            frames.append(
+                _read_csv_without_bad_records(
+                    path, options, bad_records_path, cached_frames
+                )
+            )
+        else:
+            frames.append(read_file(path, file_format, options))
+    df = reduce(lambda a, b: a.unionByName(b, allowMissingColumns=True), frames)
+
+    # Parse the SAP date fields once, so later steps work on native dates
+    return parse_sap_dates(df)
+
+
+def read_multiple_data(
+    data_dir: str,
+    encode_identifiers: bool = False,
+    table_globs: Optional[dict] = None,
+    tables: Optional[list] = None,
+    bad_records_path: Optional[str] = None,
+    cached_frames: Optional[list] = None,
+) -> dict:
     """
     Reads multiple data files from a specified directory and returns a dictionary of DataFrames.
 
@@ -261,6 +793,16 @@ def read_multiple_data(data_dir: str) -> dict:
     args:
     -----
         data_dir (str): Path to the directory containing the data files.
+        encode_identifiers (bool): If True, hex-hash identifier columns are stored as binary and
+            constant columns as literals (see `encode_identifier_columns`). Defaults to False.
+        table_globs (dict, optional): Glob patterns of tables whose files are not discovered by
+            name (see `discover_table_files`). Defaults to None.
+        tables (list, optional): SAP table names to read (e.g. `["AFKO", "MARA"]`); files of other
+            tables are not read at all. Defaults to all tables of the directory.
+        bad_records_path (str, optional): If given, malformed CSV rows are written to
+            `<bad_records_path>/<table>` and dropped (see `read_table`). Defaults to None.
+        cached_frames (list, optional): Collects the frames persisted to move malformed rows
+            aside, to be released by the caller (see `read_table`). Defaults to None.
 
     Returns:
     --------
@@ -268,10 +810,15 @@ def read_multiple_data(data_dir: str) -> dict:
 
     Notes:
     ------
-        - Currently, the function supports reading `.csv` files. If other file formats are needed,
-          additional handling logic can be added.
+        - The function reads `.csv` files, also compressed (`.csv.gz`, `.csv.bz2`, `.csv.zst`;
+          zstd needs Hadoop's native library), and `.parquet`, `.orc` and `.avro` files or Spark
+          output directories (Avro needs the spark-avro package). Files without a known
+          extension are recognised by their magic bytes, and a directory may mix formats.
+        - Chunked tables (`PRD_MARC_0001.csv`, `PRD_MARC_0002.csv`) are read as one table in a
+          single multi-file scan and keyed by their logical name (`PRD_MARC`).
         - Assumes that the directory contains files that can be read into DataFrames.
         - The function uses `os.path.isfile` to skip subfolders.
+        - The SAP date fields of `SAP_DATE_COLUMNS` are parsed to DateType (see `parse_sap_dates`).
 
     Example:
     --------
@@ -289,33 +836,75 @@ def read_multiple_data(data_dir: str) -> dict:
     # Initialize an empty dictionary to store DataFrames
     dataframes_dict = {}
 
-    # Iterate through each file in the provided directory
-    for file_name in os.listdir(data_dir):
-
-        # Construct the full file path
-        file_path = os.path.join(data_dir, file_name)
-
-        # Check if it's a file (not a subdirectory)
-        if os.path.isfile(file_path):
+    # Read every requested logical table (all of its chunks) in a single multi-file scan
+    for base_name, file_paths in discover_table_files(data_dir, table_globs).items():
+        if tables is not None and base_name.split("_")[-1] not in tables:
+            continue
 
-            # Extract the base name of the file (without extension) to use as the key
-            base_name = os.path.splitext(file_name)[0]
+        table_bad_records_path = (
+            os.path.join(bad_records_path, base_name) if bad_records_path else None
+        )
 
-            # Check if the file has a .csv extension and read it into a DataFrame
-            if file_name.endswith(".csv"):
-                # Assume read_file is a function defined elsewhere to handle reading files into DataFrames
-                df = read_file(
-                    file_path, "csv", {"header": "true", "inferSchema": "true"}
-                )
+        # Store the DataFrame in the dictionary with the logical table name as the key
+        dataframes_dict.update(
+            {base_name: read_table(file_paths, table_bad_records_path, cached_frames)}
+        )
 
-            # Store the DataFrame in the dictionary with the file's base name as the key
-            dataframes_dict.update({base_name: df})
+    # Encode the hex identifiers of all tables together so join keys keep matching types
+    if encode_identifiers:
+        dataframes_dict = encode_identifier_columns(dataframes_dict)
 
     # Return the dictionary containing all DataFrames
     return dataframes_dict
 
 
-def save_df_as_csv(df: DataFrame, output_dir: str, file_name: str):
+def add_partition_columns(df: DataFrame, partition_by: list) -> DataFrame:
+    """
+    Adds the derived partition columns requested in `partition_by` to a DataFrame.
+
+    A partition column is either an existing column (e.g. `source_system_erp`, `plant`) or a
+    derived month column named `<date column>_month` (e.g. `start_date_month`), which holds the
+    `yyyy-MM` month of the date column.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame to be partitioned.
+        partition_by (list): The partition column names.
+
+    Returns:
+    --------
+        DataFrame: The DataFrame with all partition columns present.
+
+    Raises:
+    -------
+        ValueError: If a partition column neither exists nor can be derived.
+
+    Example:
+    --------
+        >>> add_partition_columns(df, ["plant", "start_date_month"]).columns
+        [..., 'plant', 'start_date', 'start_date_month']
+    """
+    for col_name in partition_by:
+        if col_name in df.columns:
+            continue
+
+        # Derive month partitions from the underlying date column
+        date_col = col_name[: -len("_month")] if col_name.endswith("_month") else None
+        if date_col not in df.columns:
+            raise ValueError(
+                f"Partition column '{col_name}' does not exist and cannot be derived."
+            )
+        df = df.withColumn(col_name, F.date_format(F.col(date_col), "yyyy-MM"))
+
+    return df
+
+
+def save_df_as_csv(
+    df: DataFrame,
+    output_dir: str,
+    file_name: str,
+    partition_by: Optional[list] = None,
+):
     """
     Saves a given DataFrame as a CSV file in the specified output directory.
 
@@ -323,23 +912,33 @@ def save_df_as_csv(df: DataFrame, output_dir: str, file_name: str):
     The DataFrame is first written to a temporary directory, and the resulting file is renamed to match
     the desired output file name. After the file is moved, the temporary directory is removed to clean up.
 
+    If `partition_by` is given, the DataFrame is instead written as a Hive-style partitioned dataset
+    (`<output_dir>/<file_name>/<col>=<value>/part-*.csv`) with dynamic partition overwrite, so a re-run
+    only rewrites the partitions present in the DataFrame.
+
     args:
     -----
         df (DataFrame): The DataFrame to be saved.
         output_dir (str): The directory where the CSV file will be saved.
         file_name (str): The desired name for the output CSV file.
+        partition_by (Optional[list]): Columns to partition the output by, e.g. `["source_system_erp", "plant"]`
+            or the derived month column `start_date_month` (see `add_partition_columns`).
 
     Notes:
     ------
         - The DataFrame is coalesced into a single partition before being written to the CSV file.
         - If the `file_name` does not already end with `.csv`, the extension is automatically added.
-        - The file is written temporarily to a folder named `temp_output` within the specified `output_dir`,
+        - The file is written temporarily to a folder named `temp_output_<file_name>` within the specified `output_dir`,
           and the resulting file is renamed before cleaning up the temporary directory.
+        - A partitioned output is repartitioned by the partition columns, so each partition holds one file.
 
     Example:
     --------
         To save a DataFrame `df` to `/path/to/output/` with the name `data.csv`:
         >>> save_df_as_csv(df, "/path/to/output", "data.csv")
+
+        To save it partitioned by source system and plant under `/path/to/output/data/`:
+        >>> save_df_as_csv(df, "/path/to/output", "data", ["source_system_erp", "plant"])
     """
 
     # Check input parameters
@@ -349,8 +948,25 @@ def save_df_as_csv(df: DataFrame, output_dir: str, file_name: str):
     if file_name.split(".")[-1] == "csv":
         file_name = file_name.split(".")[0]
 
-    # Define a temporary directory to write the CSV
-    temp_dir = f"{output_dir}/temp_output"
+    # Write a partitioned layout, overwriting only the partitions present in the DataFrame
+    if partition_by:
+        df = add_partition_columns(df, partition_by)
+        (
+            df.repartition(*partition_by)
+            .write.partitionBy(*partition_by)
+            .mode("overwrite")
+            .option("partitionOverwriteMode", "dynamic")
+            .option("header", "true")
+            .csv(f"{output_dir}/{file_name}")
+        )
+
+        print(
+            f"Successfully saved {file_name} partitioned by {partition_by} in {output_dir}"
+        )
+        return
+
+    # Define a temporary directory to write the CSV (one per file, so concurrent runs do not clash)
+    temp_dir = f"{output_dir}/temp_output_{file_name}"
 
     # Write the DataFrame to the temporary directory
     df.coalesce(1).write.option("header", "true").csv(temp_dir)
@@ -367,6 +983,390 @@ def save_df_as_csv(df: DataFrame, output_dir: str, file_name: str):
     print(f"Successfully saved {file_name}.csv in {output_dir}")
 
 
+def _bloom_filter_options(bloom_filter_columns: Optional[list]) -> dict:
+    """
+    Returns the Parquet writer options that write a Bloom filter for each of the given columns.
+    """
+    return {
+        f"parquet.bloom.filter.enabled#{col_name}": "true"
+        for col_name in bloom_filter_columns or []
+    }
+
+
+def save_df_as_parquet(
+    df: DataFrame,
+    output_dir: str,
+    file_name: str,
+    partition_by: Optional[list] = None,
+    sort_by: Optional[list] = None,
+    bloom_filter_columns: Optional[list] = None,
+):
+    """
+    Saves a DataFrame as Parquet files laid out for data skipping.
+
+    The output is written to `<output_dir>/<file_name>`. If `sort_by` is given, the rows are range
+    partitioned and sorted within the files by these columns, so the min/max statistics of the
+    files and of their row groups cover narrow, mostly disjoint key ranges, and scans filtering on
+    the sort columns skip the other files and row groups. Parquet Bloom filters are written for
+    `bloom_filter_columns`, so point lookups on high-cardinality keys also skip the row groups
+    whose range contains the key but not the value itself.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame to be saved.
+        output_dir (str): The directory where the output will be saved.
+        file_name (str): The name of the output folder; a `.csv` or `.parquet` extension is dropped.
+        partition_by (Optional[list]): Columns to partition the output by, written with dynamic
+            partition overwrite like `save_df_as_csv`. Each partition holds one file.
+        sort_by (Optional[list]): Columns to sort the rows by within the files, e.g.
+            `["plant", "material_number"]`.
+        bloom_filter_columns (Optional[list]): Columns to write Parquet Bloom filters for, e.g.
+            `["material_number"]`.
+
+    Raises:
+    -------
+        ValueError: If a sort or Bloom filter column does not exist.
+
+    Example:
+    --------
+        >>> save_df_as_parquet(df, "/path/to/output", "local_material", sort_by=["plant", "material_number"], bloom_filter_columns=["material_number"])
+    """
+    # Check input parameters
+    process_data(dataframe_check=df, string_check=output_dir)
+    process_data(string_check=file_name)
+
+    sort_by = list(sort_by or [])
+    bloom_filter_columns = list(bloom_filter_columns or [])
+    missing_columns = [c for c in sort_by + bloom_filter_columns if c not in df.columns]
+    if missing_columns:
+        raise ValueError(
+            f"Sort or Bloom filter columns {missing_columns} do not exist."
+        )
+
+    file_name = file_name.split(".")[0]
+
+    # One file per partition, or files of disjoint ranges of the sort columns
+    if partition_by:
+        df = add_partition_columns(df, partition_by)
+        df = df.repartition(*partition_by).sortWithinPartitions(*partition_by, *sort_by)
+    elif sort_by:
+        df = df.repartitionByRange(*sort_by).sortWithinPartitions(*sort_by)
+
+    writer = (
+        df.write.mode("overwrite")
+        .option("partitionOverwriteMode", "dynamic")
+        .options(**_bloom_filter_options(bloom_filter_columns))
+    )
+    if partition_by:
+        writer = writer.partitionBy(*partition_by)
+    writer.parquet(f"{output_dir}/{file_name}")
+
+    print(
+        f"Successfully saved {file_name} as Parquet sorted by {sort_by} in {output_dir}"
+    )
+
+
+def _write_arrow_files(df: DataFrame, output_path: str) -> list:
+    """
+    Writes each partition of a DataFrame to an Arrow IPC file in a directory, with `mapInArrow`.
+
+    The executors write the record batches Spark already converts to Arrow, so the rows are not
+    collected on the driver. The directory must be reachable by the executors and the driver
+    (a local or shared file system). Returns the paths of the files, in partition order.
+    """
+
+    def write_partition(batches):
+        import pyarrow as pa
+        from pyspark import TaskContext
+
+        path = os.path.join(
+            output_path, f"part-{TaskContext.get().partitionId():05d}.arrow"
+        )
+        writer = None
+        for batch in batches:
+            if writer is None:
+                writer = pa.ipc.new_file(path, batch.schema)
+            writer.write_batch(batch)
+        if writer is not None:
+            writer.close()
+            yield pa.RecordBatch.from_pydict({"path": [path]})
+
+    shutil.rmtree(output_path, ignore_errors=True)
+    os.makedirs(output_path)
+    file_paths = sorted(
+        row.path for row in df.mapInArrow(write_partition, "path string").collect()
+    )
+
+    # An empty result is one file with the schema and no batches
+    if not file_paths:
+        import pyarrow as pa
+        from pyspark.sql.pandas.types import to_arrow_schema
+
+        file_paths = [os.path.join(output_path, "part-00000.arrow")]
+        pa.ipc.new_file(file_paths[0], to_arrow_schema(df.schema)).close()
+
+    return file_paths
+
+
+def save_df_as_arrow(df: DataFrame, output_dir: str, file_name: str) -> list:
+    """
+    Saves a DataFrame as Arrow IPC (Feather v2) files for zero-copy reads by Python consumers.
+
+    The output is written to `<output_dir>/<file_name>/part-*.arrow`, one file per partition,
+    written by the executors with `mapInArrow`. The files are uncompressed, so consumers can
+    memory-map them and use the record batches without copying or parsing them
+    (see `read_arrow_batches`); `pyarrow.feather.read_table` and `pandas.read_feather` read
+    them as well. An existing output of the same name is replaced.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame to be saved.
+        output_dir (str): The directory where the output will be saved. It must be reachable by
+            the executors and the driver (a local or shared file system).
+        file_name (str): The name of the output folder; an extension is dropped.
+
+    Returns:
+    --------
+        list: The paths of the written files.
+
+    Example:
+    --------
+        >>> save_df_as_arrow(df, "/path/to/output", "local_material")
+        ['/path/to/output/local_material/part-00000.arrow']
+    """
+    # Check input parameters
+    process_data(dataframe_check=df, string_check=output_dir)
+    process_data(string_check=file_name)
+
+    file_name = file_name.split(".")[0]
+    file_paths = _write_arrow_files(
+        df, os.path.abspath(os.path.join(output_dir, file_name))
+    )
+
+    print(f"Successfully saved {file_name} as Arrow IPC files in {output_dir}")
+    return file_paths
+
+
+def save_df_as_bucketed_table(
+    df: DataFrame,
+    output_dir: str,
+    file_name: str,
+    bucket_by: Optional[list] = None,
+    num_buckets: int = DEFAULT_NUM_BUCKETS,
+    partition_by: Optional[list] = None,
+    file_format: str = "parquet",
+    bloom_filter_columns: Optional[list] = None,
+) -> dict:
+    """
+    Saves a DataFrame as a bucketed and sorted table and records its bucketing metadata.
+
+    The data is written to `<output_dir>/<file_name>` and registered in the session catalog as the
+    table `<file_name>`. Each bucket file is sorted on the bucket columns, so two outputs bucketed on
+    the same columns into the same number of buckets can be joined with a sort-merge join without
+    any shuffle or sort. The bucket specification is also written to
+    `<output_dir>/<file_name>/_bucket_spec.json`, so other Spark sessions can register the table
+    with `register_bucketed_table`.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame to be saved.
+        output_dir (str): The directory where the table data will be saved.
+        file_name (str): The table name, also used as the folder name.
+        bucket_by (Optional[list]): Columns to bucket and sort by. Defaults to `DEFAULT_BUCKET_COLUMNS`.
+        num_buckets (int): Number of buckets. Defaults to `DEFAULT_NUM_BUCKETS`.
+        partition_by (Optional[list]): Columns to additionally partition the table by.
+        file_format (str): The file format of the table. Defaults to 'parquet'.
+        bloom_filter_columns (Optional[list]): Columns to write Parquet Bloom filters for.
+
+    Returns:
+    --------
+        dict: The recorded bucket specification.
+
+    Example:
+    --------
+        >>> save_df_as_bucketed_table(df, "/path/to/output", "local_material", ["material_number", "plant"], 16)
+    """
+    # Check input parameters
+    process_data(dataframe_check=df, string_check=output_dir)
+    process_data(string_check=file_name)
+
+    if bucket_by is None:
+        bucket_by = DEFAULT_BUCKET_COLUMNS
+
+    missing_columns = [c for c in bucket_by if c not in df.columns]
+    if missing_columns:
+        raise ValueError(f"Bucket columns {missing_columns} do not exist.")
+
+    table_name = file_name.split(".")[0]
+    table_path = os.path.abspath(os.path.join(output_dir, table_name))
+
+    if partition_by:
+        df = add_partition_columns(df, partition_by)
+
+    # Hash partition the rows like the buckets, so each task writes a single bucket file
+    # (per partition) instead of one file per bucket it holds rows of
+    df = df.repartition(num_buckets, *bucket_by)
+
+    writer = df.write.format(file_format).bucketBy(num_buckets, *bucket_by)
+    writer = writer.sortBy(*bucket_by)
+    if file_format == "parquet":
+        writer = writer.options(**_bloom_filter_options(bloom_filter_columns))
+    if partition_by:
+        writer = writer.partitionBy(*partition_by)
+
+    writer.mode("overwrite").option("path", table_path).saveAsTable(table_name)
+
+    # Record the bucket specification next to the data
+    bucket_spec = {
+        "table": table_name,
+        "path": table_path,
+        "format": file_format,
+        "bucket_columns": list(bucket_by),
+        "sort_columns": list(bucket_by),
+        "num_buckets": num_buckets,
+        "partition_columns": list(partition_by or []),
+        "schema": df.schema.jsonValue(),
+    }
+    with open(os.path.join(table_path, "_bucket_spec.json"), "w") as spec_file:
+        json.dump(bucket_spec, spec_file, indent=2)
+
+    print(
+        f"Successfully saved table {table_name} bucketed by {bucket_by} into {num_buckets} buckets in {output_dir}"
+    )
+
+    return bucket_spec
+
+
+def register_bucketed_table(
+    table_path: str,
+    table_name: Optional[str] = None,
+    spark: Optional[SparkSession] = None,
+) -> str:
+    """
+    Registers a table written by `save_df_as_bucketed_table` in the catalog of a Spark session.
+
+    The bucket specification recorded in `_bucket_spec.json` is used to declare the table, so Spark
+    knows the bucketing and sort order of the files and can avoid shuffles when joining it with
+    another table bucketed the same way.
+
+    args:
+    -----
+        table_path (str): The folder containing the table data and `_bucket_spec.json`.
+        table_name (Optional[str]): The name to register the table under. Defaults to the recorded name.
+        spark (Optional[SparkSession]): An existing Spark session. If not provided, a new one will be created.
+
+    Returns:
+    --------
+        str: The name of the registered table.
+
+    Raises:
+    -------
+        FileNotFoundError: If the folder has no `_bucket_spec.json`.
+
+    Example:
+    --------
+        >>> register_bucketed_table("/path/to/output/local_material")
+        'local_material'
+    """
+    spec_path = os.path.join(table_path, "_bucket_spec.json")
+    if not os.path.exists(spec_path):
+        raise FileNotFoundError(f"The file path '{spec_path}' does not exist.")
+
+    with open(spec_path) as spec_file:
+        bucket_spec = json.load(spec_file)
+
+    if spark is None:
+        spark = SparkSession.builder.getOrCreate()
+
+    table_name = table_name or bucket_spec["table"]
+    schema = T.StructType.fromJson(bucket_spec["schema"])
+    columns = ", ".join(
+        f"`{field.name}` {field.dataType.simpleString()}" for field in schema
+    )
+    partitioned = (
+        f"PARTITIONED BY ({', '.join(bucket_spec['partition_columns'])}) "
+        if bucket_spec["partition_columns"]
+        else ""
+    )
+
+    spark.sql(
+        f"CREATE TABLE IF NOT EXISTS {table_name} ({columns}) "
+        f"USING {bucket_spec['format']} {partitioned}"
+        f"CLUSTERED BY ({', '.join(bucket_spec['bucket_columns'])}) "
+        f"SORTED BY ({', '.join(bucket_spec['sort_columns'])}) "
+        f"INTO {bucket_spec['num_buckets']} BUCKETS "
+        f"LOCATION '{bucket_spec['path']}'"
+    )
+    if bucket_spec["partition_columns"]:
+        spark.sql(f"MSCK REPAIR TABLE {table_name}")
+
+    return table_name
+
+
+def write_output(
+    df: DataFrame,
+    output_dir: str,
+    file_name: str,
+    partition_by: Optional[list] = None,
+    bucket_by: Optional[list] = None,
+    num_buckets: int = DEFAULT_NUM_BUCKETS,
+    output_format: str = "csv",
+    sort_by: Optional[list] = None,
+    bloom_filter_columns: Optional[list] = None,
+):
+    """
+    Writes a pipeline output in the requested layout.
+
+    args:
+    -----
+        df (DataFrame): The DataFrame to be saved.
+        output_dir (str): The directory where the output will be saved.
+        file_name (str): The name of the output.
+        partition_by (Optional[list]): Columns to partition the output by.
+        bucket_by (Optional[list]): If given, the output is saved as a table bucketed and sorted by
+            these columns (see `save_df_as_bucketed_table`), otherwise in `output_format`.
+        num_buckets (int): Number of buckets of a bucketed output. Defaults to `DEFAULT_NUM_BUCKETS`.
+        output_format (str): 'csv' (see `save_df_as_csv`), 'parquet' (see `save_df_as_parquet`)
+            or 'arrow' (see `save_df_as_arrow`). Defaults to 'csv'.
+        sort_by (Optional[list]): Columns to sort a Parquet output by within the files.
+        bloom_filter_columns (Optional[list]): Columns to write Parquet Bloom filters for, in a
+            Parquet or bucketed output.
+
+    Raises:
+    -------
+        ValueError: If the output format is not supported, or an Arrow output is partitioned.
+
+    Example:
+    --------
+        >>> write_output(df, "/path/to/output", "local_material", bucket_by=["material_number", "plant"])
+    """
+    if output_format not in {"csv", "parquet", "arrow"}:
+        raise ValueError(
+            f"Unsupported output format '{output_format}'. Supported formats are: csv, parquet, arrow."
+        )
+    if output_format == "arrow" and (partition_by or bucket_by):
+        raise ValueError("Arrow outputs cannot be partitioned or bucketed.")
+
+    if bucket_by:
+        save_df_as_bucketed_table(
+            df,
+            output_dir,
+            file_name,
+            bucket_by,
+            num_buckets,
+            partition_by,
+            bloom_filter_columns=bloom_filter_columns,
+        )
+    elif output_format == "parquet":
+        save_df_as_parquet(
+            df, output_dir, file_name, partition_by, sort_by, bloom_filter_columns
+        )
+    elif output_format == "arrow":
+        save_df_as_arrow(df, output_dir, file_name)
+    else:
+        save_df_as_csv(df, output_dir, file_name, partition_by)
+
+
 def rename_and_select(df: DataFrame, mapping: dict, select: bool = True) -> DataFrame:
     """
     Method that takes a given df, applies a specific renaming mapping, and returns the new dataframe with the renamed
@@ -489,7 +1489,9 @@ def add_missing_columns(df, schema: T.StructType) -> DataFrame:
     return df
 
 
-def union_many(data_path: list[str], output_dir, file_name):
+def union_many(
+    data_path: list[str], output_dir, file_name, partition_by: Optional[list] = None
+):
     """
     This function reads multiple CSV files from specified paths,
     unions them into a single DataFrame, and saves the result as a CSV file.
@@ -498,6 +1500,7 @@ def union_many(data_path: list[str], output_dir, file_name):
     - data_path (list[str]): A list of file paths to the CSV files that need to be read and united.
     - output_dir (str): The directory where the final CSV file will be saved.
     - file_name (str): The name of the output CSV file.
+    - partition_by (Optional[list]): Columns to write a partitioned output by (see `save_df_as_csv`).
 
     Returns:
     None
@@ -527,4 +1530,4 @@ def union_many(data_path: list[str], output_dir, file_name):
             )  # Combine current DataFrame with the union so far
 
     # Save the final united DataFrame as a CSV file to the specified output directory
-    save_df_as_csv(union_df, output_dir, file_name)
+    save_df_as_csv(union_df, output_dir, file_name, partition_by)
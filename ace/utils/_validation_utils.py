@@ -0,0 +1,369 @@
+"""
+Pre-ingestion Validation of the CSV Extracts
+
+Spark only reports broken extracts after it has parsed them, and some defects do not fail at
+all: a header starting with a UTF-8 byte order mark (`\\ufeffMANDT`) or padded with spaces
+yields column names that silently stop matching in joins, and ragged rows shift or drop values.
+This module checks every extract in a single streaming pass over its memory-mapped bytes before
+Spark reads it, and the files are validated in parallel processes.
+
+Checks and fixes:
+-----------------
+1. The header is normalised: the byte order mark, surrounding whitespace and quotes of the
+   column names are removed. Empty or duplicate column names fail the file.
+2. Every row must have as many fields as the header and balanced quotes (the extracts are read
+   line by line, so a quoted line break splits a record). Bad rows are moved to a quarantine file
+   with their line numbers.
+
+A file that needs no fix is hard linked (or copied) into the validated directory unchanged;
+otherwise a cleaned copy is written in the same pass. Compressed and columnar extracts cannot be
+memory mapped and are passed through as they are; Spark's corrupt record handling still applies
+to them (see `read_table`).
+
+Example usage:
+--------------
+>>> validated_dir = validate_extracts("/path/to/system_1", "/path/to/validated/system_1")
+>>> registry = TableRegistry.from_directory(validated_dir)
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local imports
+import csv
+import io
+import json
+import mmap
+import multiprocessing
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+# Custom utils imports
+from ace.schemas import CHUNK_SUFFIX_PATTERN
+from ace.utils._use_case_utils import (
+    _split_extension,
+    discover_table_files,
+    process_data,
+)
+
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def _link_or_copy(source: str, target: str) -> None:
+    """
+    Hard links a file to the target path, or copies it if the file system cannot link.
+    """
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def _normalise_header(header: bytes, delimiter: str, encoding: str) -> list:
+    """
+    Parses a header line and strips the byte order mark, whitespace and quotes of the names.
+
+    Raises:
+    -------
+    ValueError
+        If a column name is empty or duplicated.
+    """
+    if header.startswith(UTF8_BOM):
+        header = header[len(UTF8_BOM) :]
+
+    names = next(csv.reader([header.decode(encoding)], delimiter=delimiter))
+    names = [name.strip().strip('"').strip() for name in names]
+
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if "" in names or duplicates:
+        raise ValueError(
+            f"Invalid header: empty column names or duplicates {duplicates} in {names}."
+        )
+
+    return names
+
+
+def _field_count(line: bytes, delimiter: str, encoding: str) -> Optional[int]:
+    """
+    Counts the fields of a line, or returns None if its quotes are unbalanced.
+    """
+    if b'"' not in line:
+        return line.count(delimiter.encode()) + 1
+    if line.count(b'"') % 2:
+        return None
+
+    return len(
+        next(csv.reader([line.decode(encoding, errors="replace")], delimiter=delimiter))
+    )
+
+
+def validate_csv_file(
+    file_path: str,
+    validated_dir: str,
+    quarantine_dir: str,
+    delimiter: str = ",",
+    encoding: str = "utf-8",
+) -> dict:
+    """
+    Validates one CSV extract in a single pass and writes it to the validated directory.
+
+    args:
+    -----
+    - file_path : str
+        The uncompressed CSV extract.
+    - validated_dir : str
+        Directory the validated (linked or cleaned) file is written to, under the same name.
+    - quarantine_dir : str
+        Directory of the quarantine files (`<file name>.quarantine.csv` with the columns
+        `line_number`, `field_count` and `line`).
+    - delimiter : str, optional
+        The field delimiter. Defaults to ','.
+    - encoding : str, optional
+        The encoding of the extract. Defaults to 'utf-8'.
+
+    Returns:
+    --------
+    dict
+        The file, its validated path, the status ('valid' or 'cleaned'), whether a byte order mark
+        was removed or the header changed, the number of rows, the number of quarantined rows and
+        the quarantine file (or None).
+
+    Raises:
+    -------
+    ValueError
+        If the file is empty or its header is invalid.
+    """
+    file_name = os.path.basename(file_path)
+    validated_path = os.path.join(validated_dir, file_name)
+    quarantine_path = os.path.join(quarantine_dir, f"{file_name}.quarantine.csv")
+
+    if os.path.getsize(file_path) == 0:
+        raise ValueError(f"The extract '{file_path}' is empty.")
+
+    with open(file_path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        size = len(data)
+        header_end = data.find(b"\n")
+        header_end = size if header_end == -1 else header_end + 1
+        header = data[:header_end].rstrip(b"\r\n")
+
+        try:
+            names = _normalise_header(header, delimiter, encoding)
+        except ValueError as error:
+            raise ValueError(f"{file_path}: {error}") from None
+
+        buffer = io.StringIO()
+        csv.writer(buffer, delimiter=delimiter, lineterminator="\n").writerow(names)
+        clean_header = buffer.getvalue().encode(encoding)
+        header_changed = clean_header.rstrip(b"\n") != header
+
+        clean_file = quarantine_file = quarantine_writer = None
+        copied_until = header_end
+        rows = bad_rows = 0
+        line_number, offset = 1, header_end
+        try:
+            if header_changed:
+                clean_file = open(validated_path + ".tmp", "wb")
+                clean_file.write(clean_header)
+
+            # Stream the lines; good lines are copied in bulk up to the next bad line
+            while offset < size:
+                line_end = data.find(b"\n", offset)
+                line_end = size if line_end == -1 else line_end + 1
+                line = data[offset:line_end].rstrip(b"\r\n")
+                line_number += 1
+
+                if line:
+                    rows += 1
+                    field_count = _field_count(line, delimiter, encoding)
+                    if field_count != len(names):
+                        if clean_file is None:
+                            clean_file = open(validated_path + ".tmp", "wb")
+                            clean_file.write(data[:copied_until])
+                        if quarantine_writer is None:
+                            quarantine_file = open(
+                                quarantine_path, "w", newline="", encoding=encoding
+                            )
+                            quarantine_writer = csv.writer(quarantine_file)
+                            quarantine_writer.writerow(
+                                ["line_number", "field_count", "line"]
+                            )
+                        clean_file.write(data[copied_until:offset])
+                        copied_until = line_end
+                        quarantine_writer.writerow(
+                            [
+                                line_number,
+                                field_count,
+                                line.decode(encoding, errors="replace"),
+                            ]
+                        )
+                        bad_rows += 1
+
+                offset = line_end
+
+            if clean_file is not None:
+                clean_file.write(data[copied_until:size])
+        finally:
+            if clean_file is not None:
+                clean_file.close()
+            if quarantine_file is not None:
+                quarantine_file.close()
+
+    if clean_file is not None:
+        os.replace(validated_path + ".tmp", validated_path)
+    else:
+        _link_or_copy(file_path, validated_path)
+
+    return {
+        "file": file_path,
+        "validated_path": validated_path,
+        "status": "valid" if clean_file is None else "cleaned",
+        "bom_removed": header.startswith(UTF8_BOM),
+        "header_changed": header_changed,
+        "rows": rows,
+        "quarantined_rows": bad_rows,
+        "quarantine_path": quarantine_path if bad_rows else None,
+    }
+
+
+def _remove_stale_extracts(
+    validated_dir: str, quarantine_dir: str, file_names: set, tables: Optional[list]
+) -> None:
+    """
+    Removes the validated extracts and quarantine files of earlier runs, so a chunk that is no
+    longer extracted (e.g. `PRD_MARC_0003.csv`) is not read with today's chunks of its table.
+    Only the files of the given tables are touched; other pipelines may share the directory.
+    """
+    for base_name, file_paths in discover_table_files(validated_dir).items():
+        if tables is not None and base_name.split("_")[-1] not in tables:
+            continue
+        for file_path in file_paths:
+            if os.path.basename(file_path) in file_names:
+                continue
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+            else:
+                os.remove(file_path)
+
+    # Quarantine files are rewritten for the extracts that still have bad rows
+    for file_name in os.listdir(quarantine_dir):
+        if not file_name.endswith(".quarantine.csv"):
+            continue
+        stem, _ = _split_extension(file_name[: -len(".quarantine.csv")])
+        table = re.sub(CHUNK_SUFFIX_PATTERN, "", stem).split("_")[-1]
+        if tables is None or table in tables:
+            os.remove(os.path.join(quarantine_dir, file_name))
+
+
+def validate_extracts(
+    data_dir: str,
+    validated_dir: str,
+    quarantine_dir: Optional[str] = None,
+    tables: Optional[list] = None,
+    max_workers: Optional[int] = None,
+    report_path: Optional[str] = None,
+) -> str:
+    """
+    Validates the extracts of a directory in parallel processes before Spark reads them.
+
+    The uncompressed CSV extracts are validated with `validate_csv_file`; all other extracts are
+    linked into the validated directory unchanged. Chunked tables keep their file names, so the
+    validated directory is read exactly like the original one. Validated extracts and quarantine
+    files of the same tables that earlier runs left behind are removed first.
+
+    args:
+    -----
+    - data_dir : str
+        Directory containing the extracts.
+    - validated_dir : str
+        Directory the validated extracts are written to.
+    - quarantine_dir : str, optional
+        Directory of the quarantine files. Defaults to `<validated_dir>/_quarantine`.
+    - tables : list, optional
+        SAP table names to validate. Defaults to all tables of the directory.
+    - max_workers : int, optional
+        Number of validation processes. Defaults to the number of CPUs. The processes are
+        spawned, so a calling script needs an `if __name__ == "__main__":` guard.
+    - report_path : str, optional
+        If given, the validation results are written to this JSON file.
+
+    Returns:
+    --------
+    str
+        The validated directory, to be read like the original data directory.
+
+    Raises:
+    -------
+    ValueError
+        If an extract is empty or has an invalid header.
+    """
+    # Check input parameters
+    process_data(string_check=validated_dir)
+    if os.path.abspath(validated_dir) == os.path.abspath(data_dir):
+        raise ValueError("The validated directory must differ from the data directory.")
+
+    if quarantine_dir is None:
+        quarantine_dir = os.path.join(validated_dir, "_quarantine")
+    os.makedirs(validated_dir, exist_ok=True)
+    os.makedirs(quarantine_dir, exist_ok=True)
+
+    table_files = [
+        file_path
+        for base_name, file_paths in discover_table_files(data_dir).items()
+        if tables is None or base_name.split("_")[-1] in tables
+        for file_path in file_paths
+    ]
+    _remove_stale_extracts(
+        validated_dir,
+        quarantine_dir,
+        {os.path.basename(file_path) for file_path in table_files},
+        tables,
+    )
+
+    csv_files = []
+    for file_path in table_files:
+        if os.path.isfile(file_path) and file_path.endswith(".csv"):
+            csv_files.append(file_path)
+        elif os.path.isdir(file_path):
+            target = os.path.join(validated_dir, os.path.basename(file_path))
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.copytree(file_path, target, copy_function=_link_or_copy)
+        else:
+            _link_or_copy(
+                file_path,
+                os.path.join(validated_dir, os.path.basename(file_path)),
+            )
+
+    arguments = [(path, validated_dir, quarantine_dir) for path in csv_files]
+    if len(csv_files) > 1 and max_workers != 1:
+        # Spawned workers do not inherit the threads of the Spark driver
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            results = list(executor.map(validate_csv_file, *zip(*arguments)))
+    else:
+        results = [validate_csv_file(*argument) for argument in arguments]
+
+    for result in results:
+        if result["quarantined_rows"]:
+            print(
+                f"Quarantined {result['quarantined_rows']} of {result['rows']} rows of "
+                f"{result['file']} to {result['quarantine_path']}"
+            )
+
+    if report_path:
+        os.makedirs(os.path.dirname(os.path.abspath(report_path)), exist_ok=True)
+        with open(report_path, "w") as report_file:
+            json.dump(results, report_file, indent=2)
+
+    return validated_dir
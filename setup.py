@@ -4,5 +4,5 @@ setup(
     name="Use Case Study",
     version="0.1",
     packages=find_packages(),
-    install_requires=[],
+    install_requires=["pyspark>=3.5"],
 )
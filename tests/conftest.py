@@ -1,5 +1,5 @@
 """
-This script defines the constants used throughout the project. Constants are grouped and defined 
+This script defines the constants used throughout the project. Constants are grouped and defined
 to ensure consistent usage across multiple modules and to centralize configuration parameters.
 
 Purpose:
@@ -10,7 +10,7 @@ Purpose:
 Contents:
     - File Paths: Constants for various input/output file paths used in the project.
     - Schema Definitions: Constants for DataFrame schemas to ensure consistency across data processing steps.
-    - Configuration Parameters: Constants for application settings, such as default values, 
+    - Configuration Parameters: Constants for application settings, such as default values,
       thresholds, or environment-specific settings.
     - System Identifiers: Constants for system names, codes, or other identifiers used in the project.
 
@@ -28,6 +28,7 @@ Date:
 import os
 
 # Pyspark imports
+import pyspark.sql.functions as F
 import pyspark.sql.types as T
 import pytest
 from pyspark.sql import SparkSession
@@ -230,3 +231,91 @@ def add_missing_columns_schema():
         ]
     )
     return schema
+
+
+@pytest.fixture
+def primary_key_input(spark_session):
+    """Fixture with the columns needed to derive local material primary keys."""
+    df = spark_session.createDataFrame(
+        data=[
+            ("SYS1", "MAT1", "PLANT1"),
+            ("SYS1", "MAT2", "PLANT1"),
+            ("SYS2", "MAT1", "PLANT1"),
+        ],
+        schema=["SOURCE_SYSTEM_ERP", "MATNR", "WERKS"],
+    )
+    return df
+
+
+@pytest.fixture
+def hex_identifier_tables(spark_session):
+    """Fixture with two small tables keyed by SHA-256 hex identifiers."""
+    system = "a" * 64
+    marc = spark_session.createDataFrame(
+        data=[(system, "1" * 64, "2" * 64), (system, "3" * 64, "2" * 64)],
+        schema=["SOURCE_SYSTEM_ERP", "MATNR", "WERKS"],
+    )
+    mara = spark_session.createDataFrame(
+        data=[(system, "1" * 64, "ARCHIVE"), (system, "not-a-hash", None)],
+        schema=["SOURCE_SYSTEM_ERP", "MATNR", "BISMT"],
+    )
+    return {"PRE_MARC": marc, "PRE_MARA": mara}
+
+
+@pytest.fixture
+def quality_input(spark_session):
+    """Fixture with a null, a duplicate key and an out of range value."""
+    df = spark_session.createDataFrame(
+        data=[
+            ("M1", "P1", 10.0),
+            ("M1", "P1", -1.0),
+            (None, "P2", 5.0),
+            ("M3", "P3", 1.0),
+        ],
+        schema=["MATNR", "WERKS", "STPRS"],
+    )
+    return df
+
+
+@pytest.fixture
+def fanout_tables(spark_session):
+    """Fixture with a driving table and a lookup table with a duplicated key."""
+    marc = spark_session.createDataFrame(
+        data=[("M1", "P1"), ("M1", "P2"), ("M2", "P1"), ("M3", "P1")],
+        schema=["MATNR", "WERKS"],
+    )
+    mara = spark_session.createDataFrame(
+        data=[("M1", "100"), ("M1", "200"), ("M1", "300"), ("M2", "100")],
+        schema=["MATNR", "MANDT"],
+    )
+    return marc, mara
+
+
+@pytest.fixture
+def process_order_kpi_input(spark_session):
+    """Fixture with integrated order rows covering every late delivery bucket."""
+    df = spark_session.createDataFrame(
+        data=[
+            ("S1", "O1", "1", "P1", "K1", "2024-01-10", "2024-01-10", "2024-01-01"),
+            ("S1", "O2", "1", "P1", None, "2024-01-13", "2024-01-10", "2024-01-01"),
+            ("S1", "O3", "1", "P1", None, "2024-01-18", "2024-01-10", None),
+            ("S1", "O4", "1", "P1", None, "2024-02-10", "2024-01-10", None),
+            ("S1", "O5", "1", "P1", None, None, "2024-01-10", None),
+        ],
+        schema=[
+            "SOURCE_SYSTEM_ERP",
+            "AUFNR",
+            "POSNR",
+            "DWERK",
+            "KDAUF",
+            "ZZGLTRP_ORIG",
+            "LTRMI",
+            "GSTRI",
+        ],
+    )
+    return df.select(
+        *[
+            F.to_date(c).alias(c) if c in ("ZZGLTRP_ORIG", "LTRMI", "GSTRI") else c
+            for c in df.columns
+        ]
+    )
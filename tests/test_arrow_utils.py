@@ -0,0 +1,88 @@
+"""
+This script contains unit tests for the Arrow export of the pipeline outputs.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - pyarrow, pandas: Needed by the Arrow conversion of PySpark; the tests are skipped without them.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    read_arrow_batches,
+    save_df_as_arrow,
+    to_arrow_batches,
+    to_arrow_table,
+    write_output,
+)
+
+# The Arrow conversion of PySpark needs pyarrow and pandas
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("pandas")
+
+
+@pytest.fixture
+def materials(spark_session):
+    """Fixture with material numbers and prices spread over 3 partitions."""
+    return spark_session.range(0, 300, 1, 3).selectExpr(
+        "concat('M', cast(id as string)) as material_number",
+        "cast(id as double) / 4 as standard_price",
+    )
+
+
+class TestArrowExport:
+    def test_collected_and_spilled_batches(self, materials, tmp_path):
+        "Collected and spilled batches hold the same rows; spilled files are memory-mapped."
+        table = to_arrow_table(materials)
+        assert table.schema.names == ["material_number", "standard_price"]
+        assert table.num_rows == 300
+
+        spill_dir = str(tmp_path / "spill")
+        spilled = pa.Table.from_batches(list(to_arrow_batches(materials, spill_dir)))
+        assert spilled.sort_by("material_number").equals(
+            table.sort_by("material_number")
+        )
+        assert pa.Table.from_batches(list(to_arrow_batches(materials))).equals(table)
+        assert to_arrow_table(materials.limit(0)).schema.names == materials.columns
+
+        # Memory-mapped batches are not copied into Arrow's memory pool
+        allocated_bytes = pa.total_allocated_bytes()
+        batches = list(read_arrow_batches(spill_dir))
+        assert sum(batch.num_rows for batch in batches) == 300
+        assert pa.total_allocated_bytes() == allocated_bytes
+
+    def test_arrow_output(self, materials, tmp_path):
+        "An Arrow output has one IPC file per partition, or one empty file with the schema."
+        file_paths = save_df_as_arrow(materials, str(tmp_path), "local_material.csv")
+        assert [path.rsplit("/", 1)[1] for path in file_paths] == [
+            "part-00000.arrow",
+            "part-00001.arrow",
+            "part-00002.arrow",
+        ]
+        assert sum(b.num_rows for b in read_arrow_batches(file_paths[1])) == 100
+
+        write_output(materials.limit(0), str(tmp_path), "empty", output_format="arrow")
+        empty = pa.ipc.open_file(
+            str(tmp_path / "empty" / "part-00000.arrow")
+        ).read_all()
+        assert empty.num_rows == 0 and empty.schema.names == materials.columns
+
+        with pytest.raises(ValueError, match="cannot be partitioned"):
+            write_output(
+                materials,
+                str(tmp_path),
+                "out",
+                ["material_number"],
+                output_format="arrow",
+            )
+        with pytest.raises(FileNotFoundError, match="No Arrow IPC files"):
+            read_arrow_batches(str(tmp_path / "missing"))
@@ -0,0 +1,75 @@
+"""
+This script contains unit tests for the row attrition tracking of the prep steps.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import json
+
+# Custome utils (need to test)
+from ace.utils import AttritionTracker, prep_material_valuation
+
+MBEW_COLUMNS = (
+    "MANDT string, MATNR string, BWKEY string, LVORM string, BWTAR string, "
+    "LAEPR string, VPRSV string, VERPR double, STPRS double, PEINH int, BKLAS string"
+)
+
+
+class TestAttritionTracker:
+    def test_mbew_funnel(self, spark_session, tmp_path):
+        "Every filter and deduplication of the MBEW prep is counted in one action."
+        mbew = spark_session.createDataFrame(
+            [
+                ("100", "M1", "B1", None, None, "2024-01-01", "S", 1.0, 1.0, 1, "C"),
+                ("100", "M1", "B1", None, None, "2024-02-01", "S", 1.0, 1.0, 1, "C"),
+                ("100", "M2", "B1", "X", None, "2024-01-01", "S", 1.0, 1.0, 1, "C"),
+                ("100", "M3", "B1", None, "SPLIT", "2024-01-01", "S", 1.0, 1.0, 1, "C"),
+                ("100", "M4", "B1", None, None, "2024-01-01", "S", 1.0, 1.0, 1, "C"),
+            ],
+            MBEW_COLUMNS,
+        )
+        attrition = AttritionTracker()
+
+        prepared = prep_material_valuation(mbew, attrition)
+        assert prepared.count() == 2
+        attrition.executed(prepared)
+
+        report_path = str(tmp_path / "attrition.json")
+        funnel = attrition.write_report(report_path)
+
+        assert [(c["step"], c["rows"], c["dropped"]) for c in funnel] == [
+            ("input", 5, None),
+            ("material_not_deleted", 4, 1),
+            ("no_split_valuation", 3, 1),
+            ("highest_evaluated_price", 2, 1),
+            ("drop_duplicates", 2, 0),
+        ]
+        with open(report_path) as report_file:
+            assert json.load(report_file) == funnel
+
+    def test_unevaluated_and_disabled(self, spark_session):
+        "Checkpoints that no action evaluated have no count; a disabled tracker adds none."
+        df = spark_session.range(3)
+
+        attrition = AttritionTracker()
+        tracked = attrition.track(df, "T", "input")
+        attrition.track(df.filter("id > 0"), "T", "positive")
+        assert tracked.count() == 3
+        attrition.executed(tracked)
+        assert attrition.funnel() == [
+            {"table": "T", "step": "input", "rows": 3, "dropped": None},
+            {"table": "T", "step": "positive", "rows": None, "dropped": None},
+        ]
+
+        disabled = AttritionTracker(enabled=False)
+        assert disabled.track(df, "T", "input") is df
+        assert disabled.funnel() == []
@@ -0,0 +1,280 @@
+"""
+This script contains unit tests for the business transformation functions of the project.
+The tests ensure that the SAP specific derivations behave as expected on small synthetic
+datasets, including edge cases.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Usage:
+    Run this script with a test runner (e.g., pytest) to validate the business functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import json
+import time
+
+import pyspark.sql.functions as F
+import pyspark.sql.types as T
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    build_on_time_kpi_cube,
+    compare_dataframes,
+    derive_surrogate_key,
+    detect_surrogate_key_collisions,
+    post_prep_process_order,
+    refresh_on_time_kpi_cube,
+    report_surrogate_key_collisions,
+)
+from ace.utils._business_utils import derive_intra_and_inter_primary_key
+
+
+class TestSurrogateKeys:
+    def test_surrogate_keys_are_derived(self, primary_key_input):
+        "Surrogate keys are 64-bit and follow the readable keys."
+        result = derive_intra_and_inter_primary_key(
+            primary_key_input, with_surrogate_keys=True
+        )
+        assert dict(result.dtypes)["surrogate_key_intra"] == "bigint"
+        assert dict(result.dtypes)["surrogate_key_inter"] == "bigint"
+
+        rows = result.collect()
+        # Same readable intra key (MAT1-PLANT1) in both systems gives the same surrogate key
+        intra = {row.primary_key_intra: row.surrogate_key_intra for row in rows}
+        assert len(intra) == 2
+        assert len({row.surrogate_key_inter for row in rows}) == 3
+
+    def test_surrogate_keys_are_optional(self, primary_key_input):
+        "Surrogate keys are not derived by default."
+        result = derive_intra_and_inter_primary_key(primary_key_input)
+        assert "surrogate_key_intra" not in result.columns
+
+    def test_no_collisions(self, primary_key_input):
+        "Distinct readable keys do not collide."
+        result = derive_intra_and_inter_primary_key(
+            primary_key_input, with_surrogate_keys=True
+        )
+        assert report_surrogate_key_collisions(result) == {
+            "surrogate_key_intra": 0,
+            "surrogate_key_inter": 0,
+        }
+
+    def test_collisions_are_detected(self, primary_key_input):
+        "A forced collision is reported and can fail the run."
+        df = derive_surrogate_key(primary_key_input, "MATNR", "surrogate")
+        df = df.withColumn("surrogate", F.lit(1).cast("long"))
+
+        collisions = detect_surrogate_key_collisions(df, "MATNR", "surrogate")
+        assert collisions.collect()[0].no_of_keys == 2
+
+        with pytest.raises(ValueError, match="Surrogate key collisions detected"):
+            report_surrogate_key_collisions(
+                df, {"MATNR": "surrogate"}, raise_on_collision=True
+            )
+
+    def test_collisions_are_reported_per_key_pair(self, primary_key_input):
+        "All key pairs are checked together and reported separately."
+        df = derive_surrogate_key(primary_key_input, "MATNR", "surrogate")
+        df = df.withColumn("forced", F.lit(1).cast("long"))
+
+        assert report_surrogate_key_collisions(
+            df, {"MATNR": "surrogate", "SOURCE_SYSTEM_ERP": "forced"}
+        ) == {"surrogate": 0, "forced": 1}
+
+    def test_collision_report_is_written(self, spark_session, tmp_path):
+        "All collisions are counted, but only the first examples are collected and written."
+        df = spark_session.createDataFrame(
+            data=[("A", 1), ("B", 1), ("C", 2), ("D", 2), ("E", 3)],
+            schema=["key", "surrogate"],
+        )
+        report_path = tmp_path / "reports" / "collisions.json"
+
+        assert report_surrogate_key_collisions(
+            df, {"key": "surrogate"}, report_path=str(report_path), max_examples=1
+        ) == {"surrogate": 2}
+        assert json.loads(report_path.read_text()) == {
+            "surrogate": {
+                "collisions": 2,
+                "examples": [{"surrogate_key": 1, "keys": ["A", "B"]}],
+            }
+        }
+
+
+def _chained_process_order_kpis(df):
+    "The former one-`withColumn`-per-KPI derivation, kept as the benchmark reference."
+    df = df.withColumn("primary_key_intra", F.concat_ws("_", "AUFNR", "POSNR", "DWERK"))
+    df = df.withColumn(
+        "primary_key_inter",
+        F.concat_ws("_", "SOURCE_SYSTEM_ERP", "AUFNR", "POSNR", "DWERK"),
+    )
+    df = df.withColumn(
+        "on_time_flag",
+        F.when(F.col("ZZGLTRP_ORIG") >= F.col("LTRMI"), 1)
+        .when(F.col("ZZGLTRP_ORIG") < F.col("LTRMI"), 0)
+        .otherwise(None),
+    )
+    df = df.withColumn(
+        "actual_on_time_deviation", F.datediff(F.col("ZZGLTRP_ORIG"), F.col("LTRMI"))
+    )
+    df = df.withColumn(
+        "late_delivery_bucket",
+        F.when(F.col("actual_on_time_deviation") <= 0, "On-Time")
+        .when(F.col("actual_on_time_deviation").between(1, 5), "Slightly Late")
+        .when(F.col("actual_on_time_deviation").between(6, 10), "Moderately Late")
+        .otherwise("Severely Late"),
+    )
+    df = df.withColumn(
+        "mto_vs_mts_flag", F.when(F.col("KDAUF").isNotNull(), "MTO").otherwise("MTS")
+    )
+    df = df.withColumn(
+        "order_finish_timestamp", F.to_timestamp(df["LTRMI"], "yyyy-MM-dd")
+    )
+    df = df.withColumn(
+        "order_start_timestamp", F.to_timestamp(df["GSTRI"], "yyyy-MM-dd")
+    )
+    return df
+
+
+class TestProcessOrderKpis:
+    def test_kpis(self, process_order_kpi_input):
+        "Every bucket is reached and unknown deviations are severely late."
+        rows = (
+            post_prep_process_order(process_order_kpi_input).orderBy("AUFNR").collect()
+        )
+
+        assert [row.late_delivery_bucket for row in rows] == [
+            "On-Time",
+            "Slightly Late",
+            "Moderately Late",
+            "Severely Late",
+            "Severely Late",
+        ]
+        assert [row.on_time_flag for row in rows] == [1, 1, 1, 1, None]
+        assert [row.mto_vs_mts_flag for row in rows] == ["MTO"] + ["MTS"] * 4
+        assert rows[0].primary_key_inter == "S1_O1_1_P1"
+
+    def test_configurable_buckets(self, process_order_kpi_input):
+        "The bucket thresholds can be configured."
+        result = post_prep_process_order(
+            process_order_kpi_input, late_delivery_buckets=[(5, "Acceptable")]
+        )
+        buckets = [
+            row.late_delivery_bucket for row in result.orderBy("AUFNR").collect()
+        ]
+        assert buckets == ["Acceptable"] * 2 + ["Severely Late"] * 3
+
+    def test_kpi_cube(self, process_order_kpi_input):
+        "The cube holds one row per dimension combination with counts, sums and percentiles."
+        output = (
+            post_prep_process_order(process_order_kpi_input)
+            .withColumnRenamed("DWERK", "plant")
+            .withColumn("order_type", F.lit("PP01"))
+            .withColumn("start_date", F.to_date(F.lit("2024-01-01")))
+            .withColumn("system_name", F.lit("system_1"))
+        )
+        rows = build_on_time_kpi_cube(output).orderBy("mto_vs_mts_flag").collect()
+
+        assert [(row.start_date_month, row.mto_vs_mts_flag) for row in rows] == [
+            ("2024-01", "MTO"),
+            ("2024-01", "MTS"),
+        ]
+        mts = rows[1].asDict()
+        assert mts["order_count"] == 4 and mts["on_time_count"] == 3
+        assert mts["deviation_count"] == 3 and mts["deviation_sum"] == 42.0
+        assert mts["deviation_p50"] == 8.0 and mts["deviation_max"] == 31.0
+        assert mts["bucket_slightly_late"] == mts["bucket_moderately_late"] == 1
+        assert mts["bucket_severely_late"] == 2 and mts["bucket_on_time"] == 0
+
+    def test_kpi_cube_refresh(self, spark_session, process_order_kpi_input, tmp_path):
+        "A run on some orders re-aggregates their months from all orders of the months."
+        output = (
+            post_prep_process_order(process_order_kpi_input)
+            .withColumnRenamed("DWERK", "plant")
+            .withColumn("order_type", F.lit("PP01"))
+            .withColumn(
+                "start_date",
+                F.when(
+                    F.col("AUFNR") == "O1", F.to_date(F.lit("2024-02-01"))
+                ).otherwise(F.to_date(F.lit("2024-01-01"))),
+            )
+            .withColumn("system_name", F.lit("system_1"))
+        )
+        cube_dir = str(tmp_path / "cube")
+
+        def order_counts():
+            cube = spark_session.read.option("header", "true").csv(
+                f"{cube_dir}/on_time_kpi_cube"
+            )
+            rows = cube.groupBy("start_date_month").agg(
+                F.sum("order_count").alias("orders")
+            )
+            return {row.start_date_month: row.orders for row in rows.collect()}
+
+        assert refresh_on_time_kpi_cube(output, cube_dir) == [
+            ("system_1", "2024-01"),
+            ("system_1", "2024-02"),
+        ]
+        assert order_counts() == {"2024-01": 4, "2024-02": 1}
+
+        # A delta run with one changed order keeps the other orders of its month
+        delta = output.filter(F.col("AUFNR") == "O2")
+        assert refresh_on_time_kpi_cube(delta, cube_dir) == [("system_1", "2024-01")]
+        assert order_counts() == {"2024-01": 4, "2024-02": 1}
+
+        # An order that moves to another month leaves its former month
+        moved = output.filter(F.col("AUFNR") == "O1").withColumn(
+            "start_date", F.to_date(F.lit("2024-01-01"))
+        )
+        assert refresh_on_time_kpi_cube(moved, cube_dir) == [
+            ("system_1", "2024-01"),
+            ("system_1", "2024-02"),
+        ]
+        assert order_counts() == {"2024-01": 5}
+
+    @pytest.mark.compare
+    def test_fused_projection_benchmark(self, process_order_kpi_input):
+        "The fused projection matches the chained derivation; the timings of both are printed."
+        df = process_order_kpi_input.crossJoin(
+            process_order_kpi_input.sparkSession.range(200000).select(
+                F.col("id").alias("row_id")
+            )
+        )
+
+        timings = {}
+        results = {}
+        for name, derive in [
+            ("chained", _chained_process_order_kpis),
+            ("fused", post_prep_process_order),
+        ]:
+            start = time.perf_counter()
+            result = derive(df)
+            result._jdf.queryExecution().executedPlan()
+            analysis = time.perf_counter() - start
+
+            start = time.perf_counter()
+            result.write.format("noop").mode("overwrite").save()
+            timings[name] = (analysis, time.perf_counter() - start)
+            results[name] = result
+
+        print(
+            "analysis/execution seconds: "
+            f"chained={timings['chained'][0]:.3f}/{timings['chained'][1]:.3f}, "
+            f"fused={timings['fused'][0]:.3f}/{timings['fused'][1]:.3f}"
+        )
+        chained = results["chained"].withColumn(
+            "order_finish_timestamp",
+            F.col("order_finish_timestamp").cast(T.TimestampType()),
+        )
+        compare_dataframes(
+            chained.select(results["fused"].columns).filter(F.col("row_id") < 10),
+            results["fused"].filter(F.col("row_id") < 10),
+        )
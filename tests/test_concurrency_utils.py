@@ -0,0 +1,142 @@
+"""
+This script contains unit tests for the table registry and the concurrent pipeline execution.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    TableRegistry,
+    estimated_size_bytes,
+    materialize_concurrently,
+    run_pipelines_concurrently,
+)
+
+
+class TestTableRegistry:
+    def test_register_and_lookup(self, valid_dataframe):
+        "Tables are looked up by name and missing tables are reported."
+        registry = TableRegistry({"MARA": valid_dataframe})
+        registry.register("MARC", valid_dataframe)
+
+        assert registry.names() == ["MARA", "MARC"]
+        assert "MARA" in registry and len(registry) == 2
+        assert registry["MARC"] is valid_dataframe
+
+        with pytest.raises(KeyError, match="Available tables"):
+            registry["MBEW"]
+
+    def test_tables_are_loaded_on_first_access(self, valid_dataframe):
+        "A loader runs once, on the first lookup of its table."
+        calls = []
+
+        def load_mara():
+            calls.append("MARA")
+            return valid_dataframe
+
+        registry = TableRegistry(loaders={"MARA": load_mara})
+        assert registry.names() == ["MARA"] and registry.loaded_names() == []
+        assert calls == []
+
+        assert registry["MARA"] is valid_dataframe
+        assert registry["MARA"] is valid_dataframe
+        assert calls == ["MARA"] and registry.loaded_names() == ["MARA"]
+
+    def test_from_directory_registers_required_tables(self, tmp_path):
+        "Only the declared tables are registered and a missing table is reported."
+        (tmp_path / "PRD_MARA.csv").write_text("MATNR\nM1\n")
+        (tmp_path / "PRD_MARC.csv").write_text("MATNR,WERKS\nM1,P1\n")
+        (tmp_path / "PRD_CDPOS.csv").write_text("not,read\n")
+
+        registry = TableRegistry.from_directory(str(tmp_path), tables=["MARA", "MARC"])
+        assert registry.names() == ["MARA", "MARC"]
+        assert registry.loaded_names() == []
+        assert registry["MARC"].count() == 1
+        assert registry.loaded_names() == ["MARC"]
+
+        with pytest.raises(FileNotFoundError, match="MBEW"):
+            TableRegistry.from_directory(str(tmp_path), tables=["MARA", "MBEW"])
+
+    def test_table_name(self):
+        "The SAP table name is the last part of the file name."
+        assert TableRegistry.table_name("PRE_MARA") == "MARA"
+        assert TableRegistry.table_name("PRD_T001W") == "T001W"
+
+
+class TestConcurrentPipelines:
+    def test_pipelines_run_in_own_pools(self, spark_session):
+        "Every pipeline runs its jobs in the scheduler pool named after it."
+
+        def pipeline(rows):
+            count = spark_session.range(rows).count()
+            pool = spark_session.sparkContext.getLocalProperty("spark.scheduler.pool")
+            return count, pool
+
+        results = run_pipelines_concurrently(
+            {"first": (pipeline, {"rows": 10}), "second": (pipeline, {"rows": 20})},
+            spark=spark_session,
+        )
+        assert results == {"first": (10, "first"), "second": (20, "second")}
+
+    def test_failures_are_raised(self, spark_session):
+        "A failing pipeline does not stop the others, and its error is raised."
+
+        def failing():
+            raise ValueError("broken extract")
+
+        with pytest.raises(ValueError, match="broken extract"):
+            run_pipelines_concurrently(
+                {"ok": (spark_session.range(5).count, {}), "failing": (failing, {})},
+                spark=spark_session,
+            )
+
+
+class TestConcurrentPreparation:
+    def test_materialize_concurrently(self, spark_session):
+        "Every table is persisted and materialised, whatever the degree of parallelism."
+        frames = {
+            "MBEW": spark_session.range(1000),
+            "T001": spark_session.range(10),
+            "T001W": spark_session.range(100),
+        }
+        prepared = materialize_concurrently(frames, max_workers=2, spark=spark_session)
+
+        assert list(prepared) == ["MBEW", "T001", "T001W"]
+        assert all(df.is_cached for df in prepared.values())
+        assert prepared["T001W"].count() == 100
+
+        for df in prepared.values():
+            df.unpersist()
+
+    def test_failed_materialization_unpersists_all(self, spark_session):
+        "If one table fails, the error is raised and no table stays cached."
+        frames = {
+            "T001": spark_session.range(10),
+            "MBEW": spark_session.range(10).selectExpr("raise_error('broken extract')"),
+        }
+        with pytest.raises(Exception, match="broken extract"):
+            materialize_concurrently(frames, max_workers=2, spark=spark_session)
+
+        assert not any(df.is_cached for df in frames.values())
+
+    def test_sizes_prefer_table_statistics(self, spark_session):
+        "Profiled sizes are used when available, plan estimates otherwise."
+        df = spark_session.range(10)
+        assert estimated_size_bytes(df, {"T001": {"size_bytes": 7}}, "T001") == 7
+        assert estimated_size_bytes(df) > 0
+
+    def test_invalid_parallelism(self, spark_session):
+        "At least one worker is needed."
+        with pytest.raises(ValueError, match="at least 1"):
+            materialize_concurrently({"T001": spark_session.range(1)}, max_workers=0)
@@ -0,0 +1,89 @@
+"""
+This script contains unit tests for the Parquet outputs laid out for data skipping.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import json
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    parquet_statistics_report,
+    save_df_as_parquet,
+    write_output,
+)
+
+
+@pytest.fixture
+def materials(spark_session):
+    """Fixture with unique material numbers in shuffled order and a low-cardinality plant."""
+    return spark_session.range(0, 4000, 1, 4).selectExpr(
+        "sha2(cast(id as string), 256) as material_number",
+        "concat('P', cast(id % 3 as string)) as plant",
+    )
+
+
+class TestParquetStatisticsReport:
+    def test_sorted_output_skips_files(self, spark_session, materials, tmp_path):
+        "Files of a sorted output cover disjoint key ranges and carry Bloom filters."
+        pytest.importorskip("pyarrow")
+        # Keep the 4 range partitions of the small test data apart
+        spark_session.conf.set("spark.sql.shuffle.partitions", 4)
+        spark_session.conf.set("spark.sql.adaptive.coalescePartitions.enabled", False)
+        try:
+            save_df_as_parquet(
+                materials,
+                str(tmp_path),
+                "sorted",
+                sort_by=["material_number"],
+                bloom_filter_columns=["material_number"],
+            )
+        finally:
+            spark_session.conf.unset("spark.sql.shuffle.partitions")
+            spark_session.conf.unset("spark.sql.adaptive.coalescePartitions.enabled")
+        write_output(materials, str(tmp_path), "unsorted", output_format="parquet")
+
+        report_path = str(tmp_path / "sorted_parquet_statistics.json")
+        sorted_report = parquet_statistics_report(
+            str(tmp_path / "sorted"), ["material_number", "plant"], report_path
+        )
+        unsorted_report = parquet_statistics_report(
+            str(tmp_path / "unsorted"), ["material_number"]
+        )
+
+        assert sorted_report["files"] == 4 and sorted_report["rows"] == 4000
+        material_number = sorted_report["columns"]["material_number"]
+        assert material_number["file_read_fraction"] == 0.25
+        assert material_number["null_count"] == 0
+        assert material_number["row_groups_with_bloom_filter"] == 4
+        # The plant column is dictionary encoded and gets no Bloom filter
+        assert sorted_report["columns"]["plant"]["row_groups_dictionary_encoded"] == 4
+        assert sorted_report["columns"]["plant"]["row_groups_with_bloom_filter"] == 0
+        assert unsorted_report["columns"]["material_number"]["file_read_fraction"] == 1
+        with open(report_path) as report_file:
+            assert json.load(report_file)["columns"]["plant"]["max"] == "P2"
+
+    def test_invalid_outputs(self, materials, tmp_path):
+        "Unknown formats, missing columns and outputs without Parquet files are rejected."
+        with pytest.raises(ValueError, match="output format"):
+            write_output(materials, str(tmp_path), "out", output_format="orc")
+        with pytest.raises(ValueError, match="do not exist"):
+            save_df_as_parquet(
+                materials, str(tmp_path), "out", sort_by=["order_number"]
+            )
+
+        # Outputs are only inspected with pyarrow
+        pytest.importorskip("pyarrow")
+        with pytest.raises(ValueError, match="No Parquet files"):
+            parquet_statistics_report(str(tmp_path / "missing"), ["plant"])
@@ -0,0 +1,122 @@
+"""
+This script contains unit tests for the run history store and the performance regression report.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import pytest
+
+from ace import perf_report_run
+
+# Custome utils (need to test)
+from ace.utils import (
+    detect_regressions,
+    load_run_history,
+    perf_report,
+    record_run,
+)
+
+
+def record_runs(history_path, durations, input_bytes=1_000_000):
+    "Records runs of one output with the given durations."
+    for i, duration in enumerate(durations):
+        record_run(
+            history_path,
+            "local_material",
+            "local_material_system_1",
+            1_700_000_000 + i * 3600,
+            duration,
+            system_name="system_1",
+            input_bytes={"PRD_MARA": input_bytes},
+            stage_timings={"integrate_data": duration / 2, "write_output": 1.0},
+            output_rows=100,
+            parameters={"partition_by": None},
+        )
+
+
+class TestRunHistory:
+    def test_runs_are_recorded(self, tmp_path):
+        "Runs are appended with their step timings and throughput."
+        history_path = str(tmp_path / "history" / "runs.sqlite")
+        record_runs(history_path, [10.0, 20.0])
+
+        runs = load_run_history(history_path, pipeline="local_material")
+        assert [run["run_id"] for run in runs] == [1, 2]
+        assert runs[0]["started_at"] == "2023-11-14T22:13:20+00:00"
+        assert runs[0]["input_table_bytes"] == {"PRD_MARA": 1_000_000}
+        assert runs[0]["stage_timings"] == {"integrate_data": 5.0, "write_output": 1.0}
+        assert runs[1]["bytes_per_second"] == 50_000
+        assert load_run_history(history_path, pipeline="process_order") == []
+
+        with pytest.raises(FileNotFoundError):
+            load_run_history(str(tmp_path / "missing.sqlite"))
+
+    def test_regressions_against_rolling_baseline(self, tmp_path):
+        "A run is flagged if its throughput drops more than the threshold below the baseline."
+        history_path = str(tmp_path / "runs.sqlite")
+        record_runs(history_path, [10.0, 11.0, 10.0, 10.5, 14.0])
+        # A larger input that takes proportionally longer is no regression
+        record_runs(history_path, [20.0], input_bytes=2_000_000)
+
+        runs = detect_regressions(load_run_history(history_path), window=3)
+        assert runs[0]["baseline_bytes_per_second"] is None
+        assert [run["regression"] for run in runs] == [False] * 4 + [True, False]
+        assert runs[4]["throughput_change"] == pytest.approx(10.5 / 14.0 - 1)
+
+        with pytest.raises(ValueError):
+            detect_regressions(runs, threshold=1.5)
+
+    def test_perf_report(self, tmp_path, capsys):
+        "The report lists the runs and the slower steps of each regression."
+        history_path = str(tmp_path / "runs.sqlite")
+        record_runs(history_path, [10.0, 10.0, 16.0])
+
+        regressions = perf_report(history_path)
+        output = capsys.readouterr().out
+
+        assert [run["run_id"] for run in regressions] == [3]
+        assert "local_material / local_material_system_1 (3 runs)" in output
+        assert "integrate_data: 8.0s (baseline 5.0s)" in output
+        assert "write_output" not in output.split("Regression in run 3")[1]
+
+        with pytest.raises(SystemExit):
+            perf_report_run([history_path, "--fail_on_regression"])
+
+    def test_only_latest_runs_fail_the_check(self, tmp_path):
+        "A regression that later runs recovered from does not fail the check."
+        history_path = str(tmp_path / "runs.sqlite")
+        record_runs(history_path, [10.0, 10.0, 16.0, 10.0])
+
+        assert [run["run_id"] for run in perf_report(history_path)] == [3]
+        assert perf_report(history_path, latest_only=True) == []
+        assert perf_report(history_path, limit=1) == []
+        perf_report_run([history_path, "--fail_on_regression"])
+
+    def test_plan_changing_runs_are_compared_separately(self, tmp_path, capsys):
+        "Runs with other plan changing parameters have their own baseline."
+        history_path = str(tmp_path / "runs.sqlite")
+        record_runs(history_path, [10.0, 10.0])
+        record_run(
+            history_path,
+            "local_material",
+            "local_material_system_1",
+            1_800_000_000,
+            16.0,
+            input_bytes={"PRD_MARA": 1_000_000},
+            parameters={"quality_checks": True, "validated_dir": "/tmp/validated"},
+        )
+
+        assert perf_report(history_path) == []
+        output = capsys.readouterr().out
+        assert "local_material_system_1 (2 runs)" in output
+        assert (
+            "local_material_system_1 (quality_checks, validated_dir) (1 runs)" in output
+        )
@@ -0,0 +1,96 @@
+"""
+This script contains unit tests for the point lookup indexes over the CSV outputs.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import os
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import LookupIndex, build_lookup_index
+
+OUTPUT_CSV = (
+    "primary_key_inter,material_number,description\n"
+    'K3,M1,"plain"\n'
+    'K1,M2,"quoted, with a comma and\na line break"\n'
+    'K2,M1,"escaped \\"quote\\""\n'
+    "K10,M3,\n"
+)
+
+
+class TestLookupIndex:
+    def test_lookup_single_output(self, tmp_path):
+        "Rows are found by key with quoted fields intact, also with several sorted runs."
+        output_path = tmp_path / "local_material.csv"
+        output_path.write_text(OUTPUT_CSV)
+
+        index_path = build_lookup_index(
+            str(output_path), "material_number", chunk_rows=2
+        )
+        assert index_path == str(tmp_path / "local_material.material_number.idx")
+
+        with LookupIndex(index_path) as index:
+            assert index.records == 4
+            assert [row["primary_key_inter"] for row in index.lookup("M1")] == [
+                "K3",
+                "K2",
+            ]
+            assert index.lookup("M1")[1]["description"] == 'escaped "quote"'
+            assert index.lookup("M2")[0]["description"] == (
+                "quoted, with a comma and\na line break"
+            )
+            assert index.lookup("M") == [] and index.lookup("M10000") == []
+            assert index.lookup_many(["M3", "M4"]) == {
+                "M3": [
+                    {
+                        "primary_key_inter": "K10",
+                        "material_number": "M3",
+                        "description": "",
+                    }
+                ],
+                "M4": [],
+            }
+
+    def test_lookup_partitioned_output(self, tmp_path):
+        "Part files of a partitioned output are indexed with their partition values."
+        for plant, rows in [("P1", "K1,M1\n"), ("P2", "K2,M2\nK3,M1\n")]:
+            part_dir = tmp_path / "local_material" / f"plant={plant}"
+            os.makedirs(part_dir)
+            (part_dir / "part-00000.csv").write_text(
+                "primary_key_inter,material_number\n" + rows
+            )
+            (part_dir / "part-00001.csv").write_text("")
+
+        index_path = build_lookup_index(
+            str(tmp_path / "local_material"), "material_number"
+        )
+
+        with LookupIndex(index_path) as index:
+            assert sorted(
+                (row["primary_key_inter"], row["plant"]) for row in index.lookup("M1")
+            ) == [("K1", "P1"), ("K3", "P2")]
+
+        with pytest.raises(ValueError, match="no column"):
+            build_lookup_index(str(tmp_path / "local_material"), "order_number")
+        with pytest.raises(ValueError, match="No CSV output"):
+            build_lookup_index(str(tmp_path / "missing"), "material_number")
+
+    def test_changed_output_is_rejected(self, tmp_path):
+        "An index is not opened once its output was rewritten after the build."
+        output_path = tmp_path / "local_material.csv"
+        output_path.write_text(OUTPUT_CSV)
+        index_path = build_lookup_index(str(output_path), "material_number")
+
+        output_path.write_text(OUTPUT_CSV.replace("K10,M3,\n", ""))
+        with pytest.raises(ValueError, match="changed after the index"):
+            LookupIndex(index_path)
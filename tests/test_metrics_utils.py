@@ -0,0 +1,97 @@
+"""
+This script contains unit tests for the collection of the Spark stage metrics per pipeline step.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import json
+
+import pyspark.sql.functions as F
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import StageMetricsCollector
+
+
+class TestStageMetricsCollector:
+    def test_stages_are_attributed_to_steps(self, spark_session, tmp_path):
+        "The Spark stages of a step are collected under its name, with their shuffle bytes."
+        if not spark_session.sparkContext.uiWebUrl:
+            pytest.skip("The Spark UI is disabled.")
+
+        metrics = StageMetricsCollector("test_run", spark=spark_session)
+        df = spark_session.range(0, 10000, 1, 4).withColumn("key", F.col("id") % 10)
+
+        with metrics.stage("aggregate"):
+            df.groupBy("key").count().collect()
+        with metrics.stage("count"):
+            df.count()
+        df.count()
+
+        summary_path = str(tmp_path / "metrics.json")
+        summary = metrics.write_summary(summary_path)
+
+        with open(summary_path) as summary_file:
+            assert json.load(summary_file) == summary
+
+        steps = {step["step"]: step for step in summary["steps"]}
+        assert list(steps) == ["aggregate", "count"]
+        assert steps["aggregate"]["spark_stages"] >= 2
+        assert steps["aggregate"]["shuffle_write_bytes"] > 0
+        assert summary["worst_offenders"]["shuffle"][0]["step"] == "aggregate"
+
+        # The job group of the caller is restored after each step
+        assert spark_session.sparkContext.getLocalProperty("spark.jobGroup.id") is None
+
+    def test_summary_flags_worst_offenders(self):
+        "Skewed, spilling and GC-heavy stages are flagged."
+        metrics = StageMetricsCollector("test_run", enabled=False)
+
+        def stage(stage_id, median_ms, max_ms, spilled=0, gc_ms=0):
+            return {
+                "step": "integrate_data",
+                "stage_id": stage_id,
+                "name": f"stage {stage_id}",
+                "tasks": 4,
+                "executor_run_time_ms": 1000,
+                "jvm_gc_time_ms": gc_ms,
+                "input_bytes": 0,
+                "output_bytes": 0,
+                "shuffle_read_bytes": 10,
+                "shuffle_write_bytes": 0,
+                "memory_spilled_bytes": spilled,
+                "disk_spilled_bytes": 0,
+                "median_task_ms": median_ms,
+                "max_task_ms": max_ms,
+            }
+
+        summary = metrics.summarize(
+            [stage(1, 100, 900, spilled=64), stage(2, 100, 120, gc_ms=500)]
+        )
+
+        assert summary["steps"][0]["spill_bytes"] == 64
+        assert summary["steps"][0]["max_skew"] == 9.0
+        offenders = summary["worst_offenders"]
+        assert [s["stage_id"] for s in offenders["skew"]] == [1]
+        assert [s["stage_id"] for s in offenders["spill"]] == [1]
+        assert [s["stage_id"] for s in offenders["gc"]] == [2]
+
+    def test_disabled_collector_does_nothing(self, spark_session):
+        "A disabled collector neither tags jobs nor collects metrics."
+        metrics = StageMetricsCollector("test_run", enabled=False)
+
+        with metrics.stage("write_output"):
+            assert (
+                spark_session.sparkContext.getLocalProperty("spark.jobGroup.id") is None
+            )
+
+        assert metrics.collect() == []
@@ -0,0 +1,101 @@
+"""
+This script contains unit tests for the scan filter pushdown, the Parquet staging of the extracts
+and the scan filter report.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import os
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    read_multiple_data,
+    scan_filter,
+    scan_filter_report,
+    stage_table_files,
+)
+
+
+def write_mara_extract(data_dir, rows=2000):
+    "Writes a MARA extract where every 4th material is deleted and every 7th archived."
+    lines = ["MATNR,LVORM,BISMT"] + [
+        f"M{i},{'X' if i % 4 == 0 else ''},{'ARCHIVE' if i % 7 == 0 else ''}"
+        for i in range(rows)
+    ]
+    (data_dir / "PRD_MARA.csv").write_text("\n".join(lines) + "\n")
+
+
+class TestScanFilters:
+    def test_scan_filter_conditions(self, spark_session):
+        "A row passes a declared filter if any of its conditions holds."
+        df = spark_session.createDataFrame(
+            [("M1", None, None), ("M2", "", "ARCHIVE"), ("M3", "X", "OLD-1")],
+            "MATNR string, LVORM string, BISMT string",
+        )
+
+        not_deleted = df.filter(scan_filter("MARA", "material_not_deleted"))
+        valid = df.filter(scan_filter("MARA", "valid_old_material_number"))
+
+        assert sorted(r.MATNR for r in not_deleted.collect()) == ["M1", "M2"]
+        assert sorted(r.MATNR for r in valid.collect()) == ["M1", "M3"]
+
+        with pytest.raises(KeyError, match="not declared"):
+            scan_filter("T001", "material_not_deleted")
+
+        with pytest.raises(ValueError, match="Unsupported scan filter operator"):
+            df.filter(scan_filter("MARA", "x", {"MARA": {"x": [("LVORM", "like")]}}))
+
+    def test_staged_extracts_skip_row_groups(self, spark_session, tmp_path):
+        "Staged, sorted extracts let the pushed filters skip whole row groups."
+        pytest.importorskip("pyarrow")
+        (tmp_path / "src").mkdir()
+        write_mara_extract(tmp_path / "src")
+
+        staged_dir = stage_table_files(
+            str(tmp_path / "src"), str(tmp_path / "staged"), row_group_bytes=4096
+        )
+        mara = read_multiple_data(staged_dir)["PRD_MARA"]
+        assert mara.count() == 2000
+
+        report_path = str(tmp_path / "report.json")
+        results = scan_filter_report({"MARA": mara}, report_path)
+        assert os.path.exists(report_path)
+
+        not_deleted = next(r for r in results if r["filter"] == "material_not_deleted")
+        assert not_deleted["formats"] == ["parquet"]
+        assert any("IsNull(LVORM)" in f for f in not_deleted["pushed_filters"])
+        assert not_deleted["row_groups"] > 1
+        assert 0 < not_deleted["skipped_bytes"] < not_deleted["bytes"]
+        assert not_deleted["skipped_rows"] <= 500
+
+    def test_csv_inputs_are_not_measured(self, spark_session, tmp_path):
+        "The filters of CSV inputs are reported without skipped bytes."
+        write_mara_extract(tmp_path, rows=10)
+        mara = read_multiple_data(str(tmp_path))["PRD_MARA"]
+
+        results = scan_filter_report({"MARA": mara})
+        assert [r["formats"] for r in results] == [["csv"], ["csv"]]
+        assert all(r["skipped_bytes"] is None for r in results)
+
+    def test_unchanged_extracts_are_staged_once(self, spark_session, tmp_path):
+        "A staged table is only rewritten when its extract changes."
+        (tmp_path / "src").mkdir()
+        write_mara_extract(tmp_path / "src", rows=10)
+
+        stage_table_files(str(tmp_path / "src"), str(tmp_path / "staged"))
+        success_path = tmp_path / "staged" / "PRD_MARA.parquet" / "_SUCCESS"
+        staged_at = os.path.getmtime(success_path)
+
+        stage_table_files(str(tmp_path / "src"), str(tmp_path / "staged"))
+        assert os.path.getmtime(success_path) == staged_at
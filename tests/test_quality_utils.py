@@ -0,0 +1,154 @@
+"""
+This script contains unit tests for the declarative data quality engine. The tests make sure
+that every supported check yields the expected metric and that the warn and fail thresholds
+are applied correctly.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local Imports
+import json
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    QualityObserver,
+    compute_quality_metrics,
+    run_quality_checks,
+)
+
+
+class TestQualityChecks:
+    rules = {
+        "input": [
+            {
+                "name": "matnr_null",
+                "check": "null_rate",
+                "column": "MATNR",
+                "warn": 0.0,
+            },
+            {
+                "name": "key_unique",
+                "check": "duplicate_rate",
+                "columns": ["MATNR", "WERKS"],
+                "fail": 0.5,
+            },
+            {
+                "name": "price_range",
+                "check": "out_of_range_rate",
+                "column": "STPRS",
+                "min": 0,
+                "max": 9,
+            },
+        ],
+        "output": [
+            {
+                "name": "attrition",
+                "check": "attrition_rate",
+                "reference": "input",
+                "fail": 0.4,
+            }
+        ],
+    }
+
+    def test_metrics_in_one_pass(self, quality_input):
+        "All rules of a frame are measured by a single aggregation."
+        metrics = compute_quality_metrics(quality_input, self.rules["input"])
+        assert metrics == {
+            "__rows": 4,
+            "matnr_null": 1,
+            "key_unique": 3,
+            "price_range": 2,
+        }
+
+    def test_null_keys_in_exact_and_approximate_duplicates(self, quality_input):
+        "Rows with null keys are counted the same by the exact and the approximate rule."
+        rule = {"name": "key_unique", "check": "duplicate_rate", "columns": ["MATNR"]}
+        df = quality_input.union(quality_input.filter("MATNR IS NULL"))
+
+        exact = compute_quality_metrics(df, [rule])
+        approximate = compute_quality_metrics(df, [{**rule, "approximate": True}])
+        assert exact["key_unique"] == approximate["key_unique"] == 3
+
+    def test_observed_inputs(self, quality_input, tmp_path):
+        "Input rules are read from the observation of the pipeline's own action."
+        quality = QualityObserver(self.rules)
+        observed = quality.observe(quality_input, "input")
+        output = observed.filter("STPRS < 10").persist()
+        assert output.count() == 3
+        quality.executed(output)
+
+        results = quality.run({"output": output}, str(tmp_path / "report.json"))
+        assert {result["rule"]: result["metric"] for result in results} == {
+            "matnr_null": 0.25,
+            "key_unique": 0.25,
+            "price_range": 0.5,
+            "attrition": 0.25,
+        }
+        output.unpersist()
+
+        # An observed frame no action evaluated is not measured instead of blocking the run
+        unevaluated = QualityObserver(self.rules)
+        unevaluated.observe(quality_input, "input")
+        results = unevaluated.run({"output": quality_input.limit(3)})
+        assert {result["rule"]: result["status"] for result in results} == {
+            "matnr_null": "not measured",
+            "key_unique": "not measured",
+            "price_range": "not measured",
+            "attrition": "not measured",
+        }
+
+        disabled = QualityObserver(self.rules, enabled=False)
+        assert disabled.observe(quality_input, "input") is quality_input
+        assert disabled.run() == []
+
+    def test_thresholds_and_report(self, quality_input, tmp_path):
+        "Metrics are compared with the thresholds and written to the report."
+        report_path = tmp_path / "report.json"
+        results = run_quality_checks(
+            {"input": quality_input, "output": quality_input.limit(3)},
+            self.rules,
+            str(report_path),
+        )
+        status = {result["rule"]: result["status"] for result in results}
+        assert status == {
+            "matnr_null": "warn",
+            "key_unique": "pass",
+            "price_range": "pass",
+            "attrition": "pass",
+        }
+        assert json.loads(report_path.read_text()) == results
+
+    def test_fail_threshold(self, quality_input):
+        "A rule above its fail threshold fails the run."
+        with pytest.raises(ValueError, match="Data quality checks failed"):
+            run_quality_checks(
+                {"input": quality_input, "output": quality_input.limit(1)},
+                self.rules,
+            )
+
+    @pytest.mark.parametrize(
+        "rules, expected_message",
+        [
+            (
+                {"input": [{"name": "a", "check": "unknown"}]},
+                "Unsupported quality check",
+            ),
+            ({"input": [{"name": "a", "check": "null_rate"}]}, "is missing the fields"),
+            ({"other": []}, "reference missing frames"),
+        ],
+    )
+    def test_invalid_rules(self, quality_input, rules, expected_message):
+        "Invalid rules are rejected before anything is computed."
+        with pytest.raises(ValueError, match=expected_message):
+            run_quality_checks({"input": quality_input}, rules)
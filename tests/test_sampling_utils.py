@@ -0,0 +1,81 @@
+"""
+This script contains unit tests for the deterministic development samples of the extracts.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    TableRegistry,
+    encode_identifier_columns,
+    sample_by_key,
+    sample_registry,
+)
+
+HEX_KEYS = [f"{i:064x}" for i in range(1000)]
+
+
+class TestSampleByKey:
+    def test_sample_is_deterministic_and_consistent(self, spark_session):
+        "All rows of a key are kept or dropped together, in every table and every run."
+        marc = spark_session.createDataFrame(
+            [(key, plant) for key in HEX_KEYS for plant in ("P1", "P2")],
+            "MATNR string, WERKS string",
+        )
+        mara = spark_session.createDataFrame(
+            [(key,) for key in HEX_KEYS] + [(None,)], "MATNR string"
+        )
+
+        marc_keys = {r.MATNR for r in sample_by_key(marc, "MATNR", 0.1).collect()}
+        mara_keys = [r.MATNR for r in sample_by_key(mara, "MATNR", 0.1).collect()]
+
+        assert 50 < len(marc_keys) < 150
+        assert sorted(marc_keys) == sorted(mara_keys)
+        assert sample_by_key(marc, "MATNR", 0.1).count() == 2 * len(marc_keys)
+        assert {
+            r.MATNR for r in sample_by_key(mara, "MATNR", 0.1, seed=7).collect()
+        } != marc_keys
+
+        # Binary encoded identifiers are sampled by their readable value
+        encoded = encode_identifier_columns({"MARA": mara.dropna()})["MARA"]
+        assert {
+            r.MATNR.hex() for r in sample_by_key(encoded, "MATNR", 0.1).collect()
+        } == marc_keys
+
+        with pytest.raises(ValueError, match="fraction"):
+            sample_by_key(mara, "MATNR", 0)
+
+
+class TestSampleRegistry:
+    def test_related_tables_follow_the_sample(self, spark_session):
+        "Related tables keep the rows of the sampled keys; reference tables are kept in full."
+        afpo = spark_session.createDataFrame(
+            [(key, f"M{i % 10}") for i, key in enumerate(HEX_KEYS)],
+            "AUFNR string, MATNR string",
+        )
+        mara = spark_session.createDataFrame(
+            [(f"M{i}",) for i in range(20)], "MATNR string"
+        )
+        t001 = spark_session.createDataFrame([("C1",)], "BUKRS string")
+        registry = TableRegistry({"AFPO": afpo, "MARA": mara, "T001": t001})
+
+        sampled = sample_registry(
+            registry, "AUFNR", 0.05, {"MARA": ("AFPO", ["MATNR"])}
+        )
+
+        assert sampled.names() == ["AFPO", "MARA", "T001"]
+        assert sampled.loaded_names() == []
+        sampled_materials = {r.MATNR for r in sampled["AFPO"].collect()}
+        assert {r.MATNR for r in sampled["MARA"].collect()} == sampled_materials
+        assert sampled["T001"].count() == 1
@@ -0,0 +1,132 @@
+"""
+This script contains unit tests for the table profiling and statistics store functions.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+# Local Imports
+import json
+from pathlib import Path
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    broadcast_if_small,
+    check_join_fanout,
+    check_join_fanouts,
+    estimate_join_fanout,
+    profile_table,
+    profile_tables,
+    read_file,
+    shuffle_join_sides,
+    suggest_shuffle_partitions,
+)
+
+SAMPLE_CSV = str(Path(__file__).resolve().parent / "samples" / "sample.csv")
+
+
+class TestTableStatistics:
+    def test_profile_table(self, spark_session):
+        "Row count, size, distinct keys and null ratios are computed."
+        df = read_file(SAMPLE_CSV, "csv", {"header": "true"}, spark_session)
+        stats = profile_table(df, ["name"])
+
+        assert stats["row_count"] == 5
+        assert stats["size_bytes"] == Path(SAMPLE_CSV).stat().st_size
+        assert stats["distinct_keys"] == {"name": 5}
+        assert set(stats["null_ratios"]) == set(df.columns)
+
+    def test_stats_store_is_reused(self, spark_session, tmp_path):
+        "Unchanged inputs are taken from the store instead of being profiled again."
+        stats_path = tmp_path / "stats.json"
+        df = read_file(SAMPLE_CSV, "csv", {"header": "true"}, spark_session)
+        profile_tables({"SAMPLE": df}, str(stats_path))
+
+        # Tamper with the stored row count: it is only returned if the store is reused
+        store = json.loads(stats_path.read_text())
+        store["SAMPLE"]["row_count"] = -1
+        stats_path.write_text(json.dumps(store))
+
+        assert (
+            profile_tables({"SAMPLE": df}, str(stats_path))["SAMPLE"]["row_count"] == -1
+        )
+
+    def test_join_and_partition_choices(self, valid_dataframe):
+        "Small tables are broadcast and partitions follow the input size."
+        stats = {"T001": {"size_bytes": 10}, "MBEW": {"size_bytes": 300 * 2**20}}
+
+        small = broadcast_if_small(valid_dataframe, stats, "T001")
+        large = broadcast_if_small(valid_dataframe, stats, "MBEW")
+        assert "broadcast" in small._jdf.queryExecution().analyzed().toString().lower()
+        assert (
+            "broadcast" not in large._jdf.queryExecution().analyzed().toString().lower()
+        )
+
+        assert (
+            suggest_shuffle_partitions(stats, target_partition_bytes=100 * 2**20) == 4
+        )
+        assert suggest_shuffle_partitions({}) == 1
+
+    def test_shuffle_join_sides(self, spark_session, fanout_tables):
+        "The partitions apply to the join only, not to the shared session."
+        marc, mara = fanout_tables
+        session_partitions = spark_session.conf.get("spark.sql.shuffle.partitions")
+
+        left, right = shuffle_join_sides(marc, mara, ["MATNR"], 3)
+        assert left.rdd.getNumPartitions() == right.rdd.getNumPartitions() == 3
+        assert left.join(right, ["MATNR"], "left").count() == 8
+        assert (
+            spark_session.conf.get("spark.sql.shuffle.partitions") == session_partitions
+        )
+
+        assert shuffle_join_sides(marc, mara, ["MATNR"], None) == (marc, mara)
+
+
+class TestJoinFanout:
+    def test_estimate_join_fanout(self, fanout_tables):
+        "The estimate matches the join and names the duplicated key."
+        marc, mara = fanout_tables
+        estimate = estimate_join_fanout(marc, mara, ["MATNR"])
+
+        assert estimate["left_rows"] == 4
+        assert (
+            estimate["output_rows"] == marc.join(mara, ["MATNR"], "left").count() == 8
+        )
+        assert estimate["fanout"] == 2.0
+        assert [key["MATNR"] for key in estimate["offending_keys"]] == ["M1"]
+        assert estimate["offending_keys"][0]["right_rows"] == 3
+
+    def test_check_join_fanout(self, fanout_tables):
+        "A fan-out above the maximum aborts, a fan-out below it is only reported."
+        marc, mara = fanout_tables
+        assert check_join_fanout(marc, mara, ["MATNR"], "MARC-MARA", 3)["fanout"] == 2.0
+
+        with pytest.raises(ValueError, match="maximum fan-out"):
+            check_join_fanout(marc, mara, ["MATNR"], "MARC-MARA", 1.5)
+
+    def test_check_join_fanouts(self, spark_session, fanout_tables):
+        "Every join of a chain is estimated from key frequencies, without running the joins."
+        marc, mara = fanout_tables
+        t001 = spark_session.createDataFrame(
+            [("100", "EUR"), ("100", "USD"), ("200", "EUR")], ["MANDT", "WAERS"]
+        )
+        joins = [("MARA", mara, ["MATNR"]), ("T001", t001, ["MANDT"])]
+
+        estimates = check_join_fanouts(marc, joins, "MARC")
+        joined = marc.join(mara, ["MATNR"], "left").join(t001, ["MANDT"], "left")
+        assert [estimate["output_rows"] for estimate in estimates] == [8, 11]
+        assert joined.count() == 11
+        assert estimates[1]["fanout"] == 11 / 8
+
+        with pytest.raises(ValueError, match="MARC-MARA exceeds the maximum fan-out"):
+            check_join_fanouts(marc, joins, "MARC", max_fanout=1.5)
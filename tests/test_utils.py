@@ -1,6 +1,6 @@
 """
-This script contains unit tests and helper functions for validating the correctness 
-and robustness of utility functions used across the project. The tests ensure that 
+This script contains unit tests and helper functions for validating the correctness
+and robustness of utility functions used across the project. The tests ensure that
 utility functions perform as expected with various input scenarios, including edge cases.
 
 Modules and Functions:
@@ -14,14 +14,14 @@ Dependencies:
     - ace.utils: The module under test, which contains various utility functions.
 
 Features:
-    - Tests for utility functions such as data preprocessing, schema enforcement, 
+    - Tests for utility functions such as data preprocessing, schema enforcement,
       and integration operations.
     - Edge case testing to ensure robustness under exceptional conditions.
     - Reusable components for efficient and consistent test development.
 
 Usage:
-    Run this script with a test runner (e.g., pytest) to validate the utility functions 
-    in the project. The tests are designed to ensure that the project utilities maintain 
+    Run this script with a test runner (e.g., pytest) to validate the utility functions
+    in the project. The tests are designed to ensure that the project utilities maintain
     their correctness and integrity as they evolve.
 
 Author:
@@ -32,20 +32,34 @@ Date:
 """
 
 # Local Imports
+import gzip
 import os
+import shutil
 from pathlib import Path
 
+import pyspark.sql.functions as F
+import pyspark.sql.types as T
 import pytest
 
 # Custome utils (need to test)
 from ace.utils import (
     add_missing_columns,
+    add_partition_columns,
     compare_dataframes,
+    decode_identifier_columns,
+    detect_file_format,
+    discover_table_files,
+    encode_identifier_columns,
     enforce_schema,
+    parse_sap_dates,
     process_data,
     read_file,
     read_multiple_data,
+    reduce_by_driving_keys,
+    register_bucketed_table,
     rename_and_select,
+    save_df_as_bucketed_table,
+    save_df_as_csv,
 )
 
 
@@ -261,3 +275,216 @@ class TestReadFile:
 
         # Additional check to see if the column types and the order is matching
         assert result.schema == add_missing_columns_output.schema
+
+
+class TestIdentifierEncoding:
+    def test_encode_identifiers(self, hex_identifier_tables):
+        "Hex identifiers become binary, constant columns literals, other columns stay strings."
+        result = encode_identifier_columns(hex_identifier_tables)
+        marc = result["PRE_MARC"]
+
+        # MATNR is not hex in PRE_MARA, so it stays a string everywhere
+        assert isinstance(marc.schema["MATNR"].dataType, T.StringType)
+        assert isinstance(marc.schema["SOURCE_SYSTEM_ERP"].dataType, T.BinaryType)
+        assert isinstance(marc.schema["WERKS"].dataType, T.BinaryType)
+        assert isinstance(result["PRE_MARA"].schema["BISMT"].dataType, T.StringType)
+
+    def test_decode_identifiers(self, hex_identifier_tables):
+        "Decoding restores the original hex strings."
+        marc = hex_identifier_tables["PRE_MARC"]
+        encoded = encode_identifier_columns({"PRE_MARC": marc})["PRE_MARC"]
+        assert isinstance(encoded.schema["MATNR"].dataType, T.BinaryType)
+
+        compare_dataframes(decode_identifier_columns(encoded), marc)
+
+
+class TestChunkedTables:
+    def test_chunks_are_read_as_one_table(self, tmp_path):
+        "Chunks and compressed chunks of a table are grouped and read in one scan."
+        (tmp_path / "PRD_MARC_0001.csv").write_text("MATNR,WERKS\nM1,P1\n")
+        with gzip.open(tmp_path / "PRD_MARC_0002.csv.gz", "wt") as chunk:
+            chunk.write("MATNR,WERKS\nM2,P1\nM3,P2\n")
+        (tmp_path / "PRD_T001.csv").write_text("MANDT,BUKRS\n100,C1\n")
+        (tmp_path / "notes.txt").write_text("not an extract")
+
+        groups = discover_table_files(str(tmp_path))
+        assert sorted(groups) == ["PRD_MARC", "PRD_T001"]
+        assert len(groups["PRD_MARC"]) == 2
+
+        result = read_multiple_data(str(tmp_path))
+        assert result["PRD_MARC"].count() == 3
+        assert result["PRD_T001"].count() == 1
+
+    def test_glob_patterns(self, tmp_path):
+        "Tables can be assigned by glob pattern."
+        (tmp_path / "marc").mkdir()
+        for i in range(2):
+            (tmp_path / "marc" / f"part-{i}.csv").write_text(f"MATNR\nM{i}\n")
+
+        groups = discover_table_files(str(tmp_path), {"PRD_MARC": "marc/part-*.csv"})
+        assert len(groups["PRD_MARC"]) == 2
+
+        with pytest.raises(FileNotFoundError, match="No files match"):
+            discover_table_files(str(tmp_path), {"PRD_MARA": "mara/*.csv"})
+
+
+class TestColumnarInputs:
+    def test_mixed_format_directory(self, spark_session, tmp_path):
+        "Parquet, ORC and CSV extracts are detected and read natively, also mixed in one table."
+        df = spark_session.createDataFrame(
+            [("M1", "P1"), ("M2", "P2")], ["MATNR", "WERKS"]
+        )
+        df.write.parquet(str(tmp_path / "PRD_MARA.parquet"))
+        df.write.orc(str(tmp_path / "PRD_T001W.orc"))
+        (tmp_path / "PRD_MARC_0001.csv").write_text("MATNR,WERKS\nM3,P3\n")
+        part = next((tmp_path / "PRD_MARA.parquet").glob("part-*.parquet"))
+        shutil.copy(part, tmp_path / "PRD_MARC_0002.parquet")
+        shutil.copy(part, tmp_path / "PRD_MBEW.dat")
+        part_rows = spark_session.read.parquet(str(part)).count()
+
+        assert detect_file_format(str(tmp_path / "PRD_MARA.parquet")) == "parquet"
+        assert detect_file_format(str(tmp_path / "PRD_MBEW.dat")) == "parquet"
+        assert detect_file_format(str(tmp_path / "PRD_MARC_0001.csv")) == "csv"
+
+        result = read_multiple_data(str(tmp_path))
+        assert sorted(result) == ["PRD_MARA", "PRD_MARC", "PRD_MBEW", "PRD_T001W"]
+        assert result["PRD_T001W"].count() == 2
+        assert result["PRD_MBEW"].count() == part_rows
+        assert result["PRD_MARC"].count() == 1 + part_rows
+
+    def test_filters_are_pushed_down(self, spark_session, tmp_path):
+        "Filters on a Parquet extract reach the scan."
+        spark_session.createDataFrame([("M1",), ("M2",)], ["MATNR"]).write.parquet(
+            str(tmp_path / "PRD_MARA.parquet")
+        )
+
+        mara = read_multiple_data(str(tmp_path))["PRD_MARA"]
+        plan = mara.filter(F.col("MATNR") == "M1")._jdf.queryExecution().executedPlan()
+        assert "EqualTo(MATNR,M1)" in plan.toString()
+
+
+class TestParseSapDates:
+    def test_parse_sap_dates(self, spark_session):
+        "Every registered format is parsed, the SAP empty date and garbage become null."
+        df = spark_session.createDataFrame(
+            data=[
+                ("2008-06-14", "1"),
+                ("20080614", "2"),
+                ("00000000", "3"),
+                ("n/a", "4"),
+            ],
+            schema=["LTRMI", "AUFNR"],
+        )
+        result = parse_sap_dates(df)
+
+        assert isinstance(result.schema["LTRMI"].dataType, T.DateType)
+        assert isinstance(result.schema["AUFNR"].dataType, T.StringType)
+        assert [str(row["LTRMI"]) for row in result.orderBy("AUFNR").collect()] == [
+            "2008-06-14",
+            "2008-06-14",
+            "None",
+            "None",
+        ]
+
+
+class TestSemiJoinReduction:
+    def test_reduce_by_driving_keys(self, fanout_tables):
+        "Only rows whose keys occur in the driving table are kept, without adding rows."
+        marc, mara = fanout_tables
+        reduced = reduce_by_driving_keys(
+            mara, marc.filter(F.col("MATNR") != "M2"), ["MATNR"]
+        )
+
+        assert sorted(row["MANDT"] for row in reduced.collect()) == [
+            "100",
+            "200",
+            "300",
+        ]
+        assert (
+            "BroadcastHashJoin"
+            in reduced._jdf.queryExecution().executedPlan().toString()
+        )
+
+
+class TestPartitionedOutput:
+    def test_add_partition_columns(self, spark_session):
+        "Month partitions are derived from the date column."
+        df = spark_session.createDataFrame(
+            [("P1", "2024-04-16")], ["plant", "start_date"]
+        ).withColumn("start_date", F.to_date("start_date"))
+        result = add_partition_columns(df, ["plant", "start_date_month"])
+        assert result.first().start_date_month == "2024-04"
+
+        with pytest.raises(ValueError, match="cannot be derived"):
+            add_partition_columns(df, ["unknown_month"])
+
+    def test_dynamic_partition_overwrite(self, spark_session, tmp_path):
+        "Re-writing one system only replaces that system's partitions."
+        df = spark_session.createDataFrame(
+            [("S1", "P1", 1), ("S2", "P1", 2)], ["source_system_erp", "plant", "value"]
+        )
+        save_df_as_csv(df, str(tmp_path), "out", ["source_system_erp"])
+        save_df_as_csv(
+            df.filter("source_system_erp = 'S1'").withColumn("value", F.lit(10)),
+            str(tmp_path),
+            "out",
+            ["source_system_erp"],
+        )
+
+        assert sorted(os.listdir(tmp_path / "out"))[-2:] == [
+            "source_system_erp=S1",
+            "source_system_erp=S2",
+        ]
+        result = read_file(str(tmp_path / "out"), "csv", {"header": "true"})
+        values = {row.source_system_erp: row.value for row in result.collect()}
+        assert values == {"S1": "10", "S2": "2"}
+
+
+class TestBucketedOutput:
+    def test_bucketed_tables_join_without_shuffle(self, spark_session, tmp_path):
+        "Two outputs bucketed the same way are joined without an exchange."
+        materials = spark_session.createDataFrame(
+            [("M1", "P1", 1.0), ("M2", "P1", 2.0)],
+            ["material_number", "plant", "standard_price"],
+        )
+        orders = spark_session.createDataFrame(
+            [("O1", "M1", "P1"), ("O2", "M2", "P1")],
+            ["order_number", "material_number", "plant"],
+        )
+        spec = save_df_as_bucketed_table(materials, str(tmp_path), "lm_bucketed")
+        save_df_as_bucketed_table(orders, str(tmp_path), "po_bucketed")
+        assert spec["num_buckets"] == 16
+        assert os.path.exists(tmp_path / "lm_bucketed" / "_bucket_spec.json")
+
+        # Re-register the table under a new name from the recorded metadata
+        name = register_bucketed_table(
+            str(tmp_path / "lm_bucketed"), "lm_registered", spark_session
+        )
+        spark_session.conf.set("spark.sql.autoBroadcastJoinThreshold", -1)
+        joined = spark_session.table(name).join(
+            spark_session.table("po_bucketed"), ["material_number", "plant"]
+        )
+        assert joined.count() == 2
+        plan = joined._jdf.queryExecution().executedPlan().toString()
+        spark_session.conf.unset("spark.sql.autoBroadcastJoinThreshold")
+        assert "SortMergeJoin" in plan
+        assert "Exchange" not in plan
+
+    def test_bucketed_table_writes_one_file_per_bucket(self, spark_session, tmp_path):
+        "Rows spread over many tasks are written as one file per bucket."
+        df = (
+            spark_session.range(1000)
+            .select(
+                F.col("id").cast("string").alias("material_number"),
+                F.lit("P1").alias("plant"),
+            )
+            .repartition(8)
+        )
+        save_df_as_bucketed_table(df, str(tmp_path), "lm_files", num_buckets=4)
+
+        data_files = [
+            name
+            for name in os.listdir(tmp_path / "lm_files")
+            if name.endswith(".parquet")
+        ]
+        assert 0 < len(data_files) <= 4
@@ -0,0 +1,203 @@
+"""
+This script contains unit tests for the pre-ingestion validation of the CSV extracts and the
+bad record handling of the Spark ingestion.
+
+Dependencies:
+    - pytest: Used as the test framework for structuring and executing unit tests.
+    - pyspark: Used for testing Spark-based utility functions.
+    - ace.utils: The module under test, which contains various utility functions.
+
+Author:
+    Vinayaka O
+
+Date:
+    01/12/2024
+"""
+
+import csv
+import json
+import os
+
+import pytest
+
+# Custome utils (need to test)
+from ace.utils import (
+    TableRegistry,
+    read_multiple_data,
+    validate_csv_file,
+    validate_extracts,
+)
+
+RAGGED_EXTRACT = (
+    b"\xef\xbb\xbf MANDT , MATNR,WERKS\n"
+    b"100,M1,P1\n"
+    b"100,M2\n"
+    b"\n"
+    b'100,"M3, special",P3\n'
+    b'100,"M4,P4\n'
+    b"100,M5,P5,extra\n"
+    b"100,M6,P6\n"
+)
+
+
+class TestValidateCsvFile:
+    def test_ragged_rows_are_quarantined(self, spark_session, tmp_path):
+        "The header is normalised and bad rows are quarantined with their line numbers."
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "PRD_MARC.csv").write_bytes(RAGGED_EXTRACT)
+
+        result = validate_csv_file(
+            str(tmp_path / "src" / "PRD_MARC.csv"),
+            str(tmp_path),
+            str(tmp_path),
+        )
+
+        assert result["status"] == "cleaned"
+        assert result["bom_removed"] and result["header_changed"]
+        assert (result["rows"], result["quarantined_rows"]) == (6, 3)
+
+        with open(result["quarantine_path"], newline="") as quarantine_file:
+            quarantined = list(csv.DictReader(quarantine_file))
+        assert [row["line_number"] for row in quarantined] == ["3", "6", "7"]
+        assert quarantined[0]["line"] == "100,M2"
+
+        cleaned = (tmp_path / "PRD_MARC.csv").read_bytes()
+        assert cleaned.startswith(b"MANDT,MATNR,WERKS\n100,M1,P1\n")
+
+        df = spark_session.read.csv(result["validated_path"], header=True)
+        assert df.columns == ["MANDT", "MATNR", "WERKS"]
+        assert sorted(r.MATNR for r in df.collect()) == ["M1", "M3, special", "M6"]
+
+    def test_valid_file_is_linked(self, tmp_path):
+        "A file that needs no fix is passed through unchanged."
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "PRD_T001.csv").write_text("MANDT,BUKRS\n100,C1\n")
+
+        result = validate_csv_file(
+            str(tmp_path / "src" / "PRD_T001.csv"), str(tmp_path), str(tmp_path)
+        )
+
+        assert result["status"] == "valid" and result["quarantine_path"] is None
+        assert (tmp_path / "PRD_T001.csv").read_text() == "MANDT,BUKRS\n100,C1\n"
+
+    def test_invalid_header(self, tmp_path):
+        "Duplicate column names fail the file."
+        (tmp_path / "PRD_T001.csv").write_text("MANDT,MANDT\n100,100\n")
+
+        with pytest.raises(ValueError, match="duplicates"):
+            validate_csv_file(
+                str(tmp_path / "PRD_T001.csv"), str(tmp_path / "out"), str(tmp_path)
+            )
+
+
+class TestValidateExtracts:
+    def test_extracts_are_validated_in_parallel(self, spark_session, tmp_path):
+        "All extracts of a directory are validated and can be read from the new directory."
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "PRD_MARC_0001.csv").write_bytes(RAGGED_EXTRACT)
+        (tmp_path / "src" / "PRD_MARC_0002.csv").write_text(
+            "MANDT,MATNR,WERKS\n1,M7,P7\n"
+        )
+        (tmp_path / "src" / "PRD_T001.csv").write_text("MANDT,BUKRS\n100,C1\n")
+
+        report_path = str(tmp_path / "report.json")
+        validated_dir = validate_extracts(
+            str(tmp_path / "src"),
+            str(tmp_path / "validated"),
+            max_workers=2,
+            report_path=report_path,
+        )
+
+        with open(report_path) as report_file:
+            results = json.load(report_file)
+        assert sum(r["quarantined_rows"] for r in results) == 3
+        assert os.listdir(tmp_path / "validated" / "_quarantine") == [
+            "PRD_MARC_0001.csv.quarantine.csv"
+        ]
+
+        tables = read_multiple_data(validated_dir)
+        assert tables["PRD_MARC"].count() == 4
+        assert tables["PRD_T001"].count() == 1
+
+        with pytest.raises(ValueError, match="must differ"):
+            validate_extracts(str(tmp_path / "src"), str(tmp_path / "src"))
+
+    def test_stale_chunks_are_removed(self, tmp_path):
+        "Chunks and quarantine files of an earlier extract are not read with the new ones."
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "PRD_MARC_0001.csv").write_bytes(RAGGED_EXTRACT)
+        (tmp_path / "src" / "PRD_MARC_0002.csv").write_text(
+            "MANDT,MATNR,WERKS\n1,M7,P7\n"
+        )
+        (tmp_path / "src" / "PRD_T001.csv").write_text("MANDT,BUKRS\n100,C1\n")
+        validated_dir = validate_extracts(
+            str(tmp_path / "src"), str(tmp_path / "validated"), max_workers=1
+        )
+
+        # Today's MARC extract has one clean chunk; T001 belongs to another pipeline's tables
+        os.remove(tmp_path / "src" / "PRD_MARC_0002.csv")
+        (tmp_path / "src" / "PRD_MARC_0001.csv").write_text(
+            "MANDT,MATNR,WERKS\n1,M1,P1\n"
+        )
+        validate_extracts(
+            str(tmp_path / "src"), validated_dir, tables=["MARC"], max_workers=1
+        )
+
+        assert sorted(os.listdir(validated_dir)) == [
+            "PRD_MARC_0001.csv",
+            "PRD_T001.csv",
+            "_quarantine",
+        ]
+        assert os.listdir(tmp_path / "validated" / "_quarantine") == []
+
+
+class TestBadRecordsPath:
+    def test_malformed_rows_are_moved_aside(self, spark_session, tmp_path):
+        "Rows Spark cannot parse are written to the bad records path and dropped."
+        (tmp_path / "src").mkdir()
+        (tmp_path / "src" / "PRD_MARC.csv").write_text(
+            "MANDT,MATNR,WERKS\n100,M1,P1\n100,M2\n100,M3,P3,extra\n100,M4,P4\n"
+        )
+
+        tables = read_multiple_data(
+            str(tmp_path / "src"), bad_records_path=str(tmp_path / "bad")
+        )
+
+        assert sorted(r.MATNR for r in tables["PRD_MARC"].collect()) == ["M1", "M4"]
+        assert tables["PRD_MARC"].columns == ["MANDT", "MATNR", "WERKS"]
+
+        bad_records = spark_session.read.json(str(tmp_path / "bad" / "PRD_MARC"))
+        assert sorted(r.record for r in bad_records.collect()) == [
+            "100,M2",
+            "100,M3,P3,extra",
+        ]
+
+    def test_types_are_inferred_from_the_well_formed_rows(
+        self, spark_session, tmp_path
+    ):
+        "A malformed row does not turn a numeric column into strings."
+        (tmp_path / "src").mkdir()
+        extract = tmp_path / "src" / "PRD_MARC.csv"
+        extract.write_text("MANDT,MATNR,QTY\n100,M1,5\n100,M2,x,extra\n100,M3,7\n")
+
+        registry = TableRegistry.from_directory(
+            str(tmp_path / "src"), bad_records_path=str(tmp_path / "bad")
+        )
+        assert dict(registry["MARC"].dtypes) == {
+            "MANDT": "int",
+            "MATNR": "string",
+            "QTY": "int",
+        }
+        assert all(df.is_cached for df in registry._cached_frames)
+
+        # The cache is released and the table is read from its file again
+        registry.release()
+        assert registry._cached_frames == []
+        assert sorted(r.MATNR for r in registry["MARC"].collect()) == ["M1", "M3"]
+
+        # A clean re-read leaves no bad records of the former read behind
+        extract.write_text("MANDT,MATNR,QTY\n100,M1,5\n")
+        read_multiple_data(
+            str(tmp_path / "src"), bad_records_path=str(tmp_path / "bad")
+        )
+        assert not os.path.exists(tmp_path / "bad" / "PRD_MARC")